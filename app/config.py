@@ -1,13 +1,135 @@
 # app/config.py
 
+import os
+from typing import Optional
+
+from dotenv import load_dotenv
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
 
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The one place .env is loaded, from the project root whatever the working directory. It goes into
+# os.environ, where the modules that also read os.getenv() (n8n_client, langchain_service) see it.
+load_dotenv(os.path.join(PROJECT_ROOT, ".env"))
+
 class Settings(BaseSettings):
     openai_api_key: str
     n8n_api_base_url: str
     n8n_api_key: str
-    
+
+    # LLM client pool
+    openai_model: str = "gpt-4o"
+    openai_temperature: float = 0.7
+    llm_pool_size: int = 4
+    llm_max_connections: int = 20
+    llm_keepalive_expiry: float = 30.0
+    llm_request_timeout: float = 60.0
+    llm_warmup: bool = True  # import the OpenAI client and fill the pool in the background at startup
+
+    # Proactive OpenAI rate limiting (0 disables a limit); match these to the account's tier
+    llm_rpm_limit: int = 500
+    llm_tpm_limit: int = 30000
+    llm_max_concurrency: int = 8  # in-flight LLM calls per worker
+    llm_rate_limit_sqlite_path: Optional[str] = None  # e.g. "data/rate_limits.sqlite3" to share the budget across workers
+
+    # n8n HTTP client
+    n8n_pool_size: int = 10
+    n8n_connect_timeout: float = 5.0
+    n8n_read_timeout: float = 30.0  # for operations without their own default
+    n8n_operation_timeouts: dict = {}  # e.g. {"list": [5, 120]} overrides (connect, read) per operation
+    n8n_max_retries: int = 3
+    n8n_backoff_base: float = 0.5
+    n8n_backoff_max: float = 8.0
+
+    # Workflow cache in front of the n8n client
+    workflow_cache_enabled: bool = True
+    workflow_cache_ttl: float = 60.0
+    workflow_cache_max_bytes: int = 32 * 1024 * 1024
+
+    # LLM response cache
+    response_cache_enabled: bool = True
+    response_cache_ttl: float = 24 * 3600.0
+    response_cache_max_entries: int = 512
+    response_cache_max_bytes: int = 16 * 1024 * 1024
+    response_cache_sqlite_path: Optional[str] = None  # e.g. "data/response_cache.sqlite3" to share across workers
+    response_cache_sqlite_max_bytes: int = 256 * 1024 * 1024
+
+    # Semantic (embedding similarity) cache tier, off by default
+    semantic_cache_enabled: bool = False
+    semantic_cache_embedder: str = "hashing"  # or "sentence-transformers:<model>" or "module:factory"
+    semantic_cache_threshold: float = 0.92
+    semantic_cache_max_entries: int = 2048
+    semantic_cache_index: str = "numpy"  # or "hnsw" (needs hnswlib)
+    semantic_cache_score_log_path: Optional[str] = None
+
+    # Validate-and-repair loop for generated workflows
+    repair_enabled: bool = True
+    repair_max_attempts: int = 2
+    repair_token_budget: int = 12000  # prompt + completion tokens across all attempts for one workflow
+
+    # Logging: payloads (LLM responses, n8n bodies) are logged as a preview plus size and hash,
+    # a sampled share in full; records are formatted and written off the request path
+    log_level: str = "INFO"
+    log_format: str = "text"  # or "json", one object per line
+    log_payload_max_chars: int = 256
+    log_payload_sample_rate: float = 0.0
+    log_queue_size: int = 10000  # records beyond this are dropped (and counted in /stats)
+
+    # Request tracing: recent traces are kept in memory for /debug/traces
+    trace_enabled: bool = True
+    trace_buffer_size: int = 500
+    trace_export_path: Optional[str] = None  # e.g. "data/traces.otlp.jsonl", OTLP/JSON, one export request per line
+
+    # Conversation history for requests carrying a conversation_id
+    conversation_max_entries: int = 1000
+    conversation_idle_ttl: float = 6 * 3600.0
+    conversation_max_history_tokens: int = 3000
+    conversation_sqlite_path: Optional[str] = None  # e.g. "data/conversations.sqlite3" to share across workers
+
+    # Usage accounting: USD per 1M (prompt, completion[, cached prompt]) tokens, matched by longest model-name prefix
+    llm_prices: dict = {
+        "gpt-4o": [2.50, 10.00, 1.25],
+        "gpt-4o-mini": [0.15, 0.60, 0.075],
+        "gpt-4.1": [2.00, 8.00, 0.50],
+        "gpt-4.1-mini": [0.40, 1.60, 0.10],
+        "gpt-4.1-nano": [0.10, 0.40, 0.025],
+    }
+
+    # Prompt templates (one file per operation), re-read when a file changes
+    prompts_dir: Optional[str] = None  # defaults to app/prompts
+    prompt_reload_interval: float = 2.0  # seconds between checks for changed files; 0 loads them once
+
+    # Background generation jobs (POST /generate-workflow/jobs)
+    job_sqlite_path: str = "data/jobs.sqlite3"
+    job_workers: int = 4
+    job_retention: float = 7 * 24 * 3600.0
+    job_poll_interval: float = 5.0  # seconds between checks for jobs other (or dead) workers left queued; 0 disables
+    # callback_url hosts allowed (JSON list); empty allows any host that resolves to a public address
+    job_callback_allowed_hosts: list[str] = []
+    job_callback_allow_private: bool = False  # also allow loopback/private addresses (local development)
+
+    # POST /generate-workflows:batch
+    batch_max_prompts: int = 100
+    batch_n8n_concurrency: int = 5  # workflows created in n8n at once; LLM calls are bounded by llm_max_concurrency
+
+    # GET /workflows:export, POST /workflows:import (and python -m app.services.workflow_transfer)
+    transfer_concurrency: int = 5  # workflows written to n8n at once during an import
+    transfer_max_line_bytes: int = 16 * 1024 * 1024
+
+    # PUT /workflows/{id}: "diff" sends a compact view and applies the model's patch, "full" round-trips the whole JSON
+    workflow_update_mode: str = "diff"
+
+    @field_validator(
+        "llm_rate_limit_sqlite_path", "response_cache_sqlite_path", "trace_export_path", "conversation_sqlite_path",
+        "prompts_dir", "job_sqlite_path",
+    )
+    @classmethod
+    def _resolve_path(cls, path):
+        # Relative paths are relative to the project root, like .env, not to wherever uvicorn was started
+        return os.path.join(PROJECT_ROOT, path) if path and not os.path.isabs(path) else path
+
     class Config:
-        env_file = ".env"
+        env_file = os.path.join(PROJECT_ROOT, ".env")
 
 settings = Settings()
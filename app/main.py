@@ -1,32 +1,147 @@
 # D:\AI_Project\n8n_wf_creator\app\main.py
-from app.n8n_client import n8n_get_all_workflows
-from fastapi import FastAPI
-from app.schemas.request_response import WorkflowRequest, WorkflowResponse
-from app.services.langchain_service import get_llm_chain
+from app.n8n_client import an8n_get_all_workflows, an8n_list_workflows_page, aiter_workflows
+from fastapi import FastAPI, Query, Header, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from typing import Optional
+import asyncio
+import hashlib
+import json
+import time
+from app.schemas.request_response import BatchRequest, JobRequest, WorkflowRequest, WorkflowResponse
+from app.services.langchain_service import get_llm_chain, arun_llm, astream_llm, cache_response, response_cache, semantic_cache
+from app.utils.json_stream import StreamingJSONExtractor
 from app.utils.json_validator import extract_json_from_response, validate_n8n_workflow
 import logging
 from fastapi import Path
-from app.n8n_client import update_workflow_in_n8n
-from app.n8n_client import get_workflow_by_id
-from app.n8n_client import create_workflow
+from app.n8n_client import aupdate_workflow_in_n8n
+from app.n8n_client import aget_workflow_by_id
+from app.n8n_client import acreate_workflow
+from app.n8n_client import close_n8n_client
+from app.n8n_client import workflow_cache
+from app.services.llm_pool import init_llm_pool, get_llm_pool, close_llm_pool
+from app.services.langchain_service import (
+    UsageCallback, conversation_messages, conversation_store, history_messages, record_turn, warm_up,
+)
+from app.services.pipeline_stats import StageTimings, pipeline_stats, update_stats
+from app.services.prompt_registry import prompt_registry
+from app.services.metrics import bind_usage, conversation_usage, prompt_usage, render_metrics
+from app.services.rate_limiter import rate_limiter
+from app.services.job_queue import JobQueue, JobStore
+from app.services.single_flight import single_flight_stats
+from app.services.tracing import (
+    TracingMiddleware, close_tracing, configure_tracing, current_trace_id, otlp_json, start_trace, trace_buffer,
+    tracing_stats,
+)
+from app.services.response_cache import normalize_prompt
+from app.services.workflow_repair import repair_unparsed, repair_workflow
+from app.services.workflow_transfer import WorkflowImporter, aexport_workflows
+from app.services.workflow_update import WorkflowUpdateError, update_with_patch
+from app.utils.structured_logging import log_payload, logging_stats, setup_logging
+from app.utils.workflow_codec import decode_workflow, encode_for_prompt
+from app.config import settings
+from contextlib import asynccontextmanager, nullcontext
 
-logging.basicConfig(level=logging.INFO)
+setup_logging(
+    settings.log_level,
+    settings.log_format,
+    settings.log_queue_size,
+    settings.log_payload_max_chars,
+    settings.log_payload_sample_rate,
+)
 logger = logging.getLogger(__name__)
+configure_tracing(settings.trace_enabled, settings.trace_buffer_size, settings.trace_export_path)
 
-app = FastAPI(title="SMARTFLOW n8n Workflow Generator")
+
+job_queue = None
+warmup_task = None
+
+
+async def _warm_up():
+    try:
+        await asyncio.to_thread(warm_up)
+    except Exception as e:
+        logger.warning(f"LLM warm-up failed, the first request will create its client: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared clients live for the whole process and are closed on shutdown
+    global job_queue, warmup_task
+    init_llm_pool()
+    job_queue = JobQueue(
+        JobStore(settings.job_sqlite_path),
+        {"generate": _run_generation_job},
+        concurrency=settings.job_workers,
+        retention=settings.job_retention,
+        poll_interval=settings.job_poll_interval,
+        callback_hosts=settings.job_callback_allowed_hosts,
+        callback_allow_private=settings.job_callback_allow_private,
+    )
+    await job_queue.start()
+    # The slow imports behind the first LLM call happen while the server is already answering
+    warmup_task = asyncio.create_task(_warm_up()) if settings.llm_warmup else None
+    yield
+    if warmup_task is not None:
+        await warmup_task
+    await job_queue.stop()
+    await close_llm_pool()
+    await close_n8n_client()
+    conversation_store.close()
+    rate_limiter.close()
+    close_tracing()
+
+
+app = FastAPI(title="SMARTFLOW n8n Workflow Generator", lifespan=lifespan)
+# One trace per request (see GET /debug/traces); the scrape and debug endpoints would only crowd the buffer
+app.add_middleware(TracingMiddleware, exclude=("/health", "/metrics", "/stats", "/debug/traces"))
+
+
+def _bypass_cache(cache_control: Optional[str], x_cache_bypass: Optional[str]) -> bool:
+    # Either "Cache-Control: no-cache" or "X-Cache-Bypass: 1/true" forces a fresh completion
+    if cache_control and "no-cache" in cache_control.lower():
+        return True
+    return (x_cache_bypass or "").strip().lower() in ("1", "true", "yes")
 
 
 @app.post("/generate-workflow", response_model=WorkflowResponse)
-async def generate_workflow(request: WorkflowRequest):
+async def generate_workflow(
+    request: WorkflowRequest,
+    cache_control: Optional[str] = Header(None),
+    x_cache_bypass: Optional[str] = Header(None),
+):
     logger.info(f"Received workflow generation request: {request}")
+    bind_usage("generate", request.conversation_id)
+    return await _generate(
+        request.prompt, _bypass_cache(cache_control, x_cache_bypass), request.conversation_id, StageTimings()
+    )
+
+
+async def _generate(prompt: str, bypass: bool, conversation_id: Optional[str], timings: StageTimings,
+                    create_slots: Optional[asyncio.Semaphore] = None) -> WorkflowResponse:
+    """
+    The whole generation pipeline: completion, extraction, validation (and
+    repair), creation in n8n. ``create_slots`` bounds how many callers create
+    workflows in n8n at once.
+    """
+    history = await history_messages(conversation_id)
     try:
-        chain = get_llm_chain()
-        logger.info("LangChain conversation chain initialized.")
-        response = chain.run(request.prompt)
-        logger.info(f"LLM response: {response}")
-        workflow_json = extract_json_from_response(response)
+        usage = UsageCallback()
+        with timings.stage("llm"):
+            response = await arun_llm(
+                prompt,
+                operation="generate",
+                bypass_cache=bypass,
+                store=False,
+                usage=usage,
+                history=history,
+            )
+        timings.add_usage("llm", usage.prompt_tokens, usage.completion_tokens, calls=usage.calls)
+        logger.info("LLM response: %s", log_payload(response))
+        with timings.stage("extract"):
+            workflow_json = extract_json_from_response(response)
     except Exception as e:
         logger.error(f"Error during LLM processing: {e}")
+        pipeline_stats.record(timings, "llm_error")
         return WorkflowResponse(
             name="Error Workflow",
             nodes=[],
@@ -34,18 +149,52 @@ async def generate_workflow(request: WorkflowRequest):
             error=f"API Error: {str(e)}"
         )
    # logger.info(f"Extracted workflow JSON: {workflow_json}")
+    return await _complete_generation(prompt, response, workflow_json, timings, history, conversation_id, create_slots)
+
+
+async def _complete_generation(prompt: str, response: str, workflow_json, timings: StageTimings,
+                               history: list = None, conversation_id: str = None,
+                               create_slots: Optional[asyncio.Semaphore] = None) -> WorkflowResponse:
+    """
+    Validate an extracted workflow (patching it up through the repair loop
+    if needed, or rebuilding it there if none could be extracted), remember
+    the completion and create the workflow in n8n. The conversation, if
+    any, gets the workflow as the assistant's turn.
+    """
+    repaired = False
+    if not workflow_json and settings.repair_enabled:
+        logger.warning("Could not extract JSON from LLM response; asking the model to rebuild it")
+        try:
+            fixed = await repair_unparsed(response, timings)
+        except Exception as e:
+            logger.error(f"Error during workflow repair: {e}")
+            fixed = None
+        if fixed is not None:
+            workflow_json, response, repaired = fixed, json.dumps(fixed), True
     if not workflow_json:
         logger.error("Could not extract valid JSON from LLM response.")
+        pipeline_stats.record(timings, "no_json")
         return WorkflowResponse(
             name="Error Workflow",
             nodes=[],
             connections={},
             error="Could not extract valid JSON from LLM response"
         )
-    is_valid, message = validate_n8n_workflow(workflow_json)
+    with timings.stage("validate"):
+        is_valid, message = validate_n8n_workflow(workflow_json)
     logger.info(f"Workflow validation result: {is_valid}, message: {message}")
+    if not is_valid and settings.repair_enabled:
+        try:
+            fixed = await repair_workflow(workflow_json, timings)
+        except Exception as e:
+            logger.error(f"Error during workflow repair: {e}")
+            fixed = None
+        if fixed is not None:
+            # Cache the repaired workflow so a replay doesn't pay for the repair again
+            workflow_json, response, is_valid, repaired = fixed, json.dumps(fixed), True, True
     if not is_valid:
         logger.error(f"Workflow validation failed: {message}")
+        pipeline_stats.record(timings, "invalid")
         return WorkflowResponse(
             name="Error Workflow",
             nodes=[],
@@ -53,18 +202,27 @@ async def generate_workflow(request: WorkflowRequest):
             error=message
         )
     logger.info("Workflow successfully generated and validated.")
+    # Only completions that produced a valid workflow are worth replaying
+    await cache_response("generate", prompt, response, history)
+    # Plain n8n JSON, the format the generate template asks for: a compact encoding here would
+    # show the model earlier answers in a format it must not reply in
+    await record_turn(conversation_id, prompt, json.dumps(workflow_json, separators=(",", ":"), ensure_ascii=False))
     
     # Automatically create the workflow in n8n
     logger.info("Creating workflow in n8n...")
-    n8n_result = create_workflow(workflow_json)
+    async with create_slots or nullcontext():
+        with timings.stage("n8n_create"):
+            n8n_result = await acreate_workflow(workflow_json)
     
     if n8n_result.get("success"):
         logger.info("Workflow successfully created in n8n")
+        pipeline_stats.record(timings, "created_after_repair" if repaired else "created")
         # Add n8n creation info to the response
         workflow_response = WorkflowResponse(**workflow_json)
         return workflow_response
     else:
         logger.error(f"Failed to create workflow in n8n: {n8n_result.get('message')}")
+        pipeline_stats.record(timings, "n8n_error")
         return WorkflowResponse(
             name=workflow_json.get("name", "Error Workflow"),
             nodes=workflow_json.get("nodes", []),
@@ -72,32 +230,259 @@ async def generate_workflow(request: WorkflowRequest):
             error=f"Workflow generated but failed to create in n8n: {n8n_result.get('message')}"
         )
 
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+# Streaming variants: tokens are forwarded as Server-Sent Events while the
+# completion is still running. Generation additionally emits a "node" event
+# for every node object as soon as it closes, then a final "workflow" event
+# carrying the same payload /generate-workflow would have returned.
+@app.post("/generate-workflow/stream")
+async def generate_workflow_stream(
+    request: WorkflowRequest,
+    cache_control: Optional[str] = Header(None),
+    x_cache_bypass: Optional[str] = Header(None),
+):
+    logger.info(f"Received streaming workflow generation request: {request}")
+    bind_usage("generate_stream", request.conversation_id)
+    bypass = _bypass_cache(cache_control, x_cache_bypass)
+    return StreamingResponse(
+        _generation_events(request.prompt, bypass, request.conversation_id),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+async def _generation_events(prompt: str, bypass: bool, conversation_id: Optional[str] = None):
+    extractor = StreamingJSONExtractor(repair=True)
+    timings = StageTimings()
+    history = await history_messages(conversation_id)
+    parts = []
+    try:
+        # Extraction runs inside the stream here, so it is part of the llm stage
+        with timings.stage("llm"):
+            async for text in astream_llm(prompt, operation="generate", bypass_cache=bypass, store=False, history=history):
+                parts.append(text)
+                yield _sse("token", {"text": text})
+                for kind, value in extractor.feed(text):
+                    if kind == "node":
+                        yield _sse("node", value)
+    except Exception as e:
+        logger.error(f"Error during streamed LLM processing: {e}")
+        pipeline_stats.record(timings, "llm_error")
+        yield _sse("error", {"error": f"API Error: {str(e)}"})
+        return
+    response = "".join(parts)
+    workflow_json = extractor.close()
+    result = await _complete_generation(prompt, response, workflow_json, timings, history, conversation_id)
+    yield _sse("workflow", result.model_dump())
+    yield _sse("done", {})
+
+
+# Batch mode: many prompts in one request. Identical prompts (after the response cache's normalization)
+# are generated once; the rest run concurrently, bounded by the LLM rate limiter and batch_n8n_concurrency.
+@app.post("/generate-workflows:batch")
+async def generate_workflows_batch(
+    request: BatchRequest,
+    cache_control: Optional[str] = Header(None),
+    x_cache_bypass: Optional[str] = Header(None),
+):
+    logger.info(f"Received batch generation request with {len(request.prompts)} prompts")
+    if not request.prompts or len(request.prompts) > settings.batch_max_prompts:
+        return JSONResponse(
+            status_code=400,
+            content={"success": False, "error": f"A batch takes 1 to {settings.batch_max_prompts} prompts"},
+        )
+    bind_usage("generate_batch")
+    bypass = _bypass_cache(cache_control, x_cache_bypass)
+    started = time.perf_counter()
+
+    first_index = {}
+    leaders = [first_index.setdefault(normalize_prompt(prompt), index) for index, prompt in enumerate(request.prompts)]
+    unique = sorted(first_index.values())
+    create_slots = asyncio.Semaphore(settings.batch_n8n_concurrency)
+
+    async def run(index: int) -> dict:
+        timings = StageTimings()
+        item_started = time.perf_counter()
+        try:
+            result = await _generate(request.prompts[index], bypass, None, timings, create_slots)
+        except Exception as e:
+            logger.error(f"Batch item {index} failed: {e}")
+            result = WorkflowResponse(name="Error Workflow", nodes=[], connections={}, error=f"API Error: {str(e)}")
+        return {
+            "result": result.model_dump(),
+            "ms": round((time.perf_counter() - item_started) * 1000, 1),
+            "timings": {name: round(stage["ms"], 1) for name, stage in timings.stages.items()},
+        }
+
+    outcomes = dict(zip(unique, await asyncio.gather(*(run(index) for index in unique))))
+    items = []
+    for index, prompt in enumerate(request.prompts):
+        item = {"index": index, "prompt": prompt, **outcomes[leaders[index]]}
+        if leaders[index] != index:
+            item["duplicate_of"] = leaders[index]
+        item["success"] = item["result"]["error"] is None
+        items.append(item)
+    item_ms = [outcome["ms"] for outcome in outcomes.values()]
+    return {
+        "items": items,
+        "summary": {
+            "prompts": len(items),
+            "unique": len(unique),
+            "succeeded": sum(1 for item in items if item["success"]),
+            "failed": sum(1 for item in items if not item["success"]),
+            "wall_ms": round((time.perf_counter() - started) * 1000, 1),
+            "slowest_item_ms": max(item_ms),
+            "sum_item_ms": round(sum(item_ms), 1),
+        },
+    }
+
+
+# Job mode: the POST returns a job id at once and a background worker runs the same pipeline as
+# /generate-workflow. Poll GET /jobs/{id}, stream GET /jobs/{id}/events, or pass a callback_url.
+@app.post("/generate-workflow/jobs", status_code=202)
+async def submit_generation_job(
+    request: JobRequest,
+    cache_control: Optional[str] = Header(None),
+    x_cache_bypass: Optional[str] = Header(None),
+):
+    logger.info(f"Received workflow generation job: {request.prompt}")
+    callback_url = str(request.callback_url) if request.callback_url else None
+    if callback_url:
+        blocked = await job_queue.check_callback_url(callback_url)
+        if blocked is not None:
+            return JSONResponse(status_code=422, content={"success": False, "error": blocked})
+    job = await job_queue.submit(
+        "generate",
+        {
+            "prompt": request.prompt,
+            "conversation_id": request.conversation_id,
+            "bypass_cache": _bypass_cache(cache_control, x_cache_bypass),
+            "trace_id": current_trace_id(),
+        },
+        callback_url=callback_url,
+    )
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "links": {"self": f"/jobs/{job['id']}", "events": f"/jobs/{job['id']}/events"},
+    }
+
+
+async def _run_generation_job(request: dict, progress) -> tuple:
+    bind_usage("generate_job", request.get("conversation_id"))
+    # The worker runs outside the submitting request, so the job gets a trace of its own that points back to it
+    with start_trace("job generate", attributes={"submitted_by_trace": request.get("trace_id") or ""}):
+        timings = StageTimings(listener=progress)
+        result = await _generate(request["prompt"], request.get("bypass_cache", False), request.get("conversation_id"), timings)
+    return result.model_dump(), result.error
+
+
+def _job_not_found(job_id: str) -> JSONResponse:
+    return JSONResponse(status_code=404, content={"success": False, "error": f"Job {job_id} not found"})
+
+
+@app.get("/jobs")
+async def list_jobs(status: Optional[str] = None, limit: int = Query(50, ge=1, le=500)):
+    return {"jobs": await job_queue.list(status, limit)}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str = Path(...)):
+    job = await job_queue.get(job_id)
+    return job if job is not None else _job_not_found(job_id)
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str = Path(...)):
+    if await job_queue.get(job_id) is None:
+        return _job_not_found(job_id)
+    return StreamingResponse(_job_events(job_id), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+async def _job_events(job_id: str):
+    async for event, data in job_queue.events(job_id):
+        yield _sse(event, data)
+    yield _sse("done", {})
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str = Path(...)):
+    if await job_queue.get(job_id) is None:
+        return _job_not_found(job_id)
+    if not await job_queue.cancel(job_id):
+        return {"success": False, "error": "Only queued jobs can be cancelled"}
+    return {"success": True}
+
+
+@app.post("/describe-workflow/stream")
+async def describe_workflow_stream(
+    request: WorkflowRequest,
+    cache_control: Optional[str] = Header(None),
+    x_cache_bypass: Optional[str] = Header(None),
+):
+    logger.info(f"Received streaming workflow description request: {request.prompt}")
+    bind_usage("describe_stream", request.conversation_id)
+    bypass = _bypass_cache(cache_control, x_cache_bypass)
+    turn = await _describe_turn(request)
+    if turn is None:
+        return _unknown_workflow_ref(request)
+    return StreamingResponse(
+        _description_events(request, turn, bypass),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+async def _description_events(request: WorkflowRequest, turn: tuple, bypass: bool):
+    prompt, history, question, context = turn
+    parts = []
+    try:
+        async for text in astream_llm(prompt, operation="describe", bypass_cache=bypass, history=history):
+            parts.append(text)
+            yield _sse("token", {"text": text})
+    except Exception as e:
+        logger.error(f"Error during streamed description generation: {e}")
+        yield _sse("error", {"error": _describe_error_message(e)})
+        return
+    await record_turn(request.conversation_id, question, "".join(parts), context)
+    yield _sse("done", {"workflow_ref": context["id"] if context else None})
+
+
 @app.put("/workflows/{workflow_id}")
-async def update_workflow(workflow_id: str = Path(...), request: WorkflowRequest = None):
+async def update_workflow(
+    workflow_id: str = Path(...),
+    request: WorkflowRequest = None,
+    mode: Optional[str] = Query(None, pattern="^(diff|full)$"),
+):
     logger.info(f"Update request received for workflow ID: {workflow_id} with prompt: {request.prompt}")
+    bind_usage("update", request.conversation_id)
     try:
         # First, get the current workflow from n8n
-        current_workflow = get_workflow_by_id(workflow_id)
+        current_workflow = await aget_workflow_by_id(workflow_id)
         
         if not current_workflow or not current_workflow.get("success"):
             return {"success": False, "error": "Could not fetch current workflow from n8n"}
         
-        # Create a comprehensive prompt with the current workflow
-        import json
         current_workflow_json = current_workflow.get("data", {})
-        full_prompt = f"""Update this existing n8n workflow based on the user's request.
-        
-User request: {request.prompt}
-        
-Current workflow JSON:
-{json.dumps(current_workflow_json, indent=2)}
-        
-Return the updated workflow JSON with the requested changes."""
-        
+        if (mode or settings.workflow_update_mode) == "diff":
+            return await _update_with_patch(workflow_id, current_workflow_json, request.prompt, request.conversation_id)
+
+        # The current workflow in the compact encoding, then the request; the instructions are the "update" template
+        full_prompt = f"Current workflow:\n{encode_for_prompt(current_workflow_json)}\n\nUser request: {request.prompt}"
+
         try:
-            chain = get_llm_chain()
-            updated_response = chain.run(full_prompt)
+            chain = get_llm_chain(await history_messages(request.conversation_id), operation="update")
+            updated_response = await chain.arun(full_prompt)
             workflow_json = extract_json_from_response(updated_response)
+            if workflow_json:
+                workflow_json = decode_workflow(workflow_json, current_workflow_json)
         except Exception as e:
             logger.error(f"Error during workflow update LLM processing: {e}")
             return {"success": False, "error": f"API Error: {str(e)}"}
@@ -105,7 +490,9 @@ Return the updated workflow JSON with the requested changes."""
         if not workflow_json:
             return {"success": False, "error": "Invalid updated workflow JSON from LLM."}
 
-        update_result = update_workflow_in_n8n(workflow_id, workflow_json)
+        update_result = await aupdate_workflow_in_n8n(workflow_id, workflow_json)
+        if update_result.get("success"):
+            await record_turn(request.conversation_id, request.prompt, _update_reply(workflow_id))
 
         return update_result
     except Exception as e:
@@ -113,37 +500,251 @@ Return the updated workflow JSON with the requested changes."""
         return {"success": False, "error": str(e)}
 
 
+async def _update_with_patch(workflow_id: str, current_workflow_json: dict, instruction: str,
+                             conversation_id: Optional[str] = None) -> dict:
+    """Diff mode: the model sees a compact view and answers with a patch we apply here."""
+    timings = StageTimings()
+    try:
+        workflow_json = await update_with_patch(
+            current_workflow_json, instruction, timings, await history_messages(conversation_id)
+        )
+    except WorkflowUpdateError as e:
+        logger.error(f"Workflow update failed: {e}")
+        update_stats.record(timings, "invalid")
+        return {"success": False, "error": f"Invalid workflow update from LLM: {e}"}
+    except Exception as e:
+        logger.error(f"Error during workflow update LLM processing: {e}")
+        update_stats.record(timings, "llm_error")
+        return {"success": False, "error": f"API Error: {str(e)}"}
+
+    with timings.stage("n8n_update"):
+        update_result = await aupdate_workflow_in_n8n(workflow_id, workflow_json)
+    update_stats.record(timings, "updated" if update_result.get("success") else "n8n_error")
+    if update_result.get("success"):
+        await record_turn(conversation_id, instruction, _update_reply(workflow_id))
+    return update_result
+
+
+def _update_reply(workflow_id: str) -> str:
+    # Every update prompt carries the current workflow, so the history only needs to note that the edit happened
+    return f"Updated workflow {workflow_id} as requested."
+
+
 
 @app.post("/describe-workflow")
-async def describe_workflow(request: WorkflowRequest):
+async def describe_workflow(
+    request: WorkflowRequest,
+    cache_control: Optional[str] = Header(None),
+    x_cache_bypass: Optional[str] = Header(None),
+):
     logger.info(f"Received workflow description request: {request.prompt}")
+    bind_usage("describe", request.conversation_id)
+    turn = await _describe_turn(request)
+    if turn is None:
+        return _unknown_workflow_ref(request)
+    prompt, history, question, context = turn
     try:
-        chain = get_llm_chain()
-        logger.info("LangChain conversation chain initialized for description.")
-        response = chain.run(request.prompt)
-        logger.info(f"LLM description response: {response}")
+        response = await arun_llm(
+            prompt,
+            operation="describe",
+            bypass_cache=_bypass_cache(cache_control, x_cache_bypass),
+            history=history,
+        )
+        logger.info("LLM description response: %s", log_payload(response))
+        await record_turn(request.conversation_id, question, response, context)
         
-        # Return the raw response for descriptions
-        return {"description": response}
+        # Return the raw response for descriptions, and the id to send instead of the workflow next turn
+        return {"description": response, "workflow_ref": context["id"] if context else None}
     except Exception as e:
         logger.error(f"Error during description generation: {e}")
-        error_msg = str(e)
-        if "rate limit" in error_msg.lower() or "429" in error_msg:
-            return {"description": "I'm currently experiencing high demand. Please try again in a few moments."}
-        else:
-            return {"description": "I'm here to help you with n8n workflows! Please try your request again."}
+        return {"description": _describe_error_message(e)}
+
+
+async def _describe_turn(request: WorkflowRequest) -> Optional[tuple]:
+    """
+    ``(prompt, history, question, context)`` for a describe request, or None
+    if it names a ``workflow_ref`` its conversation doesn't hold.
 
-# Endpoint to get all workflows from n8n public API
+    The workflow goes to the model in compact form, and in a conversation only
+    once: it is pinned to the conversation as its context, sent as the first
+    message of the history, and questions refer to it by id. Clients send it
+    again only when it changes (its id is a hash of the encoding) and pass
+    ``workflow_ref`` otherwise. ``question`` is what goes into the history.
+    """
+    conversation = {"messages": [], "summary": "", "context": None}
+    if request.conversation_id:
+        conversation = await conversation_store.aget(request.conversation_id)
+    context = conversation["context"]
+    if request.workflow:
+        encoded = encode_for_prompt(request.workflow)
+        context = {"id": hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:12], "content": encoded}
+    elif request.workflow_ref and (context is None or context["id"] != request.workflow_ref):
+        return None
+    if context is None:
+        return request.prompt, conversation_messages(conversation), request.prompt, None
+    question = f"Question about workflow {context['id']}: {request.prompt}"
+    workflow = f"Workflow {context['id']}:\n{context['content']}"
+    if not conversation["messages"] and not conversation["summary"]:
+        # First turn: one message, so the answer can still be served from and stored in the response cache.
+        # Its workflow part is the same text later turns open their history with, so it stays a cached prefix.
+        return f"{workflow}\n\n{question}", [], question, context
+    return question, conversation_messages(conversation, lead=workflow), question, context
+
+
+def _unknown_workflow_ref(request: WorkflowRequest) -> JSONResponse:
+    logger.info(f"Workflow {request.workflow_ref} is not the context of conversation {request.conversation_id}")
+    return JSONResponse(status_code=409, content={
+        "success": False, "error": f"Unknown workflow_ref {request.workflow_ref}; send the workflow again",
+    })
+
+
+def _describe_error_message(e: Exception) -> str:
+    error_msg = str(e)
+    if "rate limit" in error_msg.lower() or "429" in error_msg:
+        return "I'm currently experiencing high demand. Please try again in a few moments."
+    else:
+        return "I'm here to help you with n8n workflows! Please try your request again."
+
+# Endpoint to get all workflows from n8n public API.
+# - default: every workflow, following n8n's cursor across pages
+# - cursor/limit: a single page plus its nextCursor
+# - stream=true: NDJSON, one workflow per line, never buffering the full list
+# - summary=true: only id/name/active/updatedAt per workflow
 @app.get("/get_all_workflows")
-async def get_all_workflows_endpoint():
+async def get_all_workflows_endpoint(
+    summary: bool = False,
+    stream: bool = False,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=250),
+):
+    if stream:
+        return StreamingResponse(_stream_workflows(limit, summary), media_type="application/x-ndjson")
     try:
-        result = n8n_get_all_workflows()
-        return result
+        if cursor or limit:
+            return await an8n_list_workflows_page(cursor, limit, summary)
+        return await an8n_get_all_workflows(summary=summary)
     except Exception as e:
         logger.error(f"Failed to fetch workflows from n8n: {e}")
         return {"success": False, "error": str(e)}
 
 
+async def _stream_workflows(limit, summary):
+    try:
+        async for workflow in aiter_workflows(limit=limit, summary=summary):
+            yield json.dumps(workflow) + "\n"
+    except Exception as e:
+        logger.error(f"Failed while streaming workflows from n8n: {e}")
+        yield json.dumps({"success": False, "error": str(e)}) + "\n"
+
+
+# Backup and migration: gzip-compressed NDJSON, one full workflow definition per line.
+# Both directions stream, so the size of the instance doesn't matter; the body of an
+# import may be gzipped or plain NDJSON.
+@app.get("/workflows:export")
+async def export_workflows(page_size: Optional[int] = Query(None, ge=1, le=250)):
+    return StreamingResponse(
+        aexport_workflows(page_size=page_size),
+        media_type="application/gzip",
+        headers={"Content-Disposition": 'attachment; filename="workflows.ndjson.gz"'},
+    )
+
+
+@app.post("/workflows:import")
+async def import_workflows(
+    request: Request,
+    mode: str = Query("create", pattern="^(create|upsert)$"),
+    concurrency: Optional[int] = Query(None, ge=1, le=64),
+    validate: bool = True,
+    dry_run: bool = False,
+):
+    importer = WorkflowImporter(mode, concurrency, validate=validate, dry_run=dry_run)
+    report = (await importer.run(request.stream())).as_dict()
+    logger.info(f"Workflow import finished: {report['created']} created, {report['updated']} updated, "
+                f"{report['workflows_per_s']} workflows/s")
+    return JSONResponse(status_code=400 if report["aborted"] else 200, content=report)
+
+
+@app.get("/workflows/{workflow_id}")
+async def get_workflow(workflow_id: str = Path(...), updated_at: Optional[str] = None):
+    return await aget_workflow_by_id(workflow_id, updated_at)
+
+
+@app.get("/conversations/{conversation_id}")
+async def get_conversation(conversation_id: str = Path(...)):
+    return dict(await conversation_store.aget(conversation_id), usage=conversation_usage.get(conversation_id))
+
+
+@app.delete("/conversations/{conversation_id}")
+async def delete_conversation(conversation_id: str = Path(...)):
+    await conversation_store.adelete(conversation_id)
+    return {"success": True}
+
+
+# Prompt templates in use (app/prompts) with their versions, and how many of their prompt tokens OpenAI served
+# from its prompt cache, per template and version.
+@app.get("/prompts")
+async def list_prompts():
+    return dict(prompt_registry.stats(), usage=prompt_usage.stats())
+
+
+# Re-read changed template files now rather than at the next check (settings.prompt_reload_interval)
+@app.post("/prompts:reload")
+async def reload_prompts():
+    changed = prompt_registry.reload()
+    return {"reloaded": changed, "templates": prompt_registry.stats()["templates"]}
+
+
+# Liveness: answers as soon as the app is up, before the LLM clients are warm
+@app.get("/health")
+async def health():
+    return {"status": "ok", "warmed_up": warmup_task is not None and warmup_task.done()}
+
+
+# Prometheus scrape endpoint: LLM calls/tokens/cost per endpoint, LLM and n8n latency, pipeline stage times.
+# Per-conversation usage is kept out of the labels (unbounded cardinality); see GET /conversations/{id}.
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/stats")
+async def stats_endpoint():
+    return {
+        "llm_pool": get_llm_pool().stats(),
+        "workflow_cache": workflow_cache.stats() if workflow_cache is not None else None,
+        "response_cache": response_cache.stats() if response_cache is not None else None,
+        "semantic_cache": semantic_cache.stats() if semantic_cache is not None else None,
+        "generation_pipeline": pipeline_stats.stats(),
+        "update_pipeline": update_stats.stats(),
+        "conversations": conversation_store.stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "jobs": await job_queue.stats() if job_queue is not None else None,
+        "single_flight": single_flight_stats(),
+        "logging": logging_stats(),
+        "tracing": tracing_stats(),
+        "prompts": prompt_registry.stats(),
+    }
+
+
+# The slowest recent requests with their spans: where the time went (LLM, queue wait, n8n, validation).
+@app.get("/debug/traces")
+async def list_traces(
+    limit: int = Query(20, ge=1, le=500),
+    name: Optional[str] = Query(None, description="only traces whose name contains this, e.g. /generate-workflow"),
+    min_ms: float = Query(0.0, ge=0.0),
+):
+    traces = trace_buffer.slowest(limit, name, min_ms)
+    return {"traces": [trace.as_dict() for trace in traces], "stats": tracing_stats()}
+
+
+@app.get("/debug/traces/{trace_id}")
+async def get_trace(trace_id: str = Path(...), format: Optional[str] = Query(None, pattern="^(otlp)$")):
+    trace = trace_buffer.get(trace_id.lower())
+    if trace is None:
+        return JSONResponse(status_code=404, content={"success": False, "error": f"Trace {trace_id} not found"})
+    return otlp_json(trace) if format == "otlp" else trace.as_dict()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,6 +1,13 @@
 # D:\AI_Project\n8n_wf_creator\app\n8n_client.py
 import os
+import time
+import random
+import asyncio
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+import httpx
 import logging
 try:
     from app.config import settings  # For FastAPI/package usage
@@ -8,15 +15,36 @@ except ImportError:
     try:
         from config import settings  # For direct/script/Streamlit usage
     except ImportError:
-        # Fallback to environment variables only
+        # Fallback to environment variables only (app.config loads .env otherwise)
+        from dotenv import load_dotenv
+        load_dotenv()
+
         class Settings:
             def __init__(self):
                 self.openai_api_key = os.getenv("OPENAI_API_KEY")
                 self.n8n_api_base_url = os.getenv("N8N_API_BASE_URL")
                 self.n8n_api_key = os.getenv("N8N_API_KEY")
         settings = Settings()
-from dotenv import load_dotenv
-load_dotenv()  # Load environment variables from .env file
+try:
+    from app.services.workflow_cache import WorkflowCache, summarize_workflow
+except ImportError:
+    from services.workflow_cache import WorkflowCache, summarize_workflow
+try:
+    from app.utils.structured_logging import log_payload
+except ImportError:
+    from utils.structured_logging import log_payload
+try:
+    from app.services.single_flight import SingleFlight
+except ImportError:
+    from services.single_flight import SingleFlight
+try:
+    from app.services.tracing import SPAN_KIND_CLIENT, span, trace_headers
+except ImportError:
+    from services.tracing import SPAN_KIND_CLIENT, span, trace_headers
+try:
+    from app.services.metrics import n8n_latency
+except ImportError:
+    n8n_latency = None  # Metrics are only collected inside the FastAPI app
 
 
 logger = logging.getLogger(__name__)
@@ -30,28 +58,262 @@ HEADERS = {
     "X-N8N-API-KEY": N8N_API_KEY
 }
 
+# Read timeouts per operation; listing pulls whole workflow graphs so it gets longer.
+DEFAULT_READ_TIMEOUTS = {
+    "create": 30.0,
+    "list": 60.0,
+    "get": 15.0,
+    "update": 30.0,
+}
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "PUT", "DELETE", "HEAD"}
 
-def create_workflow(workflow_json: dict) -> dict:
-    url = f"{N8N_API_BASE_URL}/workflows"
-    payload = {
-        "name": workflow_json.get("name", "Untitled Workflow"),
+# n8n caps list pages at 250
+WORKFLOW_PAGE_SIZE = 100
+
+
+class N8nAPIError(Exception):
+    """Raised by the workflow iterators when n8n returns an error page."""
+
+
+def _connect_failed(error: requests.RequestException) -> bool:
+    """
+    Whether a requests error means the request never reached n8n, like
+    httpx's ConnectError/ConnectTimeout. Any other connection error ("Connection
+    aborted", a read timeout) may come after n8n got the body.
+    """
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = error.args[0] if error.args else None
+    # requests wraps urllib3's MaxRetryError, whose reason is the underlying error
+    reason = getattr(reason, "reason", reason)
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+class N8nClient:
+    """
+    Shared client for the n8n public API.
+
+    Owns one keep-alive requests.Session for sync callers and one
+    httpx.AsyncClient for the API handlers, both bounded to ``pool_size``
+    connections. Every call uses the connect/read timeout of its operation
+    and is retried with jittered exponential backoff on 429/5xx responses
+    and connection errors. POST is not idempotent, so it is only retried
+    when n8n explicitly asks us to slow down (429/503) or when the
+    connection could not be established.
+    """
+
+    def __init__(self, base_url=N8N_API_BASE_URL, headers=None, pool_size=None,
+                 connect_timeout=None, read_timeout=None, operation_timeouts=None,
+                 max_retries=None, backoff_base=None, backoff_max=None):
+        self.base_url = (base_url or "").rstrip("/")
+        self.headers = dict(headers or HEADERS)
+        self.pool_size = pool_size or getattr(settings, "n8n_pool_size", 10)
+        self.connect_timeout = connect_timeout or getattr(settings, "n8n_connect_timeout", 5.0)
+        self.read_timeout = read_timeout or getattr(settings, "n8n_read_timeout", 30.0)
+        self.timeouts = {op: (self.connect_timeout, read) for op, read in DEFAULT_READ_TIMEOUTS.items()}
+        overrides = operation_timeouts if operation_timeouts is not None else getattr(settings, "n8n_operation_timeouts", {})
+        for op, (connect, read) in (overrides or {}).items():
+            self.timeouts[op] = (float(connect), float(read))
+        self.max_retries = max_retries if max_retries is not None else getattr(settings, "n8n_max_retries", 3)
+        self.backoff_base = backoff_base or getattr(settings, "n8n_backoff_base", 0.5)
+        self.backoff_max = backoff_max or getattr(settings, "n8n_backoff_max", 8.0)
+        self._session = None
+        self._async_client = None
+        self._lock = threading.Lock()
+
+    # -- transports ---------------------------------------------------------
+
+    @property
+    def session(self) -> requests.Session:
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, pool_block=True)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers.update(self.headers)
+                self._session = session
+            return self._session
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None or self._async_client.is_closed:
+            self._async_client = httpx.AsyncClient(
+                headers=self.headers,
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+            )
+        return self._async_client
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    async def aclose(self):
+        self.close()
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    # -- retry policy -------------------------------------------------------
+
+    def _timeout(self, operation):
+        return self.timeouts.get(operation, (self.connect_timeout, self.read_timeout))
+
+    def _should_retry_status(self, method, status_code):
+        if status_code not in RETRYABLE_STATUS_CODES:
+            return False
+        return method in IDEMPOTENT_METHODS or status_code in (429, 503)
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        # Full jitter keeps concurrent callers from retrying in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _observe(self, operation, status, started):
+        if n8n_latency is not None:
+            n8n_latency.observe(time.perf_counter() - started, operation, status)
+
+    def _traced(self, kwargs) -> dict:
+        """kwargs with the current trace's headers added, so n8n's logs can be matched to ours."""
+        headers = trace_headers()
+        if not headers:
+            return kwargs
+        return dict(kwargs, headers={**headers, **(kwargs.get("headers") or {})})
+
+    def request(self, method, path, operation, **kwargs) -> requests.Response:
+        method = method.upper()
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            started = time.perf_counter()
+            try:
+                with span(f"n8n.{operation}", SPAN_KIND_CLIENT, attempt=attempt + 1) as call:
+                    response = self.session.request(method, url, timeout=self._timeout(operation), **self._traced(kwargs))
+                    if call is not None:
+                        call.attributes["http.status_code"] = response.status_code
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._observe(operation, "error", started)
+                connect_failed = _connect_failed(e)
+                if last_attempt or not (method in IDEMPOTENT_METHODS or connect_failed):
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"n8n {operation} failed ({e}), retrying in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries})")
+                with span("n8n.backoff", delay_s=round(delay, 3)):
+                    time.sleep(delay)
+                continue
+            self._observe(operation, str(response.status_code), started)
+            if last_attempt or not self._should_retry_status(method, response.status_code):
+                return response
+            delay = self._backoff(attempt, response.headers.get("Retry-After"))
+            logger.warning(f"n8n {operation} returned {response.status_code}, retrying in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries})")
+            with span("n8n.backoff", delay_s=round(delay, 3)):
+                time.sleep(delay)
+
+    async def arequest(self, method, path, operation, **kwargs) -> httpx.Response:
+        method = method.upper()
+        url = f"{self.base_url}{path}"
+        connect, read = self._timeout(operation)
+        timeout = httpx.Timeout(read, connect=connect)
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            started = time.perf_counter()
+            try:
+                with span(f"n8n.{operation}", SPAN_KIND_CLIENT, attempt=attempt + 1) as call:
+                    response = await self.async_client.request(method, url, timeout=timeout, **self._traced(kwargs))
+                    if call is not None:
+                        call.attributes["http.status_code"] = response.status_code
+            except httpx.TransportError as e:
+                self._observe(operation, "error", started)
+                connect_failed = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                if last_attempt or not (method in IDEMPOTENT_METHODS or connect_failed):
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"n8n {operation} failed ({e!r}), retrying in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries})")
+                with span("n8n.backoff", delay_s=round(delay, 3)):
+                    await asyncio.sleep(delay)
+                continue
+            self._observe(operation, str(response.status_code), started)
+            if last_attempt or not self._should_retry_status(method, response.status_code):
+                return response
+            delay = self._backoff(attempt, response.headers.get("Retry-After"))
+            logger.warning(f"n8n {operation} returned {response.status_code}, retrying in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries})")
+            with span("n8n.backoff", delay_s=round(delay, 3)):
+                await asyncio.sleep(delay)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_n8n_client() -> N8nClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = N8nClient()
+        return _client
+
+
+async def close_n8n_client():
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        await client.aclose()
+
+
+# Workflows read from or written to n8n are kept here so repeated list/get
+# calls (Streamlit reruns, the read-before-update in the PUT handler) are
+# served from memory. Set workflow_cache_enabled=false to always hit n8n.
+workflow_cache = WorkflowCache(
+    ttl=getattr(settings, "workflow_cache_ttl", 60.0),
+    max_bytes=getattr(settings, "workflow_cache_max_bytes", 32 * 1024 * 1024),
+) if getattr(settings, "workflow_cache_enabled", True) else None
+
+
+# Identical reads that overlap in time (every Streamlit rerun lists workflows)
+# share one request to n8n; each caller gets its own copy of the result.
+get_flight = SingleFlight("n8n_get", copy_results=True)
+list_flight = SingleFlight("n8n_list", copy_results=True)
+
+
+def _cache_created(result: dict):
+    if workflow_cache is not None and result.get("success") and isinstance(result.get("data"), dict):
+        workflow_cache.put(result["data"])
+
+
+def _cache_updated(workflow_id: str, response, result: dict):
+    if workflow_cache is None:
+        return
+    if result.get("success"):
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        if isinstance(body, dict) and body.get("id") is not None:
+            workflow_cache.put(body)
+            return
+    workflow_cache.invalidate(workflow_id)
+
+
+def _workflow_payload(workflow_json: dict, default_name: str) -> dict:
+    return {
+        "name": workflow_json.get("name", default_name),
         "nodes": workflow_json.get("nodes", []),
         "connections": workflow_json.get("connections", {}),
-        "settings": {}
+        # Kept when present (imported backups); generated workflows have none
+        "settings": workflow_json.get("settings") or {}
     }
-    logger.info(f"Sending workflow to n8n: {payload}")
-    try:
-        response = requests.post(url, headers=HEADERS, json=payload)
-        logger.info(f"n8n API response status: {response.status_code}")
-        logger.info(f"n8n API response text: {response.text}")
-    except Exception as e:
-        logger.error(f"Exception while calling n8n API: {e}")
-        return {
-            "success": False,
-            "status_code": None,
-            "message": str(e)
-        }
 
+
+def _create_result(response) -> dict:
     if response.status_code in (200, 201):
         return {
             "success": True,
@@ -65,71 +327,167 @@ def create_workflow(workflow_json: dict) -> dict:
         }
 
 
-def n8n_get_all_workflows() -> dict:
-    url = f"{N8N_API_BASE_URL}/workflows"
-    try:
-        response = requests.get(url, headers=HEADERS)
-        logger.info(f"n8n API response status: {response.status_code}")
-        logger.info(f"n8n API response text: {response.text}")
-    except Exception as e:
-        logger.error(f"Exception while calling n8n API: {e}")
+def _page_params(cursor, limit) -> dict:
+    params = {"limit": limit or WORKFLOW_PAGE_SIZE}
+    if cursor:
+        params["cursor"] = cursor
+    return params
+
+
+def _page_result(response, summary: bool) -> dict:
+    if response.status_code == 200:
+        body = response.json()
+        workflows = body.get("data", [])
+        if summary:
+            workflows = [summarize_workflow(wf) for wf in workflows]
+        return {
+            "success": True,
+            "data": workflows,
+            "nextCursor": body.get("nextCursor")
+        }
+    else:
         return {
             "success": False,
-            "error": str(e)
+            "error": response.text
         }
 
+
+def _get_result(response) -> dict:
     if response.status_code == 200:
-        workflows = response.json().get("data", [])
         return {
             "success": True,
-            "data": workflows
+            "data": response.json()
         }
     else:
         return {
             "success": False,
             "error": response.text
         }
-    
 
-def get_workflow_by_id(workflow_id: str) -> dict:
-    url = f"{N8N_API_BASE_URL}/workflows/{workflow_id}"
+
+def _update_result(response, workflow_json: dict) -> dict:
+    if response.status_code in (200, 204):
+        return {
+            "success": True,
+            "data": workflow_json
+        }
+    else:
+        return {
+            "success": False,
+            "status_code": response.status_code,
+            "message": response.text
+        }
+
+
+def create_workflow(workflow_json: dict) -> dict:
+    payload = _workflow_payload(workflow_json, "Untitled Workflow")
+    logger.info("Sending workflow to n8n: %s", log_payload(payload))
     try:
-        response = requests.get(url, headers=HEADERS)
-        logger.info(f"n8n GET workflow response status: {response.status_code}")
-        logger.info(f"n8n GET workflow response body: {response.text}")
+        response = get_n8n_client().request("POST", "/workflows", "create", json=payload)
+        logger.info("n8n API response %s: %s", response.status_code, log_payload(response.text))
     except Exception as e:
-        logger.error(f"Exception during GET request to n8n: {e}")
+        logger.error(f"Exception while calling n8n API: {e}")
+        return {
+            "success": False,
+            "status_code": None,
+            "message": str(e)
+        }
+    result = _create_result(response)
+    _cache_created(result)
+    return result
+
+
+def n8n_list_workflows_page(cursor: str = None, limit: int = None, summary: bool = False) -> dict:
+    """Fetch one page of workflows; ``nextCursor`` is None on the last page."""
+    try:
+        response = get_n8n_client().request("GET", "/workflows", "list", params=_page_params(cursor, limit))
+        logger.info(f"n8n list page response status: {response.status_code}")
+    except Exception as e:
+        logger.error(f"Exception while calling n8n API: {e}")
         return {
             "success": False,
             "error": str(e)
         }
+    return _page_result(response, summary)
 
-    if response.status_code == 200:
+
+def iter_workflows(limit: int = None, summary: bool = False):
+    """Yield every workflow, following n8n's nextCursor page by page."""
+    cursor = None
+    while True:
+        page = n8n_list_workflows_page(cursor, limit, summary)
+        if not page["success"]:
+            raise N8nAPIError(page["error"])
+        yield from page["data"]
+        cursor = page["nextCursor"]
+        if not cursor:
+            return
+
+
+def n8n_get_all_workflows(summary: bool = False) -> dict:
+    cached = workflow_cache.get_listing(summary) if workflow_cache is not None else None
+    if cached is not None:
         return {
             "success": True,
-            "data": response.json()
+            "data": cached
         }
-    else:
+    return list_flight.do_blocking(("list", summary), lambda: _fetch_all_workflows(summary))
+
+
+def _fetch_all_workflows(summary: bool) -> dict:
+    try:
+        workflows = list(iter_workflows(summary=summary))
+    except Exception as e:
+        logger.error(f"Exception while listing n8n workflows: {e}")
         return {
             "success": False,
-            "error": response.text
+            "error": str(e)
+        }
+    logger.info(f"Fetched {len(workflows)} workflows from n8n")
+    if workflow_cache is not None:
+        workflow_cache.put_listing(workflows, summary)
+    return {
+        "success": True,
+        "data": workflows
+    }
+
+
+def get_workflow_by_id(workflow_id: str, updated_at: str = None) -> dict:
+    """Fetch one workflow; a cached copy is used unless it is older than ``updated_at``."""
+    cached = workflow_cache.get(workflow_id, updated_at) if workflow_cache is not None else None
+    if cached is not None:
+        return {
+            "success": True,
+            "data": cached
         }
+    return get_flight.do_blocking(
+        ("get", workflow_id, updated_at), lambda: _fetch_workflow(workflow_id)
+    )
+
+
+def _fetch_workflow(workflow_id: str) -> dict:
+    try:
+        response = get_n8n_client().request("GET", f"/workflows/{workflow_id}", "get")
+        logger.info("n8n GET workflow response %s: %s", response.status_code, log_payload(response.text))
+    except Exception as e:
+        logger.error(f"Exception during GET request to n8n: {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+    result = _get_result(response)
+    if workflow_cache is not None and result["success"]:
+        workflow_cache.put(result["data"])
+    return result
 
 
 def update_workflow_in_n8n(workflow_id: str, workflow_json: dict) -> dict:
-    url = f"{N8N_API_BASE_URL}/workflows/{workflow_id}"
-    payload = {
-        "name": workflow_json.get("name", "Updated Workflow"),
-        "nodes": workflow_json.get("nodes", []),
-        "connections": workflow_json.get("connections", {}),
-        "settings": {}
-    }
+    payload = _workflow_payload(workflow_json, "Updated Workflow")
 
-    logger.info(f"Updating workflow ID {workflow_id} in n8n: {payload}")
+    logger.info("Updating workflow ID %s in n8n: %s", workflow_id, log_payload(payload))
     try:
-        response = requests.put(url, headers=HEADERS, json=payload)
-        logger.info(f"n8n PUT response status: {response.status_code}")
-        logger.info(f"n8n PUT response body: {response.text}")
+        response = get_n8n_client().request("PUT", f"/workflows/{workflow_id}", "update", json=payload)
+        logger.info("n8n PUT response %s: %s", response.status_code, log_payload(response.text))
     except Exception as e:
         logger.error(f"Exception during PUT request to n8n: {e}")
         return {
@@ -137,16 +495,129 @@ def update_workflow_in_n8n(workflow_id: str, workflow_json: dict) -> dict:
             "status_code": None,
             "message": str(e)
         }
+    result = _update_result(response, workflow_json)
+    _cache_updated(workflow_id, response, result)
+    return result
 
-    if response.status_code in (200, 204):
+
+# Async variants, used by the FastAPI handlers so n8n round-trips don't block
+# the event loop.
+
+async def acreate_workflow(workflow_json: dict) -> dict:
+    payload = _workflow_payload(workflow_json, "Untitled Workflow")
+    logger.info("Sending workflow to n8n: %s", log_payload(payload))
+    try:
+        response = await get_n8n_client().arequest("POST", "/workflows", "create", json=payload)
+        logger.info("n8n API response %s: %s", response.status_code, log_payload(response.text))
+    except Exception as e:
+        logger.error(f"Exception while calling n8n API: {e}")
+        return {
+            "success": False,
+            "status_code": None,
+            "message": str(e)
+        }
+    result = _create_result(response)
+    _cache_created(result)
+    return result
+
+
+async def an8n_list_workflows_page(cursor: str = None, limit: int = None, summary: bool = False) -> dict:
+    try:
+        response = await get_n8n_client().arequest("GET", "/workflows", "list", params=_page_params(cursor, limit))
+        logger.info(f"n8n list page response status: {response.status_code}")
+    except Exception as e:
+        logger.error(f"Exception while calling n8n API: {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+    return _page_result(response, summary)
+
+
+async def aiter_workflows(limit: int = None, summary: bool = False):
+    cursor = None
+    while True:
+        page = await an8n_list_workflows_page(cursor, limit, summary)
+        if not page["success"]:
+            raise N8nAPIError(page["error"])
+        for workflow in page["data"]:
+            yield workflow
+        cursor = page["nextCursor"]
+        if not cursor:
+            return
+
+
+async def an8n_get_all_workflows(summary: bool = False) -> dict:
+    cached = workflow_cache.get_listing(summary) if workflow_cache is not None else None
+    if cached is not None:
         return {
             "success": True,
-            "data": workflow_json
+            "data": cached
         }
-    else:
+    return await list_flight.do(("list", summary), lambda: _afetch_all_workflows(summary))
+
+
+async def _afetch_all_workflows(summary: bool) -> dict:
+    try:
+        workflows = [wf async for wf in aiter_workflows(summary=summary)]
+    except Exception as e:
+        logger.error(f"Exception while listing n8n workflows: {e}")
         return {
             "success": False,
-            "status_code": response.status_code,
-            "message": response.text
+            "error": str(e)
         }
+    logger.info(f"Fetched {len(workflows)} workflows from n8n")
+    if workflow_cache is not None:
+        workflow_cache.put_listing(workflows, summary)
+    return {
+        "success": True,
+        "data": workflows
+    }
+
 
+async def aget_workflow_by_id(workflow_id: str, updated_at: str = None) -> dict:
+    """Fetch one workflow; a cached copy is used unless it is older than ``updated_at``."""
+    cached = workflow_cache.get(workflow_id, updated_at) if workflow_cache is not None else None
+    if cached is not None:
+        return {
+            "success": True,
+            "data": cached
+        }
+    return await get_flight.do(
+        ("get", workflow_id, updated_at), lambda: _afetch_workflow(workflow_id)
+    )
+
+
+async def _afetch_workflow(workflow_id: str) -> dict:
+    try:
+        response = await get_n8n_client().arequest("GET", f"/workflows/{workflow_id}", "get")
+        logger.info("n8n GET workflow response %s: %s", response.status_code, log_payload(response.text))
+    except Exception as e:
+        logger.error(f"Exception during GET request to n8n: {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+    result = _get_result(response)
+    if workflow_cache is not None and result["success"]:
+        workflow_cache.put(result["data"])
+    return result
+
+
+async def aupdate_workflow_in_n8n(workflow_id: str, workflow_json: dict) -> dict:
+    payload = _workflow_payload(workflow_json, "Updated Workflow")
+
+    logger.info("Updating workflow ID %s in n8n: %s", workflow_id, log_payload(payload))
+    try:
+        response = await get_n8n_client().arequest("PUT", f"/workflows/{workflow_id}", "update", json=payload)
+        logger.info("n8n PUT response %s: %s", response.status_code, log_payload(response.text))
+    except Exception as e:
+        logger.error(f"Exception during PUT request to n8n: {e}")
+        return {
+            "success": False,
+            "status_code": None,
+            "message": str(e)
+        }
+    result = _update_result(response, workflow_json)
+    _cache_updated(workflow_id, response, result)
+    return result
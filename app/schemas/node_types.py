@@ -0,0 +1,258 @@
+# app/schemas/node_types.py
+"""
+Parameter schemas for the n8n node types we generate most often.
+
+Each entry maps a node type to:
+
+- ``trigger``: whether the node starts a workflow
+- ``parameters``: parameter name -> spec, where a spec may set ``type``
+  (``string``, ``number``, ``boolean``, ``object``, ``array``), ``required``
+  and ``enum``
+
+Node types that are not listed only get the generic node checks. A string
+starting with ``=`` is an n8n expression and is accepted for any parameter
+type, since its value is only known at run time.
+
+``compile_node_types`` turns the specs into ``NodeSchema`` objects once, at
+import time; the validator only ever sees the compiled form.
+"""
+
+NODE_TYPES = {
+    "n8n-nodes-base.manualTrigger": {"trigger": True, "parameters": {}},
+    "n8n-nodes-base.scheduleTrigger": {
+        "trigger": True,
+        "parameters": {"rule": {"type": "object", "required": True}},
+    },
+    "n8n-nodes-base.cron": {
+        "trigger": True,
+        "parameters": {"triggerTimes": {"type": "object"}},
+    },
+    "n8n-nodes-base.webhook": {
+        "trigger": True,
+        "parameters": {
+            "path": {"type": "string", "required": True},
+            "httpMethod": {"type": "string", "enum": ["DELETE", "GET", "HEAD", "PATCH", "POST", "PUT"]},
+            "responseMode": {"type": "string", "enum": ["onReceived", "lastNode", "responseNode"]},
+            "options": {"type": "object"},
+        },
+    },
+    "n8n-nodes-base.formTrigger": {
+        "trigger": True,
+        "parameters": {"formTitle": {"type": "string"}, "formFields": {"type": "object"}},
+    },
+    "n8n-nodes-base.emailReadImap": {"trigger": True, "parameters": {}},
+    "n8n-nodes-base.httpRequest": {
+        "trigger": False,
+        "parameters": {
+            "url": {"type": "string", "required": True},
+            "method": {"type": "string", "enum": ["DELETE", "GET", "HEAD", "OPTIONS", "PATCH", "POST", "PUT"]},
+            "authentication": {"type": "string"},
+            "sendQuery": {"type": "boolean"},
+            "sendHeaders": {"type": "boolean"},
+            "sendBody": {"type": "boolean"},
+            "queryParameters": {"type": "object"},
+            "headerParameters": {"type": "object"},
+            "bodyParameters": {"type": "object"},
+            "options": {"type": "object"},
+        },
+    },
+    "n8n-nodes-base.set": {
+        "trigger": False,
+        "parameters": {
+            "mode": {"type": "string", "enum": ["manual", "raw"]},
+            "values": {"type": "object"},
+            "assignments": {"type": "object"},
+            "includeOtherFields": {"type": "boolean"},
+            "options": {"type": "object"},
+        },
+    },
+    "n8n-nodes-base.if": {
+        "trigger": False,
+        "parameters": {"conditions": {"type": "object", "required": True}, "options": {"type": "object"}},
+    },
+    "n8n-nodes-base.switch": {
+        "trigger": False,
+        "parameters": {
+            "mode": {"type": "string", "enum": ["rules", "expression"]},
+            "rules": {"type": "object"},
+            "options": {"type": "object"},
+        },
+    },
+    "n8n-nodes-base.merge": {
+        "trigger": False,
+        "parameters": {"mode": {"type": "string"}, "options": {"type": "object"}},
+    },
+    "n8n-nodes-base.code": {
+        "trigger": False,
+        "parameters": {
+            "mode": {"type": "string", "enum": ["runOnceForAllItems", "runOnceForEachItem"]},
+            "language": {"type": "string", "enum": ["javaScript", "python", "pythonNative"]},
+            "jsCode": {"type": "string"},
+            "pythonCode": {"type": "string"},
+        },
+    },
+    "n8n-nodes-base.function": {
+        "trigger": False,
+        "parameters": {"functionCode": {"type": "string", "required": True}},
+    },
+    "n8n-nodes-base.noOp": {"trigger": False, "parameters": {}},
+    "n8n-nodes-base.wait": {
+        "trigger": False,
+        "parameters": {"amount": {"type": "number"}, "unit": {"type": "string"}, "resume": {"type": "string"}},
+    },
+    "n8n-nodes-base.slack": {
+        "trigger": False,
+        "parameters": {
+            "resource": {"type": "string"},
+            "operation": {"type": "string"},
+            "channel": {"type": "string"},
+            "channelId": {"type": "object"},
+            "text": {"type": "string"},
+            "otherOptions": {"type": "object"},
+        },
+    },
+    "n8n-nodes-base.emailSend": {
+        "trigger": False,
+        "parameters": {
+            "fromEmail": {"type": "string", "required": True},
+            "toEmail": {"type": "string", "required": True},
+            "subject": {"type": "string"},
+            "text": {"type": "string"},
+            "html": {"type": "string"},
+            "options": {"type": "object"},
+        },
+    },
+    "n8n-nodes-base.gmail": {
+        "trigger": False,
+        "parameters": {
+            "resource": {"type": "string"},
+            "operation": {"type": "string"},
+            "sendTo": {"type": "string"},
+            "subject": {"type": "string"},
+            "message": {"type": "string"},
+            "options": {"type": "object"},
+        },
+    },
+    "n8n-nodes-base.googleSheets": {
+        "trigger": False,
+        "parameters": {
+            "operation": {"type": "string", "enum": [
+                "append", "appendOrUpdate", "clear", "create", "delete", "read", "remove", "update",
+            ]},
+            "documentId": {"type": "object"},
+            "sheetName": {"type": "object"},
+            "columns": {"type": "object"},
+            "options": {"type": "object"},
+        },
+    },
+    "n8n-nodes-base.respondToWebhook": {
+        "trigger": False,
+        "parameters": {
+            "respondWith": {"type": "string"},
+            "responseBody": {"type": "string"},
+            "options": {"type": "object"},
+        },
+    },
+    "n8n-nodes-base.stickyNote": {
+        "trigger": False,
+        "parameters": {"content": {"type": "string"}},
+    },
+}
+
+# Types without a schema are still recognised as triggers by name
+TRIGGER_TYPE_SUFFIXES = ("Trigger", ".webhook", ".cron", ".interval", ".start", ".emailReadImap")
+
+# Nodes that legitimately have no connections
+UNCONNECTED_NODE_TYPES = frozenset(["n8n-nodes-base.stickyNote"])
+
+_PYTHON_TYPES = {
+    "string": (str,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "object": (dict,),
+    "array": (list,),
+}
+
+
+_MISSING = object()
+
+
+class NodeSchema:
+    """
+    Compiled parameter checks for one node type.
+
+    The spec is turned into a specialised Python function (``is_valid``) that
+    only answers yes or no; error messages are built by ``validate`` on the
+    slow path, once ``is_valid`` has said no.
+    """
+
+    __slots__ = ("node_type", "trigger", "required", "checks", "is_valid")
+
+    def __init__(self, node_type: str, spec: dict):
+        self.node_type = node_type
+        self.trigger = bool(spec.get("trigger"))
+        parameters = spec.get("parameters", {})
+        self.required = tuple(name for name, rule in parameters.items() if rule.get("required"))
+        checks = {}
+        for name, rule in parameters.items():
+            kind = rule.get("type")
+            if kind is not None and kind not in _PYTHON_TYPES:
+                raise ValueError(f"Unknown parameter type {kind!r} for {node_type}.{name}")
+            enum = rule.get("enum")
+            checks[name] = (kind, _PYTHON_TYPES.get(kind), frozenset(enum) if enum else None)
+        self.checks = checks
+        self.is_valid = self._compile()
+
+    def _compile(self):
+        namespace = {"MISSING": _MISSING}
+        lines = ["def is_valid(parameters):"]
+        for name in self.required:
+            lines.append(f"    if {name!r} not in parameters: return False")
+        if self.checks:
+            lines.append("    get = parameters.get")
+        for position, (name, (kind, python_types, enum)) in enumerate(self.checks.items()):
+            if python_types is None and enum is None:
+                continue
+            lines.append(f"    value = get({name!r}, MISSING)")
+            lines.append("    if value is not MISSING:")
+            lines.append("        cls = value.__class__")
+            # An "=..." string is an expression and fits any type
+            expression = "(cls is str and value[:1] == '=')"
+            if python_types is not None:
+                allowed = " and ".join(f"cls is not {t.__name__}" for t in python_types)
+                lines.append(f"        if {allowed} and not {expression}: return False")
+            if enum is not None:
+                namespace[f"ENUM_{position}"] = enum
+                lines.append(f"        if cls is str and value not in ENUM_{position} and value[:1] != '=': return False")
+        lines.append("    return True")
+        exec(compile("\n".join(lines), f"<node schema {self.node_type}>", "exec"), namespace)
+        return namespace["is_valid"]
+
+    def validate(self, parameters: dict, node_index: int, errors: list):
+        """Append an error for each missing or mistyped parameter of ``nodes[node_index]``."""
+        if self.is_valid(parameters):
+            return
+        for name in self.required:
+            if name not in parameters:
+                errors.append(
+                    f"nodes[{node_index}].parameters: missing required parameter '{name}' for {self.node_type}"
+                )
+        for name, value in parameters.items():
+            check = self.checks.get(name)
+            if check is None or (value.__class__ is str and value[:1] == "="):
+                continue
+            kind, python_types, enum = check
+            # Exact class checks: bool is an int subclass and must not pass as a number
+            if python_types is not None and value.__class__ not in python_types:
+                errors.append(
+                    f"nodes[{node_index}].parameters.{name}: expected {kind}, got {value.__class__.__name__}"
+                )
+            elif enum is not None and value not in enum:
+                errors.append(f"nodes[{node_index}].parameters.{name}: {value!r} is not one of {sorted(enum)}")
+
+
+def compile_node_types(specs: dict) -> dict:
+    return {node_type: NodeSchema(node_type, spec) for node_type, spec in specs.items()}
+
+
+COMPILED_NODE_TYPES = compile_node_types(NODE_TYPES)
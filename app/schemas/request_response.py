@@ -1,13 +1,22 @@
 # app/schemas/request_response.py
 
-from pydantic import BaseModel
+from pydantic import BaseModel, HttpUrl
 from typing import Optional
 
 class WorkflowRequest(BaseModel):
     prompt: str
     conversation_id: Optional[str] = None
+    workflow: Optional[dict] = None  # context for describe requests; sent to the model in compact form
+    workflow_ref: Optional[str] = None  # describe: id of the workflow sent earlier in the conversation, instead of it
+
+class JobRequest(WorkflowRequest):
+    callback_url: Optional[HttpUrl] = None  # POSTed the finished job
+
+class BatchRequest(BaseModel):
+    prompts: list[str]
 
 class WorkflowResponse(BaseModel):
     name: str
     nodes: list
     connections: dict
+    error: Optional[str] = None
@@ -0,0 +1,230 @@
+# app/services/conversation_store.py
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Rough chars-per-token ratio used to budget history without a tokenizer
+CHARS_PER_TOKEN = 4
+SUMMARY_SNIPPET_CHARS = 160
+MAX_SUMMARY_CHARS = 2000
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class ConversationStore:
+    """
+    History of multi-turn conversations, keyed by ``conversation_id``.
+
+    Each conversation is a list of ``{"role", "content"}`` messages plus a
+    running summary of turns that no longer fit. Once the messages pass
+    ``max_history_tokens`` the oldest ones are folded into the summary (a
+    short extract of each, not an LLM call), so the history handed to the
+    model stays bounded.
+
+    A conversation may also carry a ``context`` (``{"id", "content"}``, e.g.
+    the workflow a describe chat is about) that clients send once and then
+    refer to by id. It is kept whole and outside the token budget.
+
+    The memory tier is an LRU of at most ``max_entries`` conversations. The
+    optional SQLite tier is shared by every uvicorn worker and is the source
+    of truth when configured; memory entries are reused only while their
+    ``updated_at`` still matches the row. Conversations idle for longer than
+    ``idle_ttl`` are dropped from both tiers.
+
+    Coroutines use aget()/aappend()/adelete(), which run the SQLite work on
+    a worker thread so a busy file never stalls the event loop.
+    """
+
+    def __init__(self, max_entries: int = 1000, idle_ttl: float = 6 * 3600.0, max_history_tokens: int = 3000,
+                 sqlite_path: str = None):
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self.max_history_tokens = max_history_tokens
+        self.sqlite_path = sqlite_path
+        self._entries = OrderedDict()  # conversation_id -> {"messages", "summary", "context", "updated_at"}
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.summarized_messages = 0
+        if sqlite_path:
+            self._open_db(sqlite_path)
+
+    def _open_db(self, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            " id TEXT PRIMARY KEY, messages TEXT NOT NULL, summary TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(conversations)")}
+        if "context" not in columns:
+            # Files written before conversations carried a context
+            self._db.execute("ALTER TABLE conversations ADD COLUMN context TEXT")
+        self._db.execute("CREATE INDEX IF NOT EXISTS conversations_updated_at ON conversations (updated_at)")
+
+    # -- internals ----------------------------------------------------------
+
+    def _load(self, conversation_id: str, now: float):
+        """Current entry for ``conversation_id`` or None; caller holds the lock."""
+        entry = self._entries.get(conversation_id)
+        if entry is not None and now - entry["updated_at"] > self.idle_ttl:
+            del self._entries[conversation_id]
+            self.evictions += 1
+            entry = None
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT updated_at FROM conversations WHERE id = ?", (conversation_id,)
+            ).fetchone()
+            if row is None or now - row[0] > self.idle_ttl:
+                self._entries.pop(conversation_id, None)
+                return None
+            if entry is None or entry["updated_at"] != row[0]:
+                # Another worker moved the conversation on; reload it
+                messages, summary, context = self._db.execute(
+                    "SELECT messages, summary, context FROM conversations WHERE id = ?", (conversation_id,)
+                ).fetchone()
+                entry = {
+                    "messages": json.loads(messages), "summary": summary,
+                    "context": json.loads(context) if context else None, "updated_at": row[0],
+                }
+                self._remember(conversation_id, entry)
+        if entry is not None:
+            self._entries.move_to_end(conversation_id)
+        return entry
+
+    def _remember(self, conversation_id: str, entry: dict):
+        self._entries[conversation_id] = entry
+        self._entries.move_to_end(conversation_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _window(self, entry: dict):
+        """Fold the oldest messages into the summary until the rest fits the token budget."""
+        messages = entry["messages"]
+        total = sum(estimate_tokens(message["content"]) for message in messages) + estimate_tokens(entry["summary"])
+        folded = []
+        # Always keep the latest exchange, however large
+        while total > self.max_history_tokens and len(messages) > 2:
+            message = messages.pop(0)
+            total -= estimate_tokens(message["content"])
+            folded.append(message)
+        if not folded:
+            return
+        snippets = []
+        for message in folded:
+            content = " ".join(message["content"].split())
+            if len(content) > SUMMARY_SNIPPET_CHARS:
+                content = content[:SUMMARY_SNIPPET_CHARS] + "..."
+            snippets.append(f"{message['role']}: {content}")
+        summary = "\n".join(filter(None, [entry["summary"], *snippets]))
+        entry["summary"] = summary[-MAX_SUMMARY_CHARS:]
+        self.summarized_messages += len(folded)
+
+    # -- public API ---------------------------------------------------------
+
+    def get(self, conversation_id: str) -> dict:
+        """
+        Return ``{"messages": [...], "summary": str, "context": dict or None}``
+        (empty for unknown or idle conversations).
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._load(conversation_id, now)
+            if entry is None:
+                self.misses += 1
+                return {"messages": [], "summary": "", "context": None}
+            self.hits += 1
+            return {"messages": list(entry["messages"]), "summary": entry["summary"], "context": entry["context"]}
+
+    def append(self, conversation_id: str, *messages: dict, context: dict = None):
+        """
+        Add messages (``{"role", "content"}``) to a conversation, windowing it
+        to the token budget. A ``context`` replaces the conversation's one.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._load(conversation_id, now)
+            if entry is None:
+                entry = {"messages": [], "summary": "", "context": None, "updated_at": now}
+            else:
+                entry = {"messages": list(entry["messages"]), "summary": entry["summary"],
+                         "context": entry["context"], "updated_at": now}
+            entry["messages"].extend({"role": m["role"], "content": m["content"]} for m in messages)
+            if context is not None:
+                entry["context"] = {"id": context["id"], "content": context["content"]}
+            entry["updated_at"] = now
+            self._window(entry)
+            self._remember(conversation_id, entry)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO conversations (id, messages, summary, context, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (conversation_id, json.dumps(entry["messages"]), entry["summary"],
+                     json.dumps(entry["context"]) if entry["context"] else None, now),
+                )
+            self._evict_idle(now)
+
+    def delete(self, conversation_id: str):
+        with self._lock:
+            self._entries.pop(conversation_id, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+
+    async def aget(self, conversation_id: str) -> dict:
+        if self._db is None:
+            return self.get(conversation_id)
+        return await asyncio.to_thread(self.get, conversation_id)
+
+    async def aappend(self, conversation_id: str, *messages: dict, context: dict = None):
+        if self._db is None:
+            return self.append(conversation_id, *messages, context=context)
+        return await asyncio.to_thread(self.append, conversation_id, *messages, context=context)
+
+    async def adelete(self, conversation_id: str):
+        if self._db is None:
+            return self.delete(conversation_id)
+        return await asyncio.to_thread(self.delete, conversation_id)
+
+    def _evict_idle(self, now: float):
+        cutoff = now - self.idle_ttl
+        # Entries are in LRU order, so idle ones sit at the front
+        while self._entries:
+            conversation_id, entry = next(iter(self._entries.items()))
+            if entry["updated_at"] > cutoff:
+                break
+            del self._entries[conversation_id]
+            self.evictions += 1
+        if self._db is not None:
+            self._db.execute("DELETE FROM conversations WHERE updated_at <= ?", (cutoff,))
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> dict:
+        # No lock: get() and append() hold it while waiting for SQLite
+        return {
+            "conversations": len(self._entries),
+            "sqlite_path": self.sqlite_path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "summarized_messages": self.summarized_messages,
+        }
@@ -0,0 +1,504 @@
+# app/services/job_queue.py
+
+import asyncio
+import ipaddress
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+CALLBACK_ATTEMPTS = 3
+CALLBACK_TIMEOUT = 10.0
+# How often an event stream re-reads a job it gets no local events for (e.g. one running in another worker)
+EVENT_POLL_INTERVAL = 1.0
+
+_COLUMNS = (
+    "id", "kind", "status", "request", "result", "error", "callback_url", "callback_status",
+    "worker", "attempts", "created_at", "started_at", "finished_at", "stages",
+)
+_JSON_COLUMNS = ("request", "result", "stages")
+
+
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _same_host(worker: str) -> bool:
+    return (worker or "").rpartition(":")[0] == socket.gethostname()
+
+
+def _log_store_error(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Job store write failed: {future.exception()}")
+
+
+def _process_alive(worker: str) -> bool:
+    """Whether the process that claimed a job is still running (only knowable for this host)."""
+    host, _, pid = (worker or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+async def callback_target_error(url: str, allowed_hosts=(), allow_private: bool = False):
+    """
+    Why the server must not POST to ``url``, or None. Only http(s) is
+    allowed. With ``allowed_hosts`` the host must be one of them; otherwise
+    unless ``allow_private`` it must not resolve to a loopback, private,
+    link-local or other non-public address, so a client can't point the
+    callback at internal services.
+    """
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if parts.scheme not in ("http", "https") or not host:
+        return "callback_url must be an http(s) URL"
+    if allowed_hosts:
+        if host not in allowed_hosts:
+            return f"callback host {host} is not allowed"
+        return None
+    if allow_private:
+        return None
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, parts.port, type=socket.SOCK_STREAM)
+    except (OSError, UnicodeError) as e:
+        return f"callback host {host} does not resolve: {e}"
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if not address.is_global:
+            return f"callback host {host} resolves to a non-public address ({address})"
+    return None
+
+
+class JobStore:
+    """
+    SQLite-backed record of background jobs, so queued and finished jobs
+    survive a restart. Every uvicorn worker opens the same file (WAL mode);
+    a job is claimed with a conditional UPDATE so only one worker runs it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, request TEXT NOT NULL,"
+            " result TEXT, error TEXT, callback_url TEXT, callback_status TEXT, worker TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, started_at REAL,"
+            " finished_at REAL, stages TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+        self._lock = threading.Lock()
+
+    def _row(self, row) -> dict:
+        job = dict(zip(_COLUMNS, row))
+        for column in _JSON_COLUMNS:
+            if job[column] is not None:
+                job[column] = json.loads(job[column])
+        return job
+
+    def insert(self, job: dict):
+        values = [json.dumps(job[c]) if c in _JSON_COLUMNS and job[c] is not None else job[c] for c in _COLUMNS]
+        with self._lock:
+            self._db.execute(
+                f"INSERT INTO jobs ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})", values
+            )
+
+    def get(self, job_id: str) -> dict:
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def update(self, job_id: str, **fields):
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        values = [json.dumps(v) if c in _JSON_COLUMNS and v is not None else v for c, v in fields.items()]
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*values, job_id))
+
+    def claim(self, job_id: str, worker: str, now: float) -> bool:
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, started_at = ?, attempts = attempts + 1"
+                " WHERE id = ? AND status = 'queued'",
+                (worker, now, job_id),
+            )
+        return cursor.rowcount == 1
+
+    def cancel(self, job_id: str, now: float) -> bool:
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                (now, job_id),
+            )
+        return cursor.rowcount == 1
+
+    def list(self, status: str = None, limit: int = 50) -> list:
+        query = f"SELECT {', '.join(_COLUMNS)} FROM jobs"
+        params = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        return [self._row(row) for row in rows]
+
+    def recoverable(self) -> list:
+        """Queued jobs, plus running ones whose worker process is gone, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def requeue(self, job_id: str, worker: str) -> bool:
+        """Put a running job back in the queue if ``worker`` (found dead) still holds it."""
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL WHERE id = ? AND status = 'running' AND worker IS ?",
+                (job_id, worker),
+            )
+        return cursor.rowcount == 1
+
+    def release(self, worker: str) -> int:
+        """Put the jobs ``worker`` was running back in the queue (it is shutting down)."""
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND worker = ?", (worker,)
+            )
+        return cursor.rowcount
+
+    def purge(self, older_than: float) -> int:
+        with self._lock:
+            cursor = self._db.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed', 'cancelled') AND finished_at < ?",
+                (older_than,),
+            )
+        return cursor.rowcount
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class JobQueue:
+    """
+    Background execution of long requests (workflow generation) so the HTTP
+    call that submits them returns at once.
+
+    ``handlers`` maps a job kind to ``async handler(request, progress)``,
+    which returns ``(result, error)``; ``progress(stage)`` records a stage
+    timestamp and notifies anyone streaming the job. ``concurrency`` worker
+    tasks take jobs from an in-process queue in submission order. Every
+    state change is written to the JobStore, on a thread of its own so a
+    locked database never stalls the event loop; the writes keep their
+    order. On start, jobs that were queued or interrupted by a restart are
+    picked up again, and every ``poll_interval`` seconds the store is
+    checked for jobs still queued in other workers (or left by a worker on
+    this host that died), which any worker may claim. A running job whose
+    worker died on another host is only picked up when a worker starts.
+    Finished jobs
+    are POSTed to their ``callback_url``, if any (checked against
+    ``callback_hosts`` / ``callback_allow_private``, see
+    callback_target_error), and dropped from the store after ``retention``
+    seconds.
+    """
+
+    def __init__(self, store: JobStore, handlers: dict, concurrency: int = 4, retention: float = 7 * 24 * 3600.0,
+                 callback_hosts=(), callback_allow_private: bool = False, poll_interval: float = 5.0):
+        self.store = store
+        self.handlers = handlers
+        self.concurrency = max(1, concurrency)
+        self.retention = retention
+        self.callback_hosts = frozenset(host.lower() for host in callback_hosts)
+        self.callback_allow_private = callback_allow_private
+        self.poll_interval = poll_interval
+        self.worker = _worker_id()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store")
+        self._queue = None
+        self._queued = set()  # ids in self._queue
+        self._tasks = []
+        self._subscribers = {}  # job id -> set of asyncio.Queue
+        self._http = None
+        self.submitted = 0
+        self.completed = 0
+        self.queue_ms = 0.0
+        self.run_ms = 0.0
+
+    # -- lifecycle --------------------------------------------------------------
+
+    async def _store(self, method, *args, **kwargs):
+        """Run a JobStore call on the store's thread, behind every write made before it."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, partial(method, *args, **kwargs))
+
+    def _store_later(self, method, *args, **kwargs):
+        """Queue a JobStore write nobody waits on (stage timestamps)."""
+        future = asyncio.get_running_loop().run_in_executor(self._executor, partial(method, *args, **kwargs))
+        future.add_done_callback(_log_store_error)
+
+    def _enqueue(self, job_id: str):
+        if job_id not in self._queued:
+            self._queued.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    async def _recover(self, startup: bool = False, min_age: float = 0.0) -> int:
+        """
+        Queue jobs nobody is working on: queued ones at least ``min_age``
+        seconds old, and running ones whose worker process on this host is
+        gone. At startup our own worker id counts as gone (it can only be a
+        previous process that got the same pid, PID 1 in a container), and
+        so does a worker on another host, which can't be checked.
+        """
+        recovered = 0
+        cutoff = time.time() - min_age
+        for job in await self._store(self.store.recoverable):
+            if job["status"] == "running":
+                worker = job["worker"]
+                if worker == self.worker:
+                    if not startup:
+                        continue
+                elif _process_alive(worker) or (not startup and not _same_host(worker)):
+                    continue
+                await self._store(self.store.requeue, job["id"], job["worker"])
+            elif job["created_at"] > cutoff or job["id"] in self._queued:
+                continue
+            self._enqueue(job["id"])
+            recovered += 1
+        return recovered
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                # Give the submitting worker a head start on its own jobs
+                found = await self._recover(min_age=self.poll_interval)
+            except Exception as e:
+                logger.error(f"Polling the job store failed: {e}")
+                continue
+            if found:
+                logger.info(f"Picked up {found} job(s) queued elsewhere")
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        purged = await self._store(self.store.purge, time.time() - self.retention)
+        if purged:
+            logger.info(f"Purged {purged} finished job(s) past retention")
+        recovered = await self._recover(startup=True)
+        if recovered:
+            logger.info(f"Re-queued {recovered} job(s) left over from a previous run")
+        self._tasks = [asyncio.create_task(self._work(), name=f"job-worker-{i}") for i in range(self.concurrency)]
+        if self.poll_interval > 0:
+            self._tasks.append(asyncio.create_task(self._poll(), name="job-poller"))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        released = await self._store(self.store.release, self.worker)
+        if released:
+            logger.info(f"Returned {released} interrupted job(s) to the queue")
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        await self._store(self.store.close)
+        self._executor.shutdown(wait=True)
+
+    # -- submitting and reading -------------------------------------------------
+
+    async def submit(self, kind: str, request: dict, callback_url: str = None) -> dict:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job = {column: None for column in ("result", "error", "callback_status", "worker", "started_at", "finished_at")}
+        job.update({
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "status": "queued",
+            "request": request,
+            "callback_url": callback_url,
+            "attempts": 0,
+            "created_at": time.time(),
+            "stages": {},
+        })
+        await self._store(self.store.insert, job)
+        self._enqueue(job["id"])
+        self.submitted += 1
+        return job
+
+    async def get(self, job_id: str) -> dict:
+        job = await self._store(self.store.get, job_id)
+        return describe_job(job) if job else None
+
+    async def list(self, status: str = None, limit: int = 50) -> list:
+        return [describe_job(job) for job in await self._store(self.store.list, status, limit)]
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel a job that has not started yet."""
+        cancelled = await self._store(self.store.cancel, job_id, time.time())
+        if cancelled:
+            self._publish(job_id, "status", {"status": "cancelled"})
+        return cancelled
+
+    async def events(self, job_id: str):
+        """Yield ``(event, data)`` for a job until it finishes: its state, each stage as it starts, then the final job."""
+        job = await self.get(job_id)
+        if job is None:
+            return
+        subscriber = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(subscriber)
+        try:
+            yield "status", job
+            last_status = job["status"]
+            while last_status not in TERMINAL_STATUSES:
+                try:
+                    event, data = await asyncio.wait_for(subscriber.get(), timeout=EVENT_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    # Nothing local; the job may be running in another worker
+                    job = await self.get(job_id)
+                    if job is None or job["status"] == last_status:
+                        continue
+                    event, data = "status", {"status": job["status"]}
+                if event == "status":
+                    last_status = data["status"]
+                    if last_status in TERMINAL_STATUSES:
+                        break
+                yield event, data
+            yield "job", await self.get(job_id)
+        finally:
+            subscribers = self._subscribers.get(job_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[job_id]
+
+    def _publish(self, job_id: str, event: str, data: dict):
+        for subscriber in self._subscribers.get(job_id, ()):
+            subscriber.put_nowait((event, data))
+
+    # -- running ----------------------------------------------------------------
+
+    async def _work(self):
+        while True:
+            job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.error(f"Job {job_id} crashed the worker loop: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        started = time.time()
+        if not await self._store(self.store.claim, job_id, self.worker, started):
+            return  # cancelled, or claimed by another worker process
+        job = await self._store(self.store.get, job_id)
+        stages = job["stages"] or {}
+        self._publish(job_id, "status", {"status": "running"})
+
+        def progress(stage: str):
+            at = time.time()
+            stages[stage] = at
+            self._store_later(self.store.update, job_id, stages=dict(stages))
+            self._publish(job_id, "stage", {"stage": stage, "at": at})
+
+        try:
+            result, error = await self.handlers[job["kind"]](job["request"], progress)
+        except Exception as e:
+            logger.error(f"Job {job_id} ({job['kind']}) failed: {e}")
+            result, error = None, str(e)
+        finished = time.time()
+        status = "failed" if error else "succeeded"
+        await self._store(
+            self.store.update, job_id, status=status, result=result, error=error, finished_at=finished, stages=stages
+        )
+        self.completed += 1
+        self.queue_ms += (started - job["created_at"]) * 1000
+        self.run_ms += (finished - started) * 1000
+        logger.info(
+            f"Job {job_id} {status}: waited {(started - job['created_at']) * 1000:.0f}ms, "
+            f"ran {(finished - started) * 1000:.0f}ms"
+        )
+        self._publish(job_id, "status", {"status": status})
+        if job["callback_url"]:
+            await self._send_callback(job_id, job["callback_url"])
+
+    async def check_callback_url(self, url: str):
+        """Why ``url`` can't be a callback target, or None."""
+        return await callback_target_error(url, self.callback_hosts, self.callback_allow_private)
+
+    async def _send_callback(self, job_id: str, url: str):
+        # Checked again at send time: the name may resolve differently than at submission
+        blocked = await self.check_callback_url(url)
+        if blocked is not None:
+            logger.warning(f"Callback for job {job_id} not sent: {blocked}")
+            await self._store(self.store.update, job_id, callback_status=f"blocked: {blocked}")
+            return
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=CALLBACK_TIMEOUT)
+        payload = await self.get(job_id)
+        status = None
+        for attempt in range(CALLBACK_ATTEMPTS):
+            try:
+                response = await self._http.post(url, json=payload)
+                status = str(response.status_code)
+                if response.status_code < 500:
+                    break
+            except httpx.HTTPError as e:
+                status = f"error: {e!r}"
+            if attempt < CALLBACK_ATTEMPTS - 1:
+                await asyncio.sleep(2 ** attempt)
+        if status is None or not status.startswith("2"):
+            logger.warning(f"Callback for job {job_id} to {url} failed: {status}")
+        await self._store(self.store.update, job_id, callback_status=status)
+
+    async def stats(self) -> dict:
+        return {
+            "workers": self.concurrency,
+            "queued_in_process": self._queue.qsize() if self._queue is not None else 0,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "avg_queue_ms": round(self.queue_ms / self.completed, 1) if self.completed else 0.0,
+            "avg_run_ms": round(self.run_ms / self.completed, 1) if self.completed else 0.0,
+            "by_status": await self._store(self.store.counts),
+        }
+
+
+def describe_job(job: dict) -> dict:
+    """Public view of a job, with queue wait and run time derived from its timestamps."""
+    view = {key: job[key] for key in (
+        "id", "kind", "status", "result", "error", "callback_url", "callback_status", "attempts",
+        "created_at", "started_at", "finished_at", "stages",
+    )}
+    view["queue_ms"] = round((job["started_at"] - job["created_at"]) * 1000, 1) if job["started_at"] else None
+    if job["started_at"] and job["finished_at"]:
+        view["run_ms"] = round((job["finished_at"] - job["started_at"]) * 1000, 1)
+    else:
+        view["run_ms"] = None
+    return view
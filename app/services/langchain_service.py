@@ -1,153 +1,338 @@
 #D:\AI_Project\n8n_wf_creator\app\services\langchain_service.py
 
-from langchain.chains import ConversationChain
-from langchain.memory import ConversationBufferMemory
-from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
 from app.config import settings
 import logging
-from dotenv import load_dotenv
-load_dotenv()  # Load environment variables from .env file
 import os
-from langchain.chains import LLMChain
-import time
 import random
-from openai import RateLimitError
+import asyncio
+import sys
+import time
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import LLMResult
+from app.services.llm_pool import get_llm_pool
+from app.services.response_cache import ResponseCache, make_cache_key, make_namespace
+from app.services.conversation_store import ConversationStore
+from app.services.metrics import llm_result_cached_tokens, llm_result_usage
+from app.services.prompt_registry import prompt_registry
+from app.services.rate_limiter import estimate_prompt_tokens, rate_limiter, retry_after
+from app.services.single_flight import SingleFlight
+from app.services.tracing import SPAN_KIND_CLIENT, set_attribute, span
 
 logger = logging.getLogger(__name__)
 OPEN_AI_API_KEY = os.getenv("OPENAI_API_KEY", settings.openai_api_key)
 
-def load_prompt_from_file():
-    prompt_path = os.path.join("app/prompts", "workflow_prompt.txt")
-    with open(prompt_path, "r", encoding="utf-8") as f:
-        return f.read()
-
-# Load prompt template from file
-logger.info("Loading workflow prompt template from file")
-try:
-    prompt_template = load_prompt_from_file()
-    logger.info("Prompt template loaded successfully from file.")
-except Exception as e:
-    logger.error(f"Failed to load prompt template from file: {e}")
-    # Fallback to simple template
-    prompt_template = """You are an expert n8n workflow architect AI that generates fully functional n8n workflow JSONs.
-
-IMPORTANT: You must return ONLY a valid JSON object with this structure:
-{
-  "name": "workflow name",
-  "nodes": [...],
-  "connections": {...}
-}
-
-Do not include any explanations, descriptions, or text outside the JSON.
-
-Conversation history:
-{history}
-
-User prompt:
-{input}
-
-Return only the JSON workflow:"""
-    
-PROMPT = PromptTemplate(
-    input_variables=["history", "input"],
-    template=prompt_template
-)
+MAX_RATE_LIMIT_RETRIES = 5
+RATE_LIMIT_BASE_DELAY = 1
 
-def get_llm_chain():
-    logger.info("Initializing OpenAI Chat LLM with provided settings.")
-    try:
-        llm = ChatOpenAI(
-            model_name="gpt-4o",
-            openai_api_key=settings.openai_api_key,
-            temperature=0.7,
-            max_tokens=16384,
-            max_retries=3,
-            request_timeout=60
-        )
-        logger.info("OpenAI Chat LLM initialized.")
-    except Exception as e:
-        logger.error(f"Failed to initialize OpenAI Chat LLM: {e}")
-        raise
 
-    logger.info("Setting up ConversationBufferMemory.")
+def _is_rate_limit_error(e: Exception) -> bool:
+    # Only the OpenAI client raises RateLimitError, and it has been imported if one was raised
+    openai = sys.modules.get("openai")
+    return (openai is not None and isinstance(e, openai.RateLimitError)) or getattr(e, "status_code", None) == 429
+
+
+def _rate_limit_delay(attempt: int, e: Exception = None) -> float:
+    """The server's retry-after if it sent one, else exponential backoff with jitter."""
+    delay = retry_after(getattr(getattr(e, "response", None), "headers", None))
+    return delay or RATE_LIMIT_BASE_DELAY * (2 ** attempt) + random.uniform(0, 1)
+
+
+def _backoff_delay(attempt: int, e: Exception) -> float:
+    """Seconds to hold back after a 429, or raise after the last attempt."""
+    if attempt == MAX_RATE_LIMIT_RETRIES - 1:
+        logger.error(f"Max retries exceeded for rate limiting: {e}")
+        raise Exception("OpenAI API rate limit exceeded. Please try again later.")
+    delay = _rate_limit_delay(attempt, e)
+    set_attribute("llm.rate_limited", True)
+    set_attribute("llm.backoff_s", round(delay, 3))
+    logger.warning(f"Rate limit hit, retrying in {delay:.2f} seconds (attempt {attempt + 1}/{MAX_RATE_LIMIT_RETRIES})")
+    return delay
+
+
+def _back_off(attempt: int, e: Exception):
+    """
+    Handle a 429: pause the shared limiter so every request holds back
+    together (the retry waits for it in the limiter's queue), or give up
+    after the last attempt.
+    """
+    rate_limiter.pause(_backoff_delay(attempt, e))
+
+
+async def _aback_off(attempt: int, e: Exception):
+    """_back_off() for async callers: the pause is in place before the retry asks the limiter for budget."""
+    await rate_limiter.apause(_backoff_delay(attempt, e))
+
+
+class UsageCallback(BaseCallbackHandler):
+    """Adds up the token usage OpenAI reports for every completion made while attached."""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+
+    def on_llm_end(self, response: LLMResult, **kwargs):
+        prompt_tokens, completion_tokens, _ = llm_result_usage(response)
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.cached_tokens += llm_result_cached_tokens(response)
+        self.completion_tokens += completion_tokens
+
+
+def get_llm_chain(history: list = None, operation: str = "generate"):
+    # The OpenAI client comes from the process-wide pool; only the memory is per request,
+    # seeded with the conversation's stored history when there is one. LangChain's chain and
+    # memory classes are imported here, on first use, unless warm_up() got to them first.
+    from langchain.memory import ConversationBufferMemory
+    from app.services.llm_chain import RateLimitedLLMChain
+
+    llm = get_llm_pool().get()
+    template = prompt_registry.get(operation)
+
     memory = ConversationBufferMemory(
         memory_key="history",
         input_key="input",
         human_prefix="User",
         ai_prefix="Assistant",
-        return_messages=True  # For chat models, this must be True
+        # History goes in as chat messages between the template's system message and the input
+        return_messages=True
     )
-    logger.info("ConversationBufferMemory set up.")
-
-    # Create a custom LLMChain with rate limiting
-    class RateLimitedLLMChain(LLMChain):
-        def run(self, *args, **kwargs):
-            max_retries = 5
-            base_delay = 1
-            
-            for attempt in range(max_retries):
-                try:
-                    return super().run(*args, **kwargs)
-                except Exception as e:
-                    error_str = str(e).lower()
-                    if "429" in error_str or "rate limit" in error_str or "too many requests" in error_str:
-                        if attempt < max_retries - 1:
-                            delay = base_delay * (2 ** attempt) + random.uniform(0, 1)
-                            logger.warning(f"Rate limit hit, retrying in {delay:.2f} seconds (attempt {attempt + 1}/{max_retries})")
-                            time.sleep(delay)
-                            continue
-                        else:
-                            logger.error(f"Max retries exceeded for rate limiting: {e}")
-                            raise Exception("OpenAI API rate limit exceeded. Please try again later.")
-                    else:
-                        logger.error(f"Non-rate-limit error: {e}")
-                        raise
-            
-            raise Exception("Unexpected error in rate limited chain")
-    
+    if history:
+        memory.chat_memory.add_messages(history)
+
     # Return the custom LLMChain with rate limiting
     return RateLimitedLLMChain(
-        prompt=PROMPT,  
+        prompt=template.chat_prompt(),
         llm=llm,
         memory=memory,
-        verbose=True
+        static_tokens=template.prefix_tokens,
+        # Carried to the callbacks, which count cached prompt tokens per template and version
+        metadata=template.metadata,
+        # verbose echoes every full prompt to stdout; the response is logged (truncated) by the callers
+        verbose=False
     )
 
 
-    class TokenUsageConversationChain(ConversationChain):
-        def run(self, *args, **kwargs):
-            # Get messages before running the LLM
-            messages_before = memory.chat_memory.messages.copy() if hasattr(memory, 'chat_memory') else []
-            num_tokens_input = 0
-            if hasattr(self.llm, 'get_num_tokens_from_messages'):
-                try:
-                    num_tokens_input = self.llm.get_num_tokens_from_messages(messages_before)
-                except Exception as e:
-                    logger.warning(f"Could not calculate input token usage: {e}")
-            result = super().run(*args, **kwargs)
-            # Get messages after running the LLM
-            messages_after = memory.chat_memory.messages if hasattr(memory, 'chat_memory') else []
-            num_tokens_output = 0
-            if hasattr(self.llm, 'get_num_tokens_from_messages'):
-                try:
-                    num_tokens_output = self.llm.get_num_tokens_from_messages(messages_after)
-                except Exception as e:
-                    logger.warning(f"Could not calculate output token usage: {e}")
-                logger.info(f"Input tokens: {num_tokens_input}, Output tokens: {num_tokens_output - num_tokens_input}, Total tokens: {num_tokens_output}")
-                print(f"Input tokens: {num_tokens_input}, Output tokens: {num_tokens_output - num_tokens_input}, Total tokens: {num_tokens_output}")
-            else:
-                logger.warning("LLM does not support token counting.")
-            return result
-
-    logger.info("Creating ConversationChain with token usage logging.")
-    chain = TokenUsageConversationChain(
-        llm=llm,
-        prompt=PROMPT,
-        memory=memory,
-        verbose=True
+def warm_up():
+    """
+    Do the first LLM request's one-off work ahead of it: import LangChain's
+    chain and the OpenAI client and fill the client pool. Blocking; the app
+    runs it in a thread once it is accepting requests.
+    """
+    started = time.perf_counter()
+    from langchain.memory import ConversationBufferMemory  # noqa: F401
+    from app.services.llm_chain import RateLimitedLLMChain  # noqa: F401
+    for name in prompt_registry.names():
+        prompt_registry.get(name).chat_prompt()
+    get_llm_pool().warm()
+    logger.info(f"LLM clients warmed up in {time.perf_counter() - started:.2f}s")
+
+
+
+response_cache = ResponseCache(
+    ttl=settings.response_cache_ttl,
+    max_entries=settings.response_cache_max_entries,
+    max_bytes=settings.response_cache_max_bytes,
+    sqlite_path=settings.response_cache_sqlite_path,
+    sqlite_max_bytes=settings.response_cache_sqlite_max_bytes,
+) if settings.response_cache_enabled else None
+
+
+conversation_store = ConversationStore(
+    max_entries=settings.conversation_max_entries,
+    idle_ttl=settings.conversation_idle_ttl,
+    max_history_tokens=settings.conversation_max_history_tokens,
+    sqlite_path=settings.conversation_sqlite_path,
+)
+
+
+async def history_messages(conversation_id: str) -> list:
+    """The stored history of a conversation as chat messages, summary of older turns first."""
+    if not conversation_id:
+        return []
+    return conversation_messages(await conversation_store.aget(conversation_id))
+
+
+def conversation_messages(conversation: dict, lead: str = None) -> list:
+    """
+    history_messages() for a conversation already fetched with
+    conversation_store.aget(); ``lead`` is a user message to open it with.
+    """
+    messages = [HumanMessage(content=lead)] if lead else []
+    if conversation["summary"]:
+        messages.append(SystemMessage(content=f"Summary of earlier turns in this conversation:\n{conversation['summary']}"))
+    for message in conversation["messages"]:
+        message_class = HumanMessage if message["role"] == "user" else AIMessage
+        messages.append(message_class(content=message["content"]))
+    return messages
+
+
+async def record_turn(conversation_id: str, prompt: str, reply: str, context: dict = None):
+    if conversation_id:
+        await conversation_store.aappend(
+            conversation_id, {"role": "user", "content": prompt}, {"role": "assistant", "content": reply},
+            context=context,
+        )
+
+
+# Identical prompts arriving while the first is still being answered share its completion
+llm_flight = SingleFlight("llm")
+
+semantic_cache = None
+if settings.semantic_cache_enabled:
+    from app.services.semantic_cache import SemanticCache, load_embedder
+    semantic_cache = SemanticCache(
+        load_embedder(settings.semantic_cache_embedder),
+        threshold=settings.semantic_cache_threshold,
+        max_entries=settings.semantic_cache_max_entries,
+        ttl=settings.response_cache_ttl,
+        index=settings.semantic_cache_index,
+        score_log_path=settings.semantic_cache_score_log_path,
     )
-    logger.info(f"ConversationChain created successfully with chain:{chain}")
-    return chain
 
 
+def response_cache_key(operation: str, prompt: str) -> str:
+    # Keyed by the template's version, so a reloaded prompt doesn't serve answers to the old one
+    version = prompt_registry.get(operation).version
+    return make_cache_key(operation, prompt, version, settings.openai_model, settings.openai_temperature)
+
+
+def response_cache_namespace(operation: str) -> str:
+    version = prompt_registry.get(operation).version
+    return make_namespace(operation, version, settings.openai_model, settings.openai_temperature)
+
+
+async def cache_response(operation: str, prompt: str, response: str, history: list = None):
+    # An answer that depended on earlier turns is not a valid answer to the prompt alone
+    if history:
+        return
+    if response_cache is not None:
+        await response_cache.aput(response_cache_key(operation, prompt), response)
+    if semantic_cache is not None:
+        # Embedding is CPU work; keep it off the event loop
+        await asyncio.to_thread(semantic_cache.store, response_cache_namespace(operation), prompt, response)
+
+
+async def _cached_response(operation: str, prompt: str, bypass_cache: bool, history: list = None):
+    if bypass_cache or history:
+        return None
+    if response_cache is not None:
+        cached = await response_cache.aget(response_cache_key(operation, prompt))
+        if cached is not None:
+            logger.info(f"Serving {operation} response from cache")
+            return cached
+    if semantic_cache is not None:
+        match = await asyncio.to_thread(semantic_cache.lookup, response_cache_namespace(operation), prompt)
+        if match is not None:
+            logger.info(f"Serving {operation} response from semantic cache (similarity {match[1]:.4f})")
+            return match[0]
+    return None
+
+
+async def arun_llm(prompt: str, operation: str = "generate", bypass_cache: bool = False, store: bool = True,
+                   usage: UsageCallback = None, history: list = None) -> str:
+    """
+    Run the chain for ``prompt``, serving repeats from the response cache:
+    first an exact match on the normalized prompt, then (when enabled) the
+    closest earlier prompt by embedding similarity.
+
+    ``bypass_cache`` skips the lookup but still refreshes the entry. Callers
+    that must check the response first (generation is only worth caching
+    once it validates) pass ``store=False`` and call cache_response() later.
+    ``usage`` collects the tokens of the completion, if one is made.
+
+    ``history`` (see history_messages()) is put in front of the prompt; an
+    answer that depends on it is neither served from nor stored in the
+    cache.
+
+    Without history, a call made while an identical prompt (same cache key)
+    is already in flight waits for that completion instead of making its
+    own; ``usage`` then stays empty, as no tokens were spent for it.
+    """
+    cached = await _cached_response(operation, prompt, bypass_cache, history)
+    if cached is not None:
+        return cached
+    chain = get_llm_chain(history, operation)
+    callbacks = [usage] if usage is not None else None
+    if history:
+        response = await chain.arun(prompt, callbacks=callbacks)
+    else:
+        response = await llm_flight.do(
+            response_cache_key(operation, prompt), lambda: chain.arun(prompt, callbacks=callbacks)
+        )
+    if store:
+        await cache_response(operation, prompt, response, history)
+    return response
+
+
+async def astream_llm(prompt: str, operation: str = "generate", bypass_cache: bool = False, store: bool = True,
+                      history: list = None):
+    """
+    Yield the completion for ``prompt`` chunk by chunk as OpenAI produces it.
+
+    Uses the operation's template and the history like the chain, so the result is
+    interchangeable with arun_llm() and shares its cache entries; a cached
+    response is yielded as a single chunk. Rate limits are retried only
+    until the first chunk has been sent.
+    """
+    cached = await _cached_response(operation, prompt, bypass_cache, history)
+    if cached is not None:
+        yield cached
+        return
+
+    llm = get_llm_pool().get()
+    template = prompt_registry.get(operation)
+    messages = template.messages(prompt, history)
+    estimated_tokens = estimate_prompt_tokens(*(message.content for message in messages))
+    parts = []
+    for attempt in range(MAX_RATE_LIMIT_RETRIES):
+        with span("llm.attempt", SPAN_KIND_CLIENT, attempt=attempt + 1, streaming=True) as attempt_span:
+            try:
+                async with rate_limiter.slot(estimated_tokens):
+                    async for chunk in llm.astream(messages, config={"metadata": template.metadata}):
+                        if chunk.content:
+                            if not parts and attempt_span is not None:
+                                attempt_span.attributes["llm.first_chunk_ms"] = round(attempt_span.duration_ms, 2)
+                            parts.append(chunk.content)
+                            yield chunk.content
+                break
+            except Exception as e:
+                if parts or not _is_rate_limit_error(e):
+                    logger.error(f"Error while streaming completion: {e}")
+                    raise
+                await _aback_off(attempt, e)
+
+    if store:
+        await cache_response(operation, prompt, "".join(parts), history)
+
+
+async def ainvoke_llm(messages: list, usage: UsageCallback = None, max_tokens: int = None, template=None) -> str:
+    """
+    One-off completion for internal prompts (repairs, diffs) that bypass the
+    conversation prompt, memory and response cache. Rate limits are retried
+    like the chain's. ``template`` is the registry template ``messages``
+    were built from, for per-template usage.
+    """
+    llm = get_llm_pool().get()
+    config = {}
+    if usage is not None:
+        config["callbacks"] = [usage]
+    if template is not None:
+        config["metadata"] = template.metadata
+    kwargs = {"max_tokens": max_tokens} if max_tokens else {}
+    estimated_tokens = estimate_prompt_tokens(*(message.content for message in messages))
+    for attempt in range(MAX_RATE_LIMIT_RETRIES):
+        with span("llm.attempt", SPAN_KIND_CLIENT, attempt=attempt + 1):
+            try:
+                async with rate_limiter.slot(estimated_tokens):
+                    message = await llm.ainvoke(messages, config=config or None, **kwargs)
+                return message.content
+            except Exception as e:
+                if not _is_rate_limit_error(e):
+                    logger.error(f"Non-rate-limit error: {e}")
+                    raise
+                await _aback_off(attempt, e)
+
+    raise Exception("Unexpected error in rate limited completion")
@@ -0,0 +1,66 @@
+# app/services/llm_chain.py
+
+import logging
+
+from langchain.chains import LLMChain
+
+from app.services.langchain_service import MAX_RATE_LIMIT_RETRIES, _aback_off, _back_off, _is_rate_limit_error
+from app.services.rate_limiter import estimate_prompt_tokens, rate_limiter
+from app.services.tracing import SPAN_KIND_CLIENT, span
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitedLLMChain(LLMChain):
+    """
+    LLMChain whose calls go through the shared rate limiter and are retried
+    when OpenAI rate limits us. Kept out of langchain_service so that
+    importing the app doesn't import langchain's chains; get_llm_chain()
+    loads this module on first use.
+    """
+
+    # Estimated size of the prompt template's static text (see PromptTemplate.prefix_tokens)
+    static_tokens: int = 0
+
+    def _estimated_tokens(self, args, kwargs) -> int:
+        inputs = [str(value) for value in args]
+        inputs.extend(str(value) for key, value in kwargs.items() if key not in ("callbacks", "metadata", "tags"))
+        history = getattr(self.memory, "buffer_as_str", "") if self.memory is not None else ""
+        return self.static_tokens + estimate_prompt_tokens(history, *inputs)
+
+    def _with_metadata(self, kwargs) -> dict:
+        # The chain's own metadata only reaches its own callbacks; as call metadata it reaches the LLM's
+        if self.metadata and "metadata" not in kwargs:
+            return dict(kwargs, metadata=self.metadata)
+        return kwargs
+
+    def run(self, *args, **kwargs):
+        kwargs = self._with_metadata(kwargs)
+        for attempt in range(MAX_RATE_LIMIT_RETRIES):
+            with span("llm.attempt", SPAN_KIND_CLIENT, attempt=attempt + 1):
+                rate_limiter.wait_blocking(self._estimated_tokens(args, kwargs))
+                try:
+                    return super().run(*args, **kwargs)
+                except Exception as e:
+                    if not _is_rate_limit_error(e):
+                        logger.error(f"Non-rate-limit error: {e}")
+                        raise
+                    _back_off(attempt, e)
+
+        raise Exception("Unexpected error in rate limited chain")
+
+    async def arun(self, *args, **kwargs):
+        """Async variant of run(); waits in the limiter's queue without blocking the event loop."""
+        kwargs = self._with_metadata(kwargs)
+        for attempt in range(MAX_RATE_LIMIT_RETRIES):
+            with span("llm.attempt", SPAN_KIND_CLIENT, attempt=attempt + 1):
+                try:
+                    async with rate_limiter.slot(self._estimated_tokens(args, kwargs)):
+                        return await super().arun(*args, **kwargs)
+                except Exception as e:
+                    if not _is_rate_limit_error(e):
+                        logger.error(f"Non-rate-limit error: {e}")
+                        raise
+                    await _aback_off(attempt, e)
+
+        raise Exception("Unexpected error in rate limited chain")
@@ -0,0 +1,140 @@
+# app/services/llm_pool.py
+
+import itertools
+import logging
+import threading
+
+import httpx
+
+from app.config import settings
+from app.services.metrics import metrics_callback
+from app.services.rate_limiter import rate_limit_callback
+
+logger = logging.getLogger(__name__)
+
+
+class LLMClientPool:
+    """
+    Process-wide pool of ChatOpenAI clients.
+
+    Each slot holds one client with its own keep-alive HTTP connection pool.
+    Slots are filled lazily (a "cold" creation) and then handed out
+    round-robin, so TLS sessions are reused across requests. Clients carry no
+    per-request state; memory is attached by the chain, not the client.
+
+    ``client_factory(callbacks=...)`` replaces ChatOpenAI with another chat
+    model (the benchmarks' fake one), still wired to metrics and the limiter.
+    """
+
+    def __init__(self, size=None, max_connections=None, keepalive_expiry=None, client_factory=None):
+        self.size = max(1, size or settings.llm_pool_size)
+        self.max_connections = max_connections or settings.llm_max_connections
+        self.keepalive_expiry = keepalive_expiry if keepalive_expiry is not None else settings.llm_keepalive_expiry
+        self.client_factory = client_factory
+        self._clients = [None] * self.size
+        self._http_clients = []
+        self._slots = itertools.count()
+        self._lock = threading.Lock()
+        self.cold_creations = 0
+        self.reuses = 0
+
+    def _create_client(self):
+        # Every completion reports its latency and token usage, streamed ones included,
+        # and hands usage and rate-limit headers back to the limiter
+        callbacks = [metrics_callback, rate_limit_callback]
+        if self.client_factory is not None:
+            return self.client_factory(callbacks=callbacks)
+        # langchain_openai (and openai under it) is most of the app's import time; load it with the first client
+        from langchain_openai import ChatOpenAI
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+        timeout = httpx.Timeout(settings.llm_request_timeout)
+        http_client = httpx.Client(limits=limits, timeout=timeout)
+        http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+        self._http_clients.append((http_client, http_async_client))
+        return ChatOpenAI(
+            model_name=settings.openai_model,
+            openai_api_key=settings.openai_api_key,
+            temperature=settings.openai_temperature,
+            max_tokens=16384,
+            max_retries=3,
+            request_timeout=settings.llm_request_timeout,
+            http_client=http_client,
+            http_async_client=http_async_client,
+            callbacks=callbacks,
+            stream_usage=True,
+            include_response_headers=True,
+        )
+
+    def get(self):
+        """Return a pooled client, creating the slot's client on first use."""
+        slot = next(self._slots) % self.size
+        with self._lock:
+            llm = self._clients[slot]
+            if llm is None:
+                logger.info(f"Creating pooled OpenAI client for slot {slot}")
+                llm = self._create_client()
+                self._clients[slot] = llm
+                self.cold_creations += 1
+            else:
+                self.reuses += 1
+        return llm
+
+    def warm(self):
+        """Fill every slot up front so the first requests don't pay for it."""
+        with self._lock:
+            for slot, llm in enumerate(self._clients):
+                if llm is None:
+                    self._clients[slot] = self._create_client()
+                    self.cold_creations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            created = sum(1 for c in self._clients if c is not None)
+            total = self.cold_creations + self.reuses
+            return {
+                "size": self.size,
+                "created": created,
+                "max_connections": self.max_connections,
+                "keepalive_expiry": self.keepalive_expiry,
+                "cold_creations": self.cold_creations,
+                "reuses": self.reuses,
+                "reuse_ratio": round(self.reuses / total, 4) if total else 0.0,
+            }
+
+    async def aclose(self):
+        with self._lock:
+            http_clients, self._http_clients = self._http_clients, []
+            self._clients = [None] * self.size
+        for http_client, http_async_client in http_clients:
+            http_client.close()
+            await http_async_client.aclose()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def init_llm_pool(client_factory=None) -> LLMClientPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = LLMClientPool(client_factory=client_factory)
+            logger.info(f"LLM client pool initialized with size {_pool.size}")
+        return _pool
+
+
+def get_llm_pool() -> LLMClientPool:
+    return _pool if _pool is not None else init_llm_pool()
+
+
+async def close_llm_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        await pool.aclose()
+        logger.info("LLM client pool closed")
@@ -0,0 +1,362 @@
+# app/services/metrics.py
+
+import contextvars
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from app.config import settings
+from app.services.single_flight import GROUPS as SINGLE_FLIGHT_GROUPS
+
+logger = logging.getLogger(__name__)
+
+QUEUE_WAIT_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LLM_LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+N8N_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with a fixed set of labels, rendered in Prometheus text format."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in values]
+
+
+class Gauge(Counter):
+    """Point-in-time value with a fixed set of labels."""
+
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class CallbackCounter(Counter):
+    """Counter whose values are read from ``collect() -> {labels: value}`` at scrape time."""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple, collect):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def render(self) -> list:
+        self._values = self.collect()
+        return super().render()
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed set of labels, rendered in Prometheus text format."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = STAGE_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        with self._lock:
+            series = [(labels, list(values)) for labels, values in self._series.items()]
+        lines = []
+        for labels, values in series:
+            # Buckets are stored per interval; Prometheus wants them cumulative
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            bucket_labels = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {values[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(values[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {values[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+llm_calls = registry.register(Counter(
+    "smartflow_llm_calls_total", "LLM completions, by endpoint, model and outcome.", ("endpoint", "model", "status")))
+llm_tokens = registry.register(Counter(
+    "smartflow_llm_tokens_total", "Provider-reported LLM tokens, by endpoint, model and kind.", ("endpoint", "model", "kind")))
+llm_cost = registry.register(Counter(
+    "smartflow_llm_cost_usd_total", "Estimated LLM cost in USD from settings.llm_prices.", ("endpoint", "model")))
+llm_latency = registry.register(Histogram(
+    "smartflow_llm_latency_seconds", "Wall time of one LLM completion.", ("endpoint", "model"), LLM_LATENCY_BUCKETS))
+stage_latency = registry.register(Histogram(
+    "smartflow_pipeline_stage_seconds", "Time spent per pipeline stage (llm, extract, validate, repair, n8n_*).",
+    ("pipeline", "stage"), STAGE_BUCKETS))
+llm_queue_depth = registry.register(Gauge(
+    "smartflow_llm_queue_depth", "LLM calls waiting for the rate limiter."))
+llm_in_flight = registry.register(Gauge(
+    "smartflow_llm_in_flight", "LLM calls holding a concurrency slot."))
+llm_queue_wait = registry.register(Histogram(
+    "smartflow_llm_queue_wait_seconds", "Time an LLM call waited for the rate limiter.", (), QUEUE_WAIT_BUCKETS))
+llm_rate_limited = registry.register(Counter(
+    "smartflow_llm_rate_limited_total", "429 responses from OpenAI that reached the application."))
+single_flight_calls = registry.register(CallbackCounter(
+    "smartflow_single_flight_calls_total",
+    "Calls through a single-flight group: leaders ran the call, collapsed ones shared a leader's result.",
+    ("group", "role"),
+    lambda: {
+        labels: value
+        for name, group in list(SINGLE_FLIGHT_GROUPS.items())
+        for labels, value in (((name, "leader"), group.leaders), ((name, "collapsed"), group.collapsed))
+    },
+))
+n8n_latency = registry.register(Histogram(
+    "smartflow_n8n_request_seconds", "Latency of one n8n API request attempt.", ("operation", "status"), N8N_BUCKETS))
+prompt_template_tokens = registry.register(Counter(
+    "smartflow_prompt_template_tokens_total",
+    "Provider-reported prompt tokens by prompt template and version; cache=\"hit\" ones came from OpenAI's prompt cache.",
+    ("template", "version", "cache"),
+))
+
+
+def render_metrics() -> str:
+    return registry.render()
+
+
+# -- LLM usage attribution ----------------------------------------------------
+
+# (endpoint, conversation_id) of the request an LLM call is made for
+_usage_context = contextvars.ContextVar("usage_context", default=("other", None))
+
+
+def bind_usage(endpoint: str, conversation_id: str = None):
+    """
+    Attribute the LLM calls of the current request to ``endpoint`` (and
+    ``conversation_id``). Every request runs in its own task, and tasks it
+    spawns (a StreamingResponse body included) inherit the binding.
+    """
+    _usage_context.set((endpoint, conversation_id))
+
+
+def price_for(model: str):
+    """(prompt, completion, cached prompt) USD per 1M tokens for ``model``, by longest matching prefix."""
+    best = None
+    for name, prices in settings.llm_prices.items():
+        if model.startswith(name) and (best is None or len(name) > len(best)):
+            best = name
+    if best is None:
+        return 0.0, 0.0, 0.0
+    prices = settings.llm_prices[best]
+    return prices[0], prices[1], prices[2] if len(prices) > 2 else prices[0]
+
+
+def llm_result_usage(response: LLMResult):
+    """(prompt_tokens, completion_tokens, model) reported by the provider for one completion."""
+    llm_output = response.llm_output or {}
+    usage = llm_output.get("token_usage") or {}
+    prompt_tokens = usage.get("prompt_tokens")
+    completion_tokens = usage.get("completion_tokens")
+    model = llm_output.get("model_name")
+    if prompt_tokens is None:
+        # Streamed completions carry usage on the message instead
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                metadata = getattr(message, "usage_metadata", None) or {}
+                prompt_tokens = (prompt_tokens or 0) + metadata.get("input_tokens", 0)
+                completion_tokens = (completion_tokens or 0) + metadata.get("output_tokens", 0)
+                model = model or (getattr(message, "response_metadata", None) or {}).get("model_name")
+    return prompt_tokens or 0, completion_tokens or 0, model or settings.openai_model
+
+
+def llm_result_cached_tokens(response: LLMResult) -> int:
+    """Prompt tokens the provider served from its prompt cache, for one completion (0 when not reported)."""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    details = usage.get("prompt_tokens_details") or {}
+    if details.get("cached_tokens") is not None:
+        return details["cached_tokens"]
+    cached = 0
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            cached += (metadata.get("input_token_details") or {}).get("cache_read", 0) or 0
+    return cached
+
+
+class PromptUsage:
+    """Calls, prompt tokens and cached prompt tokens per (prompt template, version)."""
+
+    def __init__(self, max_entries: int = 200):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, template: str, version: str, prompt_tokens: int, cached_tokens: int):
+        with self._lock:
+            entry = self._entries.get((template, version))
+            if entry is None:
+                entry = self._entries[(template, version)] = {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0}
+            self._entries.move_to_end((template, version))
+            entry["calls"] += 1
+            entry["prompt_tokens"] += prompt_tokens
+            entry["cached_tokens"] += cached_tokens
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """{template: {version: usage}}, with the share of prompt tokens that were cached."""
+        with self._lock:
+            entries = [(key, dict(entry)) for key, entry in self._entries.items()]
+        stats = {}
+        for (template, version), entry in entries:
+            entry["cached_ratio"] = round(entry["cached_tokens"] / entry["prompt_tokens"], 4) if entry["prompt_tokens"] else 0.0
+            stats.setdefault(template, {})[version] = entry
+        return stats
+
+
+class ConversationUsage:
+    """Token and cost totals per conversation, for the most recently active ``max_entries`` conversations."""
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, conversation_id: str, prompt_tokens: int, completion_tokens: int, cost: float):
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                entry = self._entries[conversation_id] = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+            self._entries.move_to_end(conversation_id)
+            entry["calls"] += 1
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            entry["cost_usd"] += cost
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, conversation_id: str) -> dict:
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            return dict(entry, cost_usd=round(entry["cost_usd"], 6)) if entry else None
+
+
+conversation_usage = ConversationUsage(settings.conversation_max_entries)
+prompt_usage = PromptUsage()
+
+
+class MetricsCallback(BaseCallbackHandler):
+    """
+    Attached to every pooled LLM client: records latency, provider-reported
+    tokens and estimated cost of each completion, attributed to the
+    endpoint and conversation set by bind_usage(), and to the prompt
+    template named in the call's ``prompt_template``/``prompt_version``
+    metadata.
+    """
+
+    run_inline = True  # called on the event loop, so it sees the request's bind_usage()
+
+    def __init__(self):
+        self._started = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        self._started[run_id] = (time.perf_counter(), metadata or {})
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self._started[run_id] = (time.perf_counter(), metadata or {})
+
+    def on_llm_end(self, response: LLMResult, *, run_id, **kwargs):
+        started, metadata = self._started.pop(run_id, (None, {}))
+        endpoint, conversation_id = _usage_context.get()
+        prompt_tokens, completion_tokens, model = llm_result_usage(response)
+        cached_tokens = min(llm_result_cached_tokens(response), prompt_tokens)
+        prompt_price, completion_price, cached_price = price_for(model)
+        cost = ((prompt_tokens - cached_tokens) * prompt_price + cached_tokens * cached_price
+                + completion_tokens * completion_price) / 1_000_000
+        llm_calls.inc(1, endpoint, model, "ok")
+        llm_tokens.inc(prompt_tokens, endpoint, model, "prompt")
+        llm_tokens.inc(cached_tokens, endpoint, model, "cached_prompt")
+        llm_tokens.inc(completion_tokens, endpoint, model, "completion")
+        llm_cost.inc(cost, endpoint, model)
+        template = metadata.get("prompt_template")
+        if template:
+            version = metadata.get("prompt_version", "")
+            prompt_template_tokens.inc(cached_tokens, template, version, "hit")
+            prompt_template_tokens.inc(prompt_tokens - cached_tokens, template, version, "miss")
+            prompt_usage.add(template, version, prompt_tokens, cached_tokens)
+        if started is not None:
+            llm_latency.observe(time.perf_counter() - started, endpoint, model)
+        if conversation_id:
+            conversation_usage.add(conversation_id, prompt_tokens, completion_tokens, cost)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        started, _ = self._started.pop(run_id, (None, None))
+        endpoint, _ = _usage_context.get()
+        llm_calls.inc(1, endpoint, settings.openai_model, "error")
+        if started is not None:
+            llm_latency.observe(time.perf_counter() - started, endpoint, settings.openai_model)
+
+
+metrics_callback = MetricsCallback()
@@ -0,0 +1,99 @@
+# app/services/pipeline_stats.py
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from app.services.metrics import stage_latency
+from app.services.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimings:
+    """
+    Per-request record of a pipeline run: wall time, LLM calls and tokens
+    for each stage (llm, extract, validate, repair, n8n_create, ...).
+    ``listener(name)``, if given, is called as each stage starts. Each
+    stage is also a span of the current trace.
+    """
+
+    def __init__(self, listener=None):
+        self.stages = {}
+        self.listener = listener
+
+    def _stage(self, name: str) -> dict:
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = {"ms": 0.0, "calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        return stage
+
+    @contextmanager
+    def stage(self, name: str):
+        if self.listener is not None:
+            self.listener(name)
+        start = time.perf_counter()
+        try:
+            with span(name):
+                yield
+        finally:
+            self._stage(name)["ms"] += (time.perf_counter() - start) * 1000
+
+    def add_usage(self, name: str, prompt_tokens: int = 0, completion_tokens: int = 0, calls: int = 1):
+        stage = self._stage(name)
+        stage["calls"] += calls
+        stage["prompt_tokens"] += prompt_tokens
+        stage["completion_tokens"] += completion_tokens
+
+    def total_tokens(self, name: str) -> int:
+        stage = self.stages.get(name)
+        return stage["prompt_tokens"] + stage["completion_tokens"] if stage else 0
+
+    def summary(self) -> str:
+        return ", ".join(
+            f"{name}={stage['ms']:.1f}ms"
+            + (f"/{stage['prompt_tokens']}+{stage['completion_tokens']}tok" if stage["calls"] else "")
+            for name, stage in self.stages.items()
+        )
+
+
+class PipelineStats:
+    """Process-wide aggregate of StageTimings, reported by /stats."""
+
+    def __init__(self, name: str = "generation"):
+        self.name = name
+        self._stages = {}
+        self._outcomes = {}
+        self._lock = threading.Lock()
+
+    def record(self, timings: StageTimings, outcome: str):
+        with self._lock:
+            self._outcomes[outcome] = self._outcomes.get(outcome, 0) + 1
+            for name, stage in timings.stages.items():
+                total = self._stages.setdefault(
+                    name, {"count": 0, "ms": 0.0, "calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+                )
+                total["count"] += 1
+                for key in ("ms", "calls", "prompt_tokens", "completion_tokens"):
+                    total[key] += stage[key]
+                stage_latency.observe(stage["ms"] / 1000, self.name, name)
+        logger.info(f"{self.name.capitalize()} pipeline ({outcome}): {timings.summary()}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stages = {}
+            for name, total in self._stages.items():
+                count = total["count"]
+                stages[name] = {
+                    "count": count,
+                    "avg_ms": round(total["ms"] / count, 2),
+                    "llm_calls": total["calls"],
+                    "avg_prompt_tokens": round(total["prompt_tokens"] / count, 1),
+                    "avg_completion_tokens": round(total["completion_tokens"] / count, 1),
+                }
+            return {"outcomes": dict(self._outcomes), "stages": stages}
+
+
+pipeline_stats = PipelineStats("generation")
+update_stats = PipelineStats("update")
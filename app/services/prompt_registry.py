@@ -0,0 +1,159 @@
+# app/services/prompt_registry.py
+"""
+Prompt templates, one per LLM operation, loaded from app/prompts.
+
+A template is a static system text. Its messages are always the same
+SystemMessage object, followed by the conversation history and then the
+variable input (the user's request, a workflow), so consecutive calls share
+a byte-identical prefix that OpenAI's automatic prompt caching can reuse.
+OpenAI only caches prompts of 1024 tokens or more. A short template is
+therefore cached once history or a workflow document makes the shared
+prefix long enough.
+
+Each template's version is a hash of its text. The version is part of the
+response cache key and of the metadata every call carries, so cached-token
+counts are reported per template and version (see /prompts). Files are
+checked for changes at most every ``reload_interval`` seconds and re-read
+when they change. If a changed file can't be read, or is empty, the
+previous version stays in use.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from app.config import settings
+from app.services.rate_limiter import estimate_prompt_tokens
+
+logger = logging.getLogger(__name__)
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "prompts")
+PROMPT_FILES = {
+    "generate": "generate_prompt.txt",
+    "describe": "describe_prompt.txt",
+    "update": "update_full_prompt.txt",  # PUT /workflows/{id}?mode=full
+    "update_patch": "update_prompt.txt",  # diff mode
+    "repair": "repair_prompt.txt",
+}
+# OpenAI caches prompts from this many tokens on
+MIN_CACHED_PROMPT_TOKENS = 1024
+
+
+class PromptTemplate:
+    """One version of a template, with its message objects built once."""
+
+    def __init__(self, name: str, text: str, path: str = None, mtime_ns: int = None, revision: int = 1):
+        self.name = name
+        self.text = text
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.revision = revision
+        self.version = hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+        self.loaded_at = time.time()
+        self.prefix_tokens = estimate_prompt_tokens(text)
+        self.system_message = SystemMessage(content=text)
+        self.metadata = {"prompt_template": name, "prompt_version": self.version}
+        self._chat_prompt = None
+
+    def messages(self, user_input: str, history: list = None) -> list:
+        """Static system message first, then the history, then the input: the order prompt caching needs."""
+        return [self.system_message, *(history or []), HumanMessage(content=user_input)]
+
+    def chat_prompt(self):
+        """The same messages as a ChatPromptTemplate (``history``, ``input``) for LLMChain."""
+        if self._chat_prompt is None:
+            from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate, MessagesPlaceholder
+            # A message instance is used verbatim, so braces in the text need no escaping
+            self._chat_prompt = ChatPromptTemplate.from_messages([
+                self.system_message,
+                MessagesPlaceholder("history"),
+                HumanMessagePromptTemplate.from_template("{input}"),
+            ])
+        return self._chat_prompt
+
+    def as_dict(self) -> dict:
+        return {
+            "version": self.version,
+            "revision": self.revision,
+            "path": self.path,
+            "loaded_at": self.loaded_at,
+            "chars": len(self.text),
+            "prefix_tokens": self.prefix_tokens,
+            # Below the threshold, cache hits need history or a workflow to extend the shared prefix
+            "cacheable_alone": self.prefix_tokens >= MIN_CACHED_PROMPT_TOKENS,
+        }
+
+
+class PromptRegistry:
+    def __init__(self, directory: str = PROMPTS_DIR, files: dict = None, reload_interval: float = 2.0):
+        self.directory = directory
+        self.files = dict(files or PROMPT_FILES)
+        self.reload_interval = reload_interval
+        self._templates = {}
+        self._lock = threading.Lock()
+        self._checked = time.monotonic()
+        self.reloads = 0
+        self.reload_errors = 0
+        for name in self.files:
+            # A missing or unreadable template is a deployment error; fail at startup, not on first use
+            self._templates[name] = self._read(name)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, self.files[name])
+
+    def _read(self, name: str, revision: int = 1) -> PromptTemplate:
+        path = self._path(name)
+        mtime_ns = os.stat(path).st_mtime_ns
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        if not text.strip():
+            raise ValueError(f"prompt template {path} is empty")
+        return PromptTemplate(name, text, path, mtime_ns, revision)
+
+    def get(self, name: str) -> PromptTemplate:
+        if self.reload_interval > 0 and time.monotonic() - self._checked >= self.reload_interval:
+            self.reload()
+        return self._templates[name]
+
+    def names(self) -> list:
+        return list(self.files)
+
+    def reload(self) -> list:
+        """Re-read templates whose files changed; returns the names of those that got a new version."""
+        changed = []
+        with self._lock:
+            self._checked = time.monotonic()
+            for name in self.files:
+                current = self._templates[name]
+                try:
+                    if os.stat(self._path(name)).st_mtime_ns == current.mtime_ns:
+                        continue
+                    template = self._read(name, current.revision + 1)
+                except (OSError, ValueError) as e:
+                    self.reload_errors += 1
+                    logger.error(f"Could not reload prompt template {name}, keeping version {current.version}: {e}")
+                    continue
+                if template.version == current.version:
+                    # Touched but unchanged: keep the same objects (and prefix)
+                    current.mtime_ns = template.mtime_ns
+                    continue
+                self._templates[name] = template
+                self.reloads += 1
+                changed.append(name)
+                logger.info(f"Prompt template {name} reloaded: version {current.version} -> {template.version}")
+        return changed
+
+    def stats(self) -> dict:
+        return {
+            "directory": self.directory,
+            "reload_interval": self.reload_interval,
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+            "templates": {name: template.as_dict() for name, template in self._templates.items()},
+        }
+
+
+prompt_registry = PromptRegistry(settings.prompts_dir or PROMPTS_DIR, reload_interval=settings.prompt_reload_interval)
@@ -0,0 +1,382 @@
+# app/services/rate_limiter.py
+
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from app.config import settings
+from app.services.metrics import llm_in_flight, llm_queue_depth, llm_queue_wait, llm_rate_limited, llm_result_usage
+from app.services.tracing import span
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+# Waiting callers re-check the buckets at least this often, so pauses and refunds are noticed
+MAX_WAIT_STEP = 1.0
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def estimate_prompt_tokens(*texts) -> int:
+    """Rough prompt size for budgeting before the request is sent; the provider's count settles it afterwards."""
+    return sum(len(text) for text in texts if text) // CHARS_PER_TOKEN + 1
+
+
+def parse_duration(value: str) -> float:
+    """Seconds in an OpenAI reset header ("1s", "6m0s", "20ms") or a plain number of seconds."""
+    if not value:
+        return 0.0
+    try:
+        return float(value)
+    except ValueError:
+        return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in _DURATION.findall(value))
+
+
+def retry_after(headers) -> float:
+    """Seconds the server asked us to wait (retry-after-ms / retry-after), or 0."""
+    if not headers:
+        return 0.0
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return 0.0
+
+
+class RateLimiter:
+    """
+    Proactive limiter in front of OpenAI, shared by every request.
+
+    Two token buckets refill continuously: one holding up to ``rpm``
+    requests, one holding up to ``tpm`` tokens. A call reserves one request
+    and its estimated prompt tokens before it is sent; completion tokens are
+    charged when the response arrives. Remaining-quota headers clamp the
+    buckets to what OpenAI reports, and a 429 pauses every caller until its
+    retry-after has passed, instead of each request retrying on its own.
+
+    At most ``max_concurrency`` calls are in flight per process. Excess calls
+    wait in FIFO order: the head of the queue holds the line until it gets
+    a slot and its budget, so a large prompt can't be starved by small ones.
+
+    With ``sqlite_path`` the buckets live in a SQLite row that every uvicorn
+    worker updates under an immediate transaction, so the limits hold for
+    the whole deployment; the concurrency cap stays per process. Waiting
+    for that row's lock can take up to the 5 s busy timeout, so on an event
+    loop every update runs on one dedicated thread, in the order it was
+    made: ``slot()`` and ``apause()`` await theirs, the updates nobody
+    waits on (charges, headers) are queued behind them, so a reservation
+    never overtakes a pause or clamp made before it. A limit of 0 disables
+    that bucket.
+    """
+
+    def __init__(self, rpm: int = 500, tpm: int = 30000, max_concurrency: int = 8, sqlite_path: str = None,
+                 name: str = "openai"):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max(1, max_concurrency)
+        self.sqlite_path = sqlite_path
+        self.name = name
+        now = time.time()
+        self._state = {"requests": float(rpm), "tokens": float(tpm), "updated_at": now, "blocked_until": 0.0}
+        self._lock = threading.Lock()
+        self._db = None
+        self._executor = None
+        self._loop = None
+        self._queue = None
+        self._slots = None
+        self.waiting = 0
+        self.in_flight = 0
+        self.acquired = 0
+        self.delayed = 0
+        self.rate_limited = 0
+        self.total_wait = 0.0
+        if sqlite_path:
+            self._open_db(sqlite_path)
+
+    def _open_db(self, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rate-limiter")
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            " name TEXT PRIMARY KEY, requests REAL NOT NULL, tokens REAL NOT NULL,"
+            " updated_at REAL NOT NULL, blocked_until REAL NOT NULL)"
+        )
+        self._db.execute(
+            "INSERT OR IGNORE INTO rate_limits (name, requests, tokens, updated_at, blocked_until) VALUES (?, ?, ?, ?, ?)",
+            (self.name, self._state["requests"], self._state["tokens"], self._state["updated_at"], 0.0),
+        )
+
+    # -- bucket state ---------------------------------------------------------
+
+    def _update(self, change) -> float:
+        """Run ``change(state, now)`` on the current bucket state (the shared row if configured) and return its result."""
+        now = time.time()
+        with self._lock:
+            if self._db is None:
+                self._refill(self._state, now)
+                return change(self._state, now)
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                requests, tokens, updated_at, blocked_until = self._db.execute(
+                    "SELECT requests, tokens, updated_at, blocked_until FROM rate_limits WHERE name = ?", (self.name,)
+                ).fetchone()
+                state = {"requests": requests, "tokens": tokens, "updated_at": updated_at, "blocked_until": blocked_until}
+                self._refill(state, now)
+                result = change(state, now)
+                self._db.execute(
+                    "UPDATE rate_limits SET requests = ?, tokens = ?, updated_at = ?, blocked_until = ? WHERE name = ?",
+                    (state["requests"], state["tokens"], state["updated_at"], state["blocked_until"], self.name),
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._state = state
+            return result
+
+    async def _aupdate(self, function, *args):
+        """Await ``function(*args)`` (an update) on the limiter's own thread when the row is shared."""
+        if self._executor is None:
+            return function(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    def _update_later(self, change):
+        """_update() for writes whose result nobody waits on; queued on the limiter's thread on an event loop."""
+        if self._executor is not None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            if loop is not None:
+                loop.run_in_executor(self._executor, self._update, change).add_done_callback(_log_update_error)
+                return
+        self._update(change)
+
+    def _refill(self, state: dict, now: float):
+        elapsed = max(0.0, now - state["updated_at"])
+        if self.rpm:
+            state["requests"] = min(float(self.rpm), state["requests"] + elapsed * self.rpm / 60)
+        if self.tpm:
+            state["tokens"] = min(float(self.tpm), state["tokens"] + elapsed * self.tpm / 60)
+        state["updated_at"] = now
+
+    def _reserve(self, tokens: int) -> float:
+        """Take one request and ``tokens`` from the buckets; 0 on success, otherwise seconds until they could fit."""
+        # A prompt bigger than the whole bucket would never fit; let it through once the bucket is full
+        cost = min(tokens, self.tpm) if self.tpm else 0
+
+        def take(state, now):
+            if now < state["blocked_until"]:
+                return state["blocked_until"] - now
+            wait = 0.0
+            if self.rpm and state["requests"] < 1:
+                wait = (1 - state["requests"]) * 60 / self.rpm
+            if self.tpm and state["tokens"] < cost:
+                wait = max(wait, (cost - state["tokens"]) * 60 / self.tpm)
+            if wait:
+                return wait
+            state["requests"] -= 1 if self.rpm else 0
+            state["tokens"] -= cost
+            return 0.0
+
+        return self._update(take)
+
+    async def _areserve(self, tokens: int) -> float:
+        return await self._aupdate(self._reserve, tokens)
+
+    def charge(self, tokens: int):
+        """Take tokens known only after the call (completion tokens) from the token bucket; it may go negative."""
+        if self.tpm and tokens:
+            def take(state, now):
+                state["tokens"] = max(-float(self.tpm), state["tokens"] - tokens)
+            self._update_later(take)
+
+    def observe_headers(self, headers):
+        """
+        Clamp the buckets to the remaining quota OpenAI reports
+        (x-ratelimit-remaining-*); an exhausted quota holds callers back
+        until its x-ratelimit-reset-* time.
+        """
+        if not headers:
+            return
+        try:
+            remaining_requests = headers.get("x-ratelimit-remaining-requests")
+            remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+            remaining_requests = float(remaining_requests) if remaining_requests is not None else None
+            remaining_tokens = float(remaining_tokens) if remaining_tokens is not None else None
+        except ValueError:
+            return
+        if remaining_requests is None and remaining_tokens is None:
+            return
+
+        reset = 0.0
+        if remaining_requests is not None and remaining_requests < 1:
+            reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+        if remaining_tokens is not None and remaining_tokens < 1:
+            reset = max(reset, parse_duration(headers.get("x-ratelimit-reset-tokens")))
+
+        def clamp(state, now):
+            if remaining_requests is not None and self.rpm:
+                state["requests"] = min(state["requests"], remaining_requests)
+            if remaining_tokens is not None and self.tpm:
+                state["tokens"] = min(state["tokens"], remaining_tokens)
+            if reset:
+                state["blocked_until"] = max(state["blocked_until"], now + reset)
+
+        self._update_later(clamp)
+
+    def _block(self, seconds: float):
+        """Count a 429; returns the change that holds callers back for ``seconds``, or None."""
+        self.rate_limited += 1
+        llm_rate_limited.inc(1)
+        if seconds <= 0:
+            return None
+        logger.warning(f"OpenAI rate limit hit; holding all LLM calls for {seconds:.2f}s")
+
+        def block(state, now):
+            state["blocked_until"] = max(state["blocked_until"], now + seconds)
+
+        return block
+
+    def pause(self, seconds: float):
+        """Hold back every caller (in every worker, if shared) for ``seconds``, e.g. after a 429."""
+        block = self._block(seconds)
+        if block is not None:
+            self._update(block)
+
+    async def apause(self, seconds: float):
+        """pause() for async callers; returns once the block is in place, so a retry can't slip past it."""
+        block = self._block(seconds)
+        if block is not None:
+            await self._aupdate(self._update, block)
+
+    # -- acquiring --------------------------------------------------------------
+
+    def _primitives(self):
+        # asyncio primitives belong to one event loop; recreate them if the loop changed
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Lock()
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        return self._queue, self._slots
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int):
+        """Wait for a concurrency slot and budget for one call with ``estimated_tokens`` prompt tokens."""
+        queue, slots = self._primitives()
+        started = time.perf_counter()
+        self.waiting += 1
+        llm_queue_depth.set(self.waiting)
+        try:
+            with span("llm.queue_wait"):
+                async with queue:
+                    await slots.acquire()
+                    try:
+                        while True:
+                            wait = await self._areserve(estimated_tokens)
+                            if wait <= 0:
+                                break
+                            await asyncio.sleep(min(wait, MAX_WAIT_STEP))
+                    except BaseException:
+                        slots.release()
+                        raise
+        finally:
+            self.waiting -= 1
+            llm_queue_depth.set(self.waiting)
+        waited = time.perf_counter() - started
+        llm_queue_wait.observe(waited)
+        self.acquired += 1
+        self.total_wait += waited
+        if waited >= 0.01:
+            self.delayed += 1
+        self.in_flight += 1
+        llm_in_flight.set(self.in_flight)
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            llm_in_flight.set(self.in_flight)
+            slots.release()
+
+    def wait_blocking(self, estimated_tokens: int):
+        """Blocking variant for synchronous callers: waits for budget, not for a concurrency slot."""
+        while True:
+            wait = self._reserve(estimated_tokens)
+            if wait <= 0:
+                return
+            time.sleep(min(wait, MAX_WAIT_STEP))
+
+    def close(self):
+        if self._executor is not None:
+            # Let queued updates finish before the connection goes away
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> dict:
+        # No lock: with a shared row _update() holds it while waiting for SQLite (and replaces _state, not mutates it)
+        state = dict(self._state)
+        return {
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "max_concurrency": self.max_concurrency,
+            "sqlite_path": self.sqlite_path,
+            "available_requests": round(state["requests"], 2),
+            "available_tokens": round(state["tokens"], 1),
+            "queue_depth": self.waiting,
+            "in_flight": self.in_flight,
+            "acquired": self.acquired,
+            "delayed": self.delayed,
+            "avg_wait_ms": round(self.total_wait / self.acquired * 1000, 2) if self.acquired else 0.0,
+            "rate_limited": self.rate_limited,
+        }
+
+
+def _log_update_error(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Rate limiter update failed: {future.exception()}")
+
+
+class RateLimitCallback(BaseCallbackHandler):
+    """Feeds each completion's token usage and rate-limit headers back into the limiter."""
+
+    run_inline = True
+
+    def __init__(self, limiter: RateLimiter):
+        self.limiter = limiter
+
+    def on_llm_end(self, response: LLMResult, **kwargs):
+        _, completion_tokens, _ = llm_result_usage(response)
+        self.limiter.charge(completion_tokens)
+        for generations in response.generations:
+            for generation in generations:
+                metadata = getattr(getattr(generation, "message", None), "response_metadata", None) or {}
+                self.limiter.observe_headers(metadata.get("headers"))
+
+
+rate_limiter = RateLimiter(
+    rpm=settings.llm_rpm_limit,
+    tpm=settings.llm_tpm_limit,
+    max_concurrency=settings.llm_max_concurrency,
+    sqlite_path=settings.llm_rate_limit_sqlite_path,
+)
+rate_limit_callback = RateLimitCallback(rate_limiter)
@@ -0,0 +1,226 @@
+# app/services/response_cache.py
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Fold case, unicode forms, whitespace and trailing punctuation so trivial variants share a key."""
+    text = unicodedata.normalize("NFKC", prompt or "").casefold()
+    text = _WHITESPACE.sub(" ", text).strip()
+    return text.rstrip(" .!?")
+
+
+def make_namespace(operation: str, template: str, model: str, temperature: float) -> str:
+    """Everything besides the prompt that changes what the model would answer."""
+    template_hash = hashlib.sha256(template.encode("utf-8")).hexdigest()
+    material = "\x1f".join([operation, template_hash, model, f"{temperature:.3f}"])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def make_cache_key(operation: str, prompt: str, template: str, model: str, temperature: float) -> str:
+    material = make_namespace(operation, template, model, temperature) + "\x1f" + normalize_prompt(prompt)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache for raw LLM responses.
+
+    The memory tier is a per-process LRU bounded by entry count and total
+    characters. The optional SQLite tier lives in a file shared by every
+    uvicorn worker; hits there are promoted into memory. Both tiers honour a
+    per-entry TTL, and the SQLite tier drops least-recently-read rows once it
+    grows past ``sqlite_max_bytes``.
+    """
+
+    def __init__(self, ttl: float = 3600.0, max_entries: int = 512, max_bytes: int = 16 * 1024 * 1024,
+                 sqlite_path: str = None, sqlite_max_bytes: int = 256 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sqlite_path = sqlite_path
+        self.sqlite_max_bytes = sqlite_max_bytes
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        if sqlite_path:
+            self._open_db(sqlite_path)
+
+    def _open_db(self, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+
+    # -- memory tier --------------------------------------------------------
+
+    def _memory_put(self, key, value, expires_at):
+        size = len(value)
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size, expires_at)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, old_size, _) = self._entries.popitem(last=False)
+            self._bytes -= old_size
+            self.evictions += 1
+
+    def _memory_get(self, key, now):
+        """Value from the memory tier or None; counts the lookup as a miss when there is no SQLite tier to ask."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, size, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._entries[key]
+                self._bytes -= size
+            if self._db is None:
+                self.misses += 1
+            return None
+
+    # -- SQLite tier --------------------------------------------------------
+    # These block on the shared file (up to the busy timeout), so they take
+    # only _db_lock: memory hits and stats() never wait behind them.
+
+    def _disk_get(self, key, now):
+        row = None
+        with self._db_lock:
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                else:
+                    row = None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self._memory_put(key, row[0], row[1])
+            self.disk_hits += 1
+            return row[0]
+
+    def _disk_put(self, key, value, expires_at, now):
+        with self._db_lock:
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), expires_at, now),
+            )
+            evicted = self._prune_db(now)
+        if evicted:
+            with self._lock:
+                self.evictions += evicted
+
+    def _prune_db(self, now: float) -> int:
+        self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        evicted = 0
+        while total > self.sqlite_max_bytes:
+            row = self._db.execute("SELECT key, size FROM responses ORDER BY last_access LIMIT 1").fetchone()
+            if row is None:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+            total -= row[1]
+            evicted += 1
+        return evicted
+
+    # -- public API ---------------------------------------------------------
+
+    def get(self, key: str):
+        now = time.time()
+        value = self._memory_get(key, now)
+        if value is not None or self._db is None:
+            return value
+        return self._disk_get(key, now)
+
+    async def aget(self, key: str):
+        """get() for coroutines: memory hits are answered inline, the SQLite tier is read on a worker thread."""
+        now = time.time()
+        value = self._memory_get(key, now)
+        if value is not None or self._db is None:
+            return value
+        return await asyncio.to_thread(self._disk_get, key, now)
+
+    def _store(self, key: str, value: str, ttl: float, now: float) -> float:
+        expires_at = now + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._memory_put(key, value, expires_at)
+            self.stores += 1
+        return expires_at
+
+    def put(self, key: str, value: str, ttl: float = None):
+        now = time.time()
+        expires_at = self._store(key, value, ttl, now)
+        if self._db is not None:
+            self._disk_put(key, value, expires_at, now)
+
+    async def aput(self, key: str, value: str, ttl: float = None):
+        """put() for coroutines: the SQLite write runs on a worker thread."""
+        now = time.time()
+        expires_at = self._store(key, value, ttl, now)
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_put, key, value, expires_at, now)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        with self._db_lock:
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "sqlite_path": self.sqlite_path,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,230 @@
+# app/services/semantic_cache.py
+"""
+Semantic tier of the response cache.
+
+Prompts are embedded on the CPU and compared by cosine similarity against
+prompts we already answered; a match above the threshold returns the stored
+response without calling the LLM. Embedders are pluggable:
+
+- ``hashing`` (default): signed feature hashing of words and character
+  trigrams. No model download, deterministic, good at paraphrases that share
+  vocabulary.
+- ``sentence-transformers:<model>``: a local sentence-transformers model,
+  forced onto the CPU. Requires the ``sentence-transformers`` package.
+- ``package.module:factory``: any callable returning an object with
+  ``embed(texts) -> numpy.ndarray``.
+
+The index is a NumPy matrix searched brute force, or an HNSW graph when
+``hnswlib`` is installed and requested. Requires numpy.
+"""
+import hashlib
+import importlib
+import json
+import logging
+import re
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"\w+")
+
+
+class HashingEmbedder:
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+
+    def _features(self, text: str):
+        text = text.casefold()
+        words = _TOKEN.findall(text)
+        yield from words
+        for word in words:
+            padded = f" {word} "
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3]
+        for a, b in zip(words, words[1:]):
+            yield f"{a} {b}"
+
+    def embed(self, texts) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                sign = 1.0 if digest & 1 else -1.0
+                vectors[row, (digest >> 1) % self.dim] += sign
+        return vectors
+
+
+class SentenceTransformerEmbedder:
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts) -> np.ndarray:
+        return np.asarray(self.model.encode(list(texts), convert_to_numpy=True), dtype=np.float32)
+
+
+def load_embedder(spec: str):
+    if not spec or spec == "hashing":
+        return HashingEmbedder()
+    if spec.startswith("sentence-transformers"):
+        _, _, model_name = spec.partition(":")
+        return SentenceTransformerEmbedder(model_name or "all-MiniLM-L6-v2")
+    module_name, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attr)()
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class NumpyIndex:
+    """Fixed-capacity ring of unit vectors; search is one matrix-vector product."""
+
+    def __init__(self, dim: int, capacity: int):
+        self.capacity = capacity
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._count = 0
+
+    def add(self, slot: int, vector: np.ndarray):
+        self._vectors[slot] = vector
+        self._count = max(self._count, slot + 1)
+
+    def search(self, vector: np.ndarray):
+        if self._count == 0:
+            return None, 0.0
+        scores = self._vectors[:self._count] @ vector
+        slot = int(np.argmax(scores))
+        return slot, float(scores[slot])
+
+
+class HNSWIndex:
+    """Approximate nearest neighbour index backed by hnswlib (cosine space)."""
+
+    def __init__(self, dim: int, capacity: int):
+        import hnswlib
+        self.capacity = capacity
+        self._index = hnswlib.Index(space="cosine", dim=dim)
+        self._index.init_index(max_elements=capacity, ef_construction=200, M=16)
+        self._index.set_ef(64)
+        self._slots = set()
+
+    def add(self, slot: int, vector: np.ndarray):
+        # Re-adding an existing label replaces its vector
+        self._index.add_items(vector[np.newaxis, :], np.array([slot]))
+        self._slots.add(slot)
+
+    def search(self, vector: np.ndarray):
+        if not self._slots:
+            return None, 0.0
+        labels, distances = self._index.knn_query(vector[np.newaxis, :], k=1)
+        return int(labels[0][0]), 1.0 - float(distances[0][0])
+
+
+class SemanticCache:
+    """
+    Cosine-similarity cache of LLM responses, partitioned by namespace.
+
+    The namespace (operation, template hash, model, temperature) keeps a
+    describe answer from ever serving a generate request. Each namespace has
+    its own index of at most ``max_entries`` prompts; the oldest slot is
+    overwritten when it is full. Every lookup logs its best score, and
+    ``score_log_path`` additionally appends them as JSON lines for offline
+    threshold tuning.
+    """
+
+    def __init__(self, embedder, threshold: float = 0.92, max_entries: int = 2048, ttl: float = 24 * 3600.0,
+                 index: str = "numpy", score_log_path: str = None):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.index_kind = index
+        self.score_log_path = score_log_path
+        self._namespaces = {}  # namespace -> {"index", "entries", "next"}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def _new_index(self, dim: int):
+        if self.index_kind == "hnsw":
+            try:
+                return HNSWIndex(dim, self.max_entries)
+            except ImportError:
+                logger.warning("hnswlib is not installed; falling back to the NumPy index")
+                self.index_kind = "numpy"
+        return NumpyIndex(dim, self.max_entries)
+
+    def _embed(self, text: str) -> np.ndarray:
+        return _normalize(self.embedder.embed([text]))[0]
+
+    def lookup(self, namespace: str, prompt: str):
+        """Return ``(response, score)`` for the closest prompt above the threshold, else None."""
+        vector = self._embed(prompt)
+        with self._lock:
+            space = self._namespaces.get(namespace)
+            slot, score = space["index"].search(vector) if space else (None, 0.0)
+            entry = space["entries"].get(slot) if space and slot is not None else None
+            if entry is not None and time.time() - entry["stored_at"] > self.ttl:
+                entry = None
+            hit = entry is not None and score >= self.threshold
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        logger.info(
+            f"Semantic cache lookup namespace={namespace[:12]} score={score:.4f} "
+            f"threshold={self.threshold} hit={hit}"
+        )
+        self._log_score(namespace, prompt, entry["prompt"] if entry else None, score, hit)
+        return (entry["response"], score) if hit else None
+
+    def store(self, namespace: str, prompt: str, response: str):
+        vector = self._embed(prompt)
+        with self._lock:
+            space = self._namespaces.get(namespace)
+            if space is None:
+                space = {"index": self._new_index(vector.shape[0]), "entries": {}, "next": 0}
+                self._namespaces[namespace] = space
+            slot = space["next"]
+            space["next"] = (slot + 1) % self.max_entries
+            space["index"].add(slot, vector)
+            space["entries"][slot] = {"prompt": prompt, "response": response, "stored_at": time.time()}
+            self.stores += 1
+
+    def _log_score(self, namespace, prompt, matched_prompt, score, hit):
+        if not self.score_log_path:
+            return
+        record = {
+            "ts": time.time(),
+            "namespace": namespace,
+            "prompt": prompt,
+            "matched_prompt": matched_prompt,
+            "score": round(score, 6),
+            "threshold": self.threshold,
+            "hit": hit,
+        }
+        try:
+            with open(self.score_log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            logger.warning(f"Could not write semantic cache score log: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "index": self.index_kind,
+                "threshold": self.threshold,
+                "entries": sum(len(space["entries"]) for space in self._namespaces.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,118 @@
+# app/services/single_flight.py
+
+import asyncio
+import copy
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# name -> SingleFlight, for /stats and /metrics
+GROUPS = {}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent identical calls into one.
+
+    The first caller for a key (the leader) runs the call; callers arriving
+    with the same key while it is in flight wait for it and get the same
+    result or exception. Nothing is remembered once the call finishes,
+    so this only removes duplicate work that overlaps in time; caching is
+    left to the caches. The async call runs in its own task, so a leader
+    whose request is cancelled does not take its followers down with it.
+
+    With ``copy_results`` followers get a deep copy, for results callers
+    may mutate (workflow dicts).
+    """
+
+    def __init__(self, name: str, copy_results: bool = False):
+        self.name = name
+        self.copy_results = copy_results
+        self._tasks = {}  # key -> (asyncio.Task, futures of the callers waiting on it)
+        self._calls = {}  # key -> _Call, for blocking callers
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.collapsed = 0
+        GROUPS[name] = self
+
+    def _share(self, result):
+        return copy.deepcopy(result) if self.copy_results else result
+
+    async def do(self, key, fn):
+        """Await ``fn()``, or the identical call already in flight for ``key``."""
+        loop = asyncio.get_running_loop()
+        flight = self._tasks.get(key)
+        if flight is not None and flight[0].get_loop() is loop and not flight[0].done():
+            self.collapsed += 1
+            waiter = loop.create_future()
+            flight[1].append(waiter)
+            return await waiter
+        task = loop.create_task(fn())
+        waiters = []
+        self._tasks[key] = (task, waiters)
+        self.leaders += 1
+
+        def finish(task):
+            # Runs before the leader resumes, so followers' copies are taken before anyone can mutate the result
+            if self._tasks.get(key, (None,))[0] is task:
+                del self._tasks[key]
+            for waiter in waiters:
+                if waiter.done():
+                    continue
+                if task.cancelled():
+                    waiter.cancel()
+                elif task.exception() is not None:
+                    waiter.set_exception(task.exception())
+                else:
+                    waiter.set_result(self._share(task.result()))
+
+        task.add_done_callback(finish)
+        return await asyncio.shield(task)
+
+    def do_blocking(self, key, fn):
+        """Blocking variant of do() for threaded callers."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.collapsed += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return self._share(call.result)
+        try:
+            call.result = fn()
+            # The leader gets its own copy too, taken before followers wake up and copy the original
+            return self._share(call.result)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def stats(self) -> dict:
+        total = self.leaders + self.collapsed
+        return {
+            "in_flight": len(self._tasks) + len(self._calls),
+            "leaders": self.leaders,
+            "collapsed": self.collapsed,
+            "collapse_ratio": round(self.collapsed / total, 4) if total else 0.0,
+        }
+
+
+def single_flight_stats() -> dict:
+    return {name: group.stats() for name, group in GROUPS.items()}
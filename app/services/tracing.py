@@ -0,0 +1,383 @@
+# app/services/tracing.py
+"""
+Lightweight in-process request tracing.
+
+Every HTTP request (see TracingMiddleware) and background job gets a trace:
+a root span plus timed child spans for pipeline stages, LLM attempts, time
+spent waiting on the rate limiter and n8n calls. The current span lives in
+a contextvar, so spans opened in tasks spawned by the request nest under
+it, and ``span()`` costs one contextvar lookup when nothing is traced.
+
+Finished traces go to a ring buffer (``/debug/traces``) and, if an export
+path is configured, are appended to a file as OTLP/JSON, one
+ExportTraceServiceRequest per line, by a background thread.
+
+The trace id comes from an incoming ``X-Trace-Id`` or W3C ``traceparent``
+header when it is valid, is returned in ``X-Trace-Id`` and is sent on to
+n8n (see trace_headers()). No app imports, so the n8n client can use it
+from the Streamlit side too.
+"""
+import contextvars
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "smartflow"
+TRACE_ID_HEADER = "X-Trace-Id"
+# A runaway loop shouldn't grow one trace without bound; later spans are counted, not kept
+MAX_SPANS_PER_TRACE = 512
+_TRACE_ID = re.compile(r"^[0-9a-f]{32}$")
+# OTLP enums
+SPAN_KIND_INTERNAL, SPAN_KIND_SERVER, SPAN_KIND_CLIENT = 1, 2, 3
+STATUS_OK, STATUS_ERROR = 1, 2
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def new_trace_id() -> str:
+    return secrets.token_hex(16)
+
+
+def _new_span_id() -> str:
+    return secrets.token_hex(8)
+
+
+def incoming_trace_id(headers: dict):
+    """Trace id from ``x-trace-id`` or ``traceparent`` (lower-case str keys), if one is valid."""
+    trace_id = (headers.get("x-trace-id") or "").strip().lower()
+    if _TRACE_ID.match(trace_id) and trace_id != "0" * 32:
+        return trace_id
+    parts = (headers.get("traceparent") or "").strip().lower().split("-")
+    if len(parts) == 4 and _TRACE_ID.match(parts[1]) and parts[1] != "0" * 32:
+        return parts[1]
+    return None
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace, name: str, parent_id: str = None, kind: int = SPAN_KIND_INTERNAL, attributes: dict = None):
+        self.trace = trace
+        self.span_id = _new_span_id()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.error = None
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "offset_ms": round((self.start_ns - self.trace.root.start_ns) / 1e6, 2),
+            "duration_ms": round(self.duration_ms, 2),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class Trace:
+    def __init__(self, name: str, trace_id: str = None, attributes: dict = None):
+        self.trace_id = trace_id or new_trace_id()
+        self.spans = []
+        self.dropped_spans = 0
+        self._lock = threading.Lock()
+        self.root = self.add(name, None, SPAN_KIND_SERVER, attributes)
+
+    def add(self, name: str, parent_id, kind: int, attributes: dict) -> Span:
+        span = Span(self, name, parent_id, kind, attributes)
+        with self._lock:
+            if len(self.spans) < MAX_SPANS_PER_TRACE:
+                self.spans.append(span)
+            else:
+                self.dropped_spans += 1
+        return span
+
+    def as_dict(self, spans: bool = True) -> dict:
+        entry = {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "started_at": self.root.start_ns / 1e9,
+            "duration_ms": round(self.root.duration_ms, 2),
+            "attributes": self.root.attributes,
+            "error": self.root.error,
+            "span_count": len(self.spans) + self.dropped_spans,
+        }
+        if spans:
+            entry["spans"] = [span.as_dict() for span in self.spans[1:]]
+            # Where the time went: total span time by name (nested spans are counted in their parents too)
+            breakdown = {}
+            for span in self.spans[1:]:
+                breakdown[span.name] = round(breakdown.get(span.name, 0.0) + span.duration_ms, 2)
+            entry["breakdown_ms"] = breakdown
+        return entry
+
+
+class TraceBuffer:
+    """The last ``max_traces`` finished traces."""
+
+    def __init__(self, max_traces: int = 500):
+        self._traces = deque(maxlen=max(1, max_traces))
+        self._lock = threading.Lock()
+        self.finished = 0
+
+    def resize(self, max_traces: int):
+        with self._lock:
+            self._traces = deque(self._traces, maxlen=max(1, max_traces))
+
+    def add(self, trace: Trace):
+        with self._lock:
+            self._traces.append(trace)
+            self.finished += 1
+
+    def get(self, trace_id: str):
+        with self._lock:
+            for trace in reversed(self._traces):
+                if trace.trace_id == trace_id:
+                    return trace
+        return None
+
+    def slowest(self, limit: int = 20, name: str = None, min_ms: float = 0.0) -> list:
+        with self._lock:
+            traces = list(self._traces)
+        traces = [t for t in traces if (name is None or name in t.root.name) and t.root.duration_ms >= min_ms]
+        traces.sort(key=lambda t: t.root.duration_ms, reverse=True)
+        return traces[:limit]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"buffered": len(self._traces), "max_traces": self._traces.maxlen, "finished": self.finished}
+
+
+# -- OTLP/JSON export -----------------------------------------------------------
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(span: Span) -> dict:
+    entry = {
+        "traceId": span.trace.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns or span.start_ns),
+        "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+        "status": {"code": STATUS_ERROR, "message": span.error} if span.error else {"code": STATUS_OK},
+    }
+    if span.parent_id:
+        entry["parentSpanId"] = span.parent_id
+    return entry
+
+
+def otlp_json(trace: Trace) -> dict:
+    """The trace as an OTLP ExportTraceServiceRequest in its JSON encoding."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "app.services.tracing"}, "spans": [_otlp_span(s) for s in trace.spans]}],
+        }]
+    }
+
+
+class OTLPFileExporter:
+    """Appends each finished trace to ``path`` as one line of OTLP/JSON, from a background thread."""
+
+    def __init__(self, path: str, max_queue: int = 10000):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.exported = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="otlp-file-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, trace: Trace):
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                trace = self._queue.get()
+                if trace is None:
+                    return
+                try:
+                    f.write(json.dumps(otlp_json(trace), default=str) + "\n")
+                    if self._queue.empty():
+                        f.flush()
+                    self.exported += 1
+                except Exception as e:
+                    logger.error(f"Could not export trace {trace.trace_id}: {e}")
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def stats(self) -> dict:
+        return {"path": self.path, "exported": self.exported, "dropped": self.dropped}
+
+
+# -- recording --------------------------------------------------------------------
+
+trace_buffer = TraceBuffer()
+_exporter = None
+_enabled = True
+
+
+def configure_tracing(enabled: bool = True, max_traces: int = 500, export_path: str = None):
+    global _exporter, _enabled
+    _enabled = enabled
+    trace_buffer.resize(max_traces)
+    if export_path and (_exporter is None or _exporter.path != export_path):
+        if _exporter is not None:
+            _exporter.close()
+        _exporter = OTLPFileExporter(export_path)
+
+
+def close_tracing():
+    global _exporter
+    exporter, _exporter = _exporter, None
+    if exporter is not None:
+        exporter.close()
+
+
+def _enter(span: Span):
+    return _current_span.set(span)
+
+
+def _exit(token, span: Span, parent):
+    span.end_ns = time.time_ns()
+    try:
+        _current_span.reset(token)
+    except ValueError:
+        # Closed from another context (an async generator finalized elsewhere)
+        _current_span.set(parent)
+
+
+@contextmanager
+def start_trace(name: str, trace_id: str = None, attributes: dict = None):
+    """Trace what runs inside as one request; yields the root span (None when tracing is off)."""
+    if not _enabled:
+        yield None
+        return
+    trace = Trace(name, trace_id, attributes)
+    root = trace.root
+    parent = _current_span.get()
+    token = _enter(root)
+    try:
+        yield root
+    except BaseException as e:
+        root.error = root.error or f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _exit(token, root, parent)
+        trace_buffer.add(trace)
+        if _exporter is not None:
+            _exporter.export(trace)
+
+
+@contextmanager
+def span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes):
+    """Time what runs inside as a child of the current span; a no-op outside a trace."""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = parent.trace.add(name, parent.span_id, kind, attributes)
+    token = _enter(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _exit(token, child, parent)
+
+
+def set_attribute(key: str, value):
+    current = _current_span.get()
+    if current is not None:
+        current.attributes[key] = value
+
+
+def current_trace_id():
+    current = _current_span.get()
+    return current.trace.trace_id if current is not None else None
+
+
+def trace_headers() -> dict:
+    """Headers that carry the current trace to a downstream service (n8n)."""
+    current = _current_span.get()
+    if current is None:
+        return {}
+    return {
+        TRACE_ID_HEADER: current.trace.trace_id,
+        "traceparent": f"00-{current.trace.trace_id}-{current.span_id}-01",
+    }
+
+
+def tracing_stats() -> dict:
+    stats = dict(trace_buffer.stats(), enabled=_enabled)
+    if _exporter is not None:
+        stats["exporter"] = _exporter.stats()
+    return stats
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware: one trace per HTTP request, named "METHOD /path", that
+    lasts until the last body chunk is sent (streamed responses included).
+    The trace id is returned in X-Trace-Id.
+    """
+
+    def __init__(self, app, exclude: tuple = ()):
+        self.app = app
+        self.exclude = tuple(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _enabled or scope["path"].startswith(self.exclude):
+            await self.app(scope, receive, send)
+            return
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        name = f"{scope['method']} {scope['path']}"
+        attributes = {"http.method": scope["method"], "http.target": scope["path"]}
+        with start_trace(name, incoming_trace_id(headers), attributes) as root:
+            async def send_with_trace_id(message):
+                if message["type"] == "http.response.start":
+                    root.attributes["http.status_code"] = message["status"]
+                    if message["status"] >= 500:
+                        root.error = f"HTTP {message['status']}"
+                    message = dict(message, headers=[
+                        *message.get("headers", []), (TRACE_ID_HEADER.lower().encode(), root.trace.trace_id.encode()),
+                    ])
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace_id)
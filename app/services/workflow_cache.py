@@ -0,0 +1,173 @@
+# app/services/workflow_cache.py
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# The fields of a workflow in a summary listing (GET /get_all_workflows?summary=true)
+WORKFLOW_SUMMARY_FIELDS = ("id", "name", "active", "updatedAt")
+
+
+def summarize_workflow(workflow: dict) -> dict:
+    return {field: workflow.get(field) for field in WORKFLOW_SUMMARY_FIELDS}
+
+
+class WorkflowCache:
+    """
+    In-memory cache of n8n workflows in front of the n8n client.
+
+    Full workflows are keyed by id and evicted least-recently-used once their
+    serialized size passes ``max_bytes``. Entries expire after ``ttl`` seconds
+    and are dropped early when a caller (or a fresh listing) reports a
+    different ``updatedAt`` than the cached copy. Listings are cached
+    separately: the summary listing as-is, the full listing as a list of ids
+    that is only served while every referenced workflow is still cached.
+
+    Workflows are stored as their JSON text and decoded on every read, so
+    callers get their own copies: mutating a result (or a workflow after
+    putting it) never changes the cache.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_bytes: int = 32 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # id -> (JSON text, updatedAt, stored_at)
+        self._bytes = 0
+        self._summary_listing = None  # (summaries, stored_at)
+        self._full_listing = None  # (ids, stored_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _expired(self, stored_at: float) -> bool:
+        return time.monotonic() - stored_at > self.ttl
+
+    def _drop(self, workflow_id):
+        text, _, _ = self._entries.pop(workflow_id)
+        self._bytes -= len(text)
+
+    # -- single workflows ---------------------------------------------------
+
+    def get(self, workflow_id, updated_at: str = None):
+        """Return the cached workflow, or None if missing, expired or stale."""
+        workflow_id = str(workflow_id)
+        with self._lock:
+            entry = self._entries.get(workflow_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            text, cached_updated_at, stored_at = entry
+            if self._expired(stored_at):
+                self._drop(workflow_id)
+                self.misses += 1
+                return None
+            if updated_at and cached_updated_at != updated_at:
+                self._drop(workflow_id)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(workflow_id)
+            self.hits += 1
+        return json.loads(text)
+
+    def put(self, workflow: dict):
+        workflow_id = workflow.get("id")
+        if workflow_id is None:
+            return
+        workflow_id = str(workflow_id)
+        text = json.dumps(workflow, separators=(",", ":"))
+        with self._lock:
+            if workflow_id in self._entries:
+                self._drop(workflow_id)
+            if len(text) > self.max_bytes:
+                return
+            self._entries[workflow_id] = (text, workflow.get("updatedAt"), time.monotonic())
+            self._bytes += len(text)
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+            self._touch_listings(workflow)
+
+    def invalidate(self, workflow_id):
+        with self._lock:
+            if str(workflow_id) in self._entries:
+                self._drop(str(workflow_id))
+                self.invalidations += 1
+            self._summary_listing = None
+            self._full_listing = None
+
+    # -- listings -----------------------------------------------------------
+
+    def get_listing(self, summary: bool = False):
+        with self._lock:
+            listing = self._summary_listing if summary else self._full_listing
+            if listing is None or self._expired(listing[1]):
+                self.misses += 1
+                return None
+            if summary:
+                self.hits += 1
+                return [dict(item) for item in listing[0]]
+            texts = []
+            for workflow_id in listing[0]:
+                entry = self._entries.get(workflow_id)
+                if entry is None or self._expired(entry[2]):
+                    self.misses += 1
+                    return None
+                texts.append(entry[0])
+            self.hits += 1
+        return [json.loads(text) for text in texts]
+
+    def put_listing(self, workflows: list, summary: bool = False):
+        now = time.monotonic()
+        if not summary:
+            for workflow in workflows:
+                self.put(workflow)
+        with self._lock:
+            if summary:
+                # A listing is the cheapest freshness check we get: drop
+                # cached workflows whose updatedAt has moved on.
+                for item in workflows:
+                    entry = self._entries.get(str(item.get("id")))
+                    if entry and entry[1] != item.get("updatedAt"):
+                        self._drop(str(item.get("id")))
+                        self.invalidations += 1
+            else:
+                self._full_listing = ([str(wf.get("id")) for wf in workflows], now)
+            self._summary_listing = ([summarize_workflow(wf) for wf in workflows], now)
+
+    def _touch_listings(self, workflow: dict):
+        # Keep cached listings in step with write-through puts
+        workflow_id = str(workflow.get("id"))
+        if self._summary_listing is not None:
+            summaries, stored_at = self._summary_listing
+            summaries = [s for s in summaries if str(s.get("id")) != workflow_id] + [summarize_workflow(workflow)]
+            self._summary_listing = (summaries, stored_at)
+        if self._full_listing is not None and workflow_id not in self._full_listing[0]:
+            ids, stored_at = self._full_listing
+            self._full_listing = (ids + [workflow_id], stored_at)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._summary_listing = None
+            self._full_listing = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,131 @@
+# app/services/workflow_repair.py
+
+import json
+import logging
+import re
+
+from app.config import settings
+from app.services.langchain_service import UsageCallback, ainvoke_llm
+from app.services.pipeline_stats import StageTimings
+from app.services.prompt_registry import prompt_registry
+from app.utils.json_patch import PatchError, apply_patch
+from app.utils.json_validator import extract_json_from_response
+from app.utils.workflow_validator import error_key, validate_workflow
+
+logger = logging.getLogger(__name__)
+
+# Rough chars-per-token ratio for budgeting before the call is made
+CHARS_PER_TOKEN = 4
+MAX_PATCH_TOKENS = 4096
+# How much of an unparseable completion is shown to the model when rebuilding from it
+MAX_DRAFT_CHARS = 16000
+
+_PATH_PART = re.compile(r"\['((?:[^'\\]|\\.)*)'\]|\[(\d+)\]|\.?([^.\[:\s]+)")
+
+
+def error_pointer(path: str) -> str:
+    """Turn a validator path like ``nodes[3].parameters.url`` into ``/nodes/3/parameters/url``."""
+    parts = []
+    for match in _PATH_PART.finditer(path):
+        part = next(group for group in match.groups() if group is not None)
+        parts.append(part.replace("~", "~0").replace("/", "~1"))
+    return "/" + "/".join(parts)
+
+
+def _format_errors(errors: list) -> str:
+    lines = []
+    for error in errors:
+        path, sep, message = error.partition(": ")
+        lines.append(f"- {error_pointer(path)}: {message}" if sep else f"- {error}")
+    return "\n".join(lines)
+
+
+def _repair_messages(template, workflow: dict, errors: list, rejected: str = None, draft: str = None) -> list:
+    document = json.dumps(workflow, separators=(",", ":"), ensure_ascii=False)
+    content = f"Validation errors:\n{_format_errors(errors)}\n\nWorkflow:\n{document}"
+    if draft:
+        content = (f"{content}\n\nThe workflow was generated from this answer, which is not valid JSON. "
+                   f"Rebuild the workflow it describes:\n{draft}")
+    if rejected:
+        content = f"Your previous patch could not be applied: {rejected}\n\n{content}"
+    return template.messages(content)
+
+
+async def repair_workflow(workflow: dict, timings: StageTimings, max_attempts: int = None, token_budget: int = None,
+                          tolerated: set = None, draft: str = None):
+    """
+    Ask the model to patch ``workflow`` until it validates.
+
+    Each attempt sends only the current (minified) workflow and its
+    validation errors, and expects a JSON Patch back; a patch that fails to
+    apply is reported to the model on the next attempt. Stops after
+    ``max_attempts`` or once the next call would exceed ``token_budget``
+    (estimated up front, then counted from OpenAI's reported usage).
+
+    Errors whose error_key() is in ``tolerated`` (say, problems an edited
+    workflow already had) are neither sent nor required to go away.
+
+    Returns the repaired workflow, or None if it still does not validate.
+    """
+    max_attempts = settings.repair_max_attempts if max_attempts is None else max_attempts
+    token_budget = settings.repair_token_budget if token_budget is None else token_budget
+    tolerated = tolerated or set()
+
+    def validate(candidate):
+        return [error for error in validate_workflow(candidate) if error_key(error, candidate) not in tolerated]
+
+    errors = validate(workflow)
+    rejected = None
+    with timings.stage("repair"):
+        for attempt in range(1, max_attempts + 1):
+            template = prompt_registry.get("repair")
+            messages = _repair_messages(template, workflow, errors, rejected, draft)
+            estimated_prompt = sum(len(message.content) for message in messages) // CHARS_PER_TOKEN
+            remaining = token_budget - timings.total_tokens("repair") - estimated_prompt
+            if remaining <= 0:
+                logger.warning(f"Repair token budget exhausted before attempt {attempt} ({token_budget} tokens)")
+                break
+            logger.info(f"Repair attempt {attempt}/{max_attempts} for {len(errors)} validation error(s)")
+            usage = UsageCallback()
+            try:
+                response = await ainvoke_llm(messages, usage=usage, max_tokens=min(remaining, MAX_PATCH_TOKENS),
+                                             template=template)
+            finally:
+                timings.add_usage("repair", usage.prompt_tokens, usage.completion_tokens)
+            answer = extract_json_from_response(response)
+            try:
+                if not isinstance(answer, dict):
+                    raise PatchError("response did not contain a JSON object")
+                if "patch" in answer:
+                    candidate = apply_patch(workflow, answer["patch"])
+                elif "nodes" in answer:
+                    # The model sent the whole workflow back instead of a patch
+                    candidate = answer
+                else:
+                    raise PatchError('expected an object with a "patch" list')
+            except PatchError as e:
+                logger.warning(f"Repair attempt {attempt} returned an unusable patch: {e}")
+                rejected = str(e)
+                continue
+            rejected = draft = None
+            workflow = candidate
+            errors = validate(workflow)
+            if not errors:
+                logger.info(f"Workflow repaired after {attempt} attempt(s)")
+                return workflow
+    logger.warning(f"Workflow still invalid after repair: {errors[:3]}")
+    return None
+
+
+async def repair_unparsed(response: str, timings: StageTimings, max_attempts: int = None, token_budget: int = None):
+    """
+    Rebuild a workflow from a completion that extract_json_from_response()
+    could not get an object out of, even after its own truncation repair.
+    The repair loop starts from an empty workflow with (the first
+    MAX_DRAFT_CHARS of) the completion attached as the draft to rebuild.
+    Returns the workflow, or None.
+    """
+    if not response or not response.strip():
+        return None
+    empty = {"name": "Generated workflow", "nodes": [], "connections": {}}
+    return await repair_workflow(empty, timings, max_attempts, token_budget, draft=response[:MAX_DRAFT_CHARS])
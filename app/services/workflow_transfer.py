@@ -0,0 +1,312 @@
+# app/services/workflow_transfer.py
+"""
+Bulk export/import of n8n workflows as gzip-compressed NDJSON, one full
+workflow definition per line.
+
+Both directions stream: export compresses each page as n8n returns it, and
+import parses lines as the body (or file) arrives, so neither holds the
+whole set in memory. Import writes through a bounded pool of concurrent
+n8n calls; the shared N8nClient retries each of them on 429/5xx and
+connection errors.
+
+Command line, against the n8n configured in .env (or N8N_API_BASE_URL):
+
+    python -m app.services.workflow_transfer export -o backup.ndjson.gz
+    python -m app.services.workflow_transfer import backup.ndjson.gz --mode upsert --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+import zlib
+
+from app.config import settings
+from app.n8n_client import acreate_workflow, aiter_workflows, aupdate_workflow_in_n8n, close_n8n_client
+from app.utils.workflow_validator import validate_workflow
+
+logger = logging.getLogger(__name__)
+
+IMPORT_MODES = ("create", "upsert")
+GZIP_MAGIC = b"\x1f\x8b"
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+READ_CHUNK_BYTES = 64 * 1024
+# Failures listed in an import report; the counters keep counting past this
+MAX_REPORTED_ERRORS = 100
+
+
+class TransferError(ValueError):
+    """The import stream is not valid (gzip) NDJSON."""
+
+
+class TransferReport:
+    """Counters and throughput of one export or import run."""
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.started = time.perf_counter()
+        self.finished = None
+        self.lines = 0
+        self.valid = 0
+        self.exported = 0
+        self.created = 0
+        self.updated = 0
+        self.invalid = 0
+        self.failed = 0
+        self.bytes = 0
+        self.errors = []
+        self.warnings = []
+        self.aborted = None  # why the stream could not be read to the end
+
+    def error(self, line: int, message: str, workflow: dict = None):
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            entry = {"line": line, "error": message}
+            if isinstance(workflow, dict):
+                entry.update(id=workflow.get("id"), name=workflow.get("name"))
+            self.errors.append(entry)
+
+    def warning(self, line: int, messages: list, workflow: dict):
+        if len(self.warnings) < MAX_REPORTED_ERRORS:
+            self.warnings.append({"line": line, "id": workflow.get("id"), "name": workflow.get("name"),
+                                  "warnings": messages})
+
+    def finish(self):
+        self.finished = time.perf_counter()
+        return self
+
+    def as_dict(self) -> dict:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        if self.operation == "export":
+            counts = {"exported": self.exported}
+            done = self.exported
+        else:
+            counts = {
+                "lines": self.lines, "valid": self.valid, "created": self.created, "updated": self.updated,
+                "invalid": self.invalid, "failed": self.failed, "aborted": self.aborted, "errors": self.errors,
+                "warnings": self.warnings,
+            }
+            done = self.created + self.updated
+        return {
+            "operation": self.operation,
+            "success": self.invalid == 0 and self.failed == 0 and self.aborted is None,
+            **counts,
+            "bytes": self.bytes,
+            "elapsed_s": round(elapsed, 3),
+            "workflows_per_s": round(done / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+
+# -- export -------------------------------------------------------------------
+
+async def aexport_workflows(report: TransferReport = None, page_size: int = None, level: int = 6):
+    """
+    Yield gzip-compressed NDJSON of every workflow in n8n, page by page.
+    An n8n error mid-way raises, leaving the gzip stream unterminated, so an
+    import of the truncated file reports it as aborted.
+    """
+    report = report or TransferReport("export")
+    compressor = zlib.compressobj(level, zlib.DEFLATED, _GZIP_WBITS)
+    async for workflow in aiter_workflows(limit=page_size):
+        chunk = compressor.compress(json.dumps(workflow, separators=(",", ":")).encode("utf-8") + b"\n")
+        report.exported += 1
+        if chunk:
+            report.bytes += len(chunk)
+            yield chunk
+    chunk = compressor.flush()
+    report.bytes += len(chunk)
+    report.finish()
+    logger.info(f"Exported {report.exported} workflows ({report.bytes} bytes compressed)")
+    yield chunk
+
+
+# -- import -------------------------------------------------------------------
+
+async def aiter_ndjson_lines(chunks, max_line_bytes: int = None):
+    """
+    Yield the non-empty lines of an NDJSON byte stream, gunzipping it on the
+    fly when it starts with the gzip magic (concatenated members included).
+    """
+    max_line_bytes = max_line_bytes or settings.transfer_max_line_bytes
+    decompressor = None
+    started = False
+    pending = b""
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        if not started:
+            started = True
+            if chunk[:2] == GZIP_MAGIC:
+                decompressor = zlib.decompressobj(_GZIP_WBITS)
+        if decompressor is not None:
+            data = b""
+            while chunk:
+                data += decompressor.decompress(chunk)
+                chunk = decompressor.unused_data
+                if chunk:
+                    decompressor = zlib.decompressobj(_GZIP_WBITS)
+            chunk = data
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        if len(pending) > max_line_bytes:
+            raise TransferError(f"A line is longer than {max_line_bytes} bytes")
+        for line in lines:
+            if line.strip():
+                yield line
+    if decompressor is not None and not decompressor.eof:
+        raise TransferError("Truncated gzip stream")
+    if pending.strip():
+        yield pending
+
+
+class WorkflowImporter:
+    """
+    Creates (or, in upsert mode, updates by ``id``) the workflows of an
+    NDJSON stream in n8n, at most ``concurrency`` at a time. Parsing waits
+    for a free writer, so a large file never piles up in memory. Lines that
+    are not JSON or, with ``validate``, are not structurally valid workflows
+    are reported and skipped; the rest of the file is still imported.
+    Validation only rejects what n8n would: a workflow without a trigger,
+    with unconnected nodes or with parameters the generation schemas don't
+    expect is imported and listed under ``warnings``. With
+    ``dry_run`` nothing is written: the report only counts valid lines.
+    """
+
+    def __init__(self, mode: str = "create", concurrency: int = None, validate: bool = True, dry_run: bool = False):
+        if mode not in IMPORT_MODES:
+            raise ValueError(f"mode must be one of {IMPORT_MODES}")
+        self.mode = mode
+        self.concurrency = max(1, concurrency or settings.transfer_concurrency)
+        self.validate = validate
+        self.dry_run = dry_run
+
+    async def run(self, chunks) -> TransferReport:
+        report = TransferReport("import")
+        slots = asyncio.Semaphore(self.concurrency)
+        writes = set()
+
+        async def counted(chunks):
+            async for chunk in chunks:
+                report.bytes += len(chunk)
+                yield chunk
+
+        try:
+            async for line in aiter_ndjson_lines(counted(chunks)):
+                report.lines += 1
+                number = report.lines
+                try:
+                    workflow = json.loads(line)
+                except ValueError as e:
+                    report.invalid += 1
+                    report.error(number, f"Invalid JSON: {e}")
+                    continue
+                if self.validate:
+                    warnings = []
+                    errors = validate_workflow(workflow, warnings)
+                    if errors:
+                        report.invalid += 1
+                        report.error(number, "; ".join(errors), workflow)
+                        continue
+                    if warnings:
+                        report.warning(number, warnings, workflow)
+                elif not isinstance(workflow, dict):
+                    report.invalid += 1
+                    report.error(number, "Expected a workflow object")
+                    continue
+                report.valid += 1
+                if self.dry_run:
+                    continue
+                await slots.acquire()
+                task = asyncio.create_task(self._write(number, workflow, report))
+                task.add_done_callback(lambda task: slots.release())
+                writes.add(task)
+                task.add_done_callback(writes.discard)
+        except (TransferError, zlib.error) as e:
+            # Whatever was written before the bad part stays written; the report says where it stopped
+            logger.error(f"Import stopped after line {report.lines}: {e}")
+            report.aborted = f"After line {report.lines}: {e}"
+        finally:
+            if writes:
+                await asyncio.gather(*writes, return_exceptions=True)
+            report.finish()
+        logger.info(
+            f"Imported {report.created} created / {report.updated} updated workflows, "
+            f"{report.invalid} invalid, {report.failed} failed"
+        )
+        return report
+
+    async def _write(self, number: int, workflow: dict, report: TransferReport):
+        try:
+            workflow_id = workflow.get("id")
+            if self.mode == "upsert" and workflow_id:
+                result = await aupdate_workflow_in_n8n(str(workflow_id), workflow)
+                if result.get("success"):
+                    report.updated += 1
+                    return
+                if result.get("status_code") != 404:
+                    report.failed += 1
+                    report.error(number, f"Update failed: {result.get('message')}", workflow)
+                    return
+            result = await acreate_workflow(workflow)
+            if result.get("success"):
+                report.created += 1
+            else:
+                report.failed += 1
+                report.error(number, f"Create failed: {result.get('message')}", workflow)
+        except Exception as e:
+            logger.error(f"Importing workflow on line {number} failed: {e}")
+            report.failed += 1
+            report.error(number, str(e), workflow)
+
+
+# -- command line -------------------------------------------------------------
+
+async def _read_file(path: str):
+    with open(path, "rb") as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, READ_CHUNK_BYTES)
+            if not chunk:
+                return
+            yield chunk
+
+
+async def _export_to_file(path: str, page_size: int = None) -> dict:
+    report = TransferReport("export")
+    with open(path, "wb") as f:
+        async for chunk in aexport_workflows(report, page_size):
+            await asyncio.to_thread(f.write, chunk)
+    return report.as_dict()
+
+
+async def _cli(args) -> dict:
+    try:
+        if args.command == "export":
+            return await _export_to_file(args.output, args.page_size)
+        importer = WorkflowImporter(args.mode, args.concurrency, validate=not args.no_validate, dry_run=args.dry_run)
+        return (await importer.run(_read_file(args.input))).as_dict()
+    finally:
+        await close_n8n_client()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Export or import n8n workflows as gzip-compressed NDJSON.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write every workflow to a .ndjson.gz file")
+    export.add_argument("-o", "--output", default="workflows.ndjson.gz")
+    export.add_argument("--page-size", type=int, default=None, help="workflows per n8n list page (max 250)")
+    imports = commands.add_parser("import", help="create/update workflows from a .ndjson(.gz) file")
+    imports.add_argument("input")
+    imports.add_argument("--mode", choices=IMPORT_MODES, default="create")
+    imports.add_argument("--concurrency", type=int, default=None)
+    imports.add_argument("--no-validate", action="store_true", help="skip the workflow validator")
+    imports.add_argument("--dry-run", action="store_true", help="parse and validate only")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(_cli(args))
+    print(json.dumps(report, indent=2))
+    return 0 if report["success"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+# app/services/workflow_update.py
+
+import logging
+
+from app.services.langchain_service import UsageCallback, ainvoke_llm
+from app.services.pipeline_stats import StageTimings
+from app.services.prompt_registry import prompt_registry
+from app.services.workflow_repair import repair_workflow
+from app.utils.json_patch import PatchError, apply_json_patch, apply_patch
+from app.utils.json_validator import extract_json_from_response
+from app.utils.workflow_codec import decode_workflow, encode_for_prompt, encode_workflow
+from app.utils.workflow_validator import error_key, validate_workflow
+
+logger = logging.getLogger(__name__)
+
+
+class WorkflowUpdateError(Exception):
+    """The model's answer could not be turned into a valid workflow."""
+
+
+def _follow_node_changes(encoded: dict, before: dict, renamed: dict):
+    """
+    After a node operation, carry renames over to the edge list and drop
+    edges of removed nodes. Nodes are tracked by object identity, which
+    in-place patching preserves; ``renamed`` maps current names back to the
+    names the nodes had in the original workflow.
+    """
+    current = {id(node): node.get("n") for node in encoded.get("nodes", []) if isinstance(node, dict)}
+    renames = {name: current[key] for key, name in before.items() if key in current and current[key] != name}
+    removed = {name for key, name in before.items() if key not in current} - set(current.values())
+    for old, new in renames.items():
+        renamed[new] = renamed.pop(old, old)
+    if not renames and not removed:
+        return
+    edges = []
+    for edge in encoded.get("edges", []):
+        if isinstance(edge, list) and len(edge) >= 2:
+            if edge[0] in removed or edge[1] in removed:
+                continue
+            edge = [renames.get(edge[0], edge[0]), renames.get(edge[1], edge[1])] + edge[2:]
+        edges.append(edge)
+    encoded["edges"] = edges
+
+
+def _check_encoded(encoded):
+    """Raise PatchError unless the patched document still has the shape decode_workflow() expects."""
+    if not isinstance(encoded, dict):
+        raise PatchError("the patched workflow is not an object")
+    if not isinstance(encoded.get("nodes"), list):
+        raise PatchError('"nodes" must be a list of nodes')
+    edges = encoded.get("edges", [])
+    if not isinstance(edges, list):
+        raise PatchError('"edges" must be a list of edges')
+    for edge in edges:
+        if not isinstance(edge, list) or len(edge) < 2 or not all(isinstance(name, str) for name in edge[:2]):
+            raise PatchError(f"edge {edge!r} must start with the source and target node names")
+        if any(index.__class__ is not int or index < 0 for index in edge[2:4]):
+            raise PatchError(f"edge {edge!r}: output and input indices must be non-negative integers")
+        if len(edge) > 4 and not isinstance(edge[4], str):
+            raise PatchError(f"edge {edge!r}: the connection type must be a string")
+
+
+def apply_update_patch(current: dict, patch) -> dict:
+    """
+    Apply the model's patch to the encoded form of ``current`` and decode the
+    result back into a full workflow.
+
+    Operations are applied one at a time and node operations are followed
+    up immediately, so later operations in the same patch can already use a
+    node's new name, and renamed nodes keep their id, position and
+    credentials. A patch that leaves ``nodes`` or ``edges`` malformed raises
+    PatchError like one that does not apply.
+    """
+    encoded = encode_workflow(current)
+    renamed = {}
+    if isinstance(patch, list):
+        for operation in patch:
+            touches_nodes = isinstance(operation, dict) and str(operation.get("path", "")).startswith("/nodes")
+            before = {id(node): node.get("n") for node in encoded["nodes"] if isinstance(node, dict)}
+            encoded = apply_json_patch(encoded, [operation], in_place=True)
+            _check_encoded(encoded)
+            if touches_nodes:
+                _follow_node_changes(encoded, before, renamed)
+    else:
+        encoded = apply_patch(encoded, patch)
+        _check_encoded(encoded)
+    return decode_workflow(encoded, current, renamed)
+
+
+def _update_messages(template, instruction: str, workflow: dict, history: list = None) -> list:
+    # Workflow before instruction: retries and follow-up edits of the same workflow share it as a cached prefix
+    document = encode_for_prompt(workflow)
+    return template.messages(f"Workflow:\n{document}\n\nInstruction: {instruction}", history)
+
+
+async def update_with_patch(current: dict, instruction: str, timings: StageTimings, history: list = None) -> dict:
+    """
+    Apply ``instruction`` to ``current`` by asking the model for a JSON Patch
+    against its compact encoding (app.utils.workflow_codec). The result is reconciled, validated and, if the
+    edit introduced errors, run through the repair loop; raises
+    WorkflowUpdateError if no valid workflow comes out. ``history`` holds
+    earlier turns of the conversation as chat messages.
+    """
+    usage = UsageCallback()
+    with timings.stage("llm"):
+        try:
+            template = prompt_registry.get("update_patch")
+            response = await ainvoke_llm(_update_messages(template, instruction, current, history), usage=usage,
+                                         template=template)
+        finally:
+            timings.add_usage("llm", usage.prompt_tokens, usage.completion_tokens)
+    with timings.stage("apply"):
+        answer = extract_json_from_response(response)
+        if not isinstance(answer, dict):
+            raise WorkflowUpdateError("Model response did not contain a JSON object")
+        try:
+            if "patch" in answer:
+                updated = apply_update_patch(current, answer["patch"])
+            elif "nodes" in answer:
+                logger.warning("Model returned a full workflow instead of a patch; using it as-is")
+                _check_encoded(answer)
+                updated = decode_workflow(answer, current)
+            else:
+                raise PatchError('expected an object with a "patch" list')
+        except PatchError as e:
+            raise WorkflowUpdateError(f"Could not apply the model's patch: {e}") from e
+    with timings.stage("validate"):
+        # Only hold the edit to account for problems it introduced; compared by node name, as indices shift
+        existing = {error_key(error, current) for error in validate_workflow(current)}
+        errors = [error for error in validate_workflow(updated) if error_key(error, updated) not in existing]
+    if errors:
+        logger.info(f"Updated workflow has {len(errors)} new validation error(s); attempting repair")
+        repaired = await repair_workflow(updated, timings, tolerated=existing)
+        if repaired is None:
+            raise WorkflowUpdateError("; ".join(errors))
+        updated = repaired
+    return updated
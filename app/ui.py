@@ -1,10 +1,10 @@
 import streamlit as st
 import requests
 from config import settings
-from dotenv import load_dotenv
-load_dotenv()
+import copy
 import json
 import logging
+import uuid
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -29,6 +29,63 @@ view_all = st.sidebar.button("Your Workflows")
 
 BASE_URL = "http://localhost:8000"
 
+
+def iter_sse(response):
+    """Yield (event, data) pairs from a streaming Server-Sent Events response."""
+    event, data_lines = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+
+
+def trace_note(response):
+    """" (trace <id>)" for error messages, so a failure can be looked up under /debug/traces/<id>."""
+    trace_id = response.headers.get("X-Trace-Id")
+    return f" (trace {trace_id})" if trace_id else ""
+
+
+def stream_description(prompt, placeholder, workflow=None, conversation_id=None):
+    """Stream /describe-workflow/stream into ``placeholder`` and return the final text (None on HTTP error)."""
+    text = ""
+    payload = {"prompt": prompt, "conversation_id": conversation_id}
+    sent = st.session_state.chat_workflow_sent
+    if workflow:
+        # The API keeps the workflow with the conversation: send it once (or when it changes), then only its id
+        if sent and sent["conversation_id"] == conversation_id and sent["workflow"] == workflow:
+            payload["workflow_ref"] = sent["ref"]
+        else:
+            payload["workflow"] = workflow
+    with requests.post(f"{BASE_URL}/describe-workflow/stream", json=payload, stream=True) as response:
+        logger.info(f"Streaming request sent to {BASE_URL}/describe-workflow/stream")
+        if response.status_code == 409 and "workflow_ref" in payload:
+            # The API no longer has the conversation (idle, or restarted without SQLite); send the workflow again
+            logger.info("Workflow reference unknown to the API, resending the workflow")
+            st.session_state.chat_workflow_sent = None
+            return stream_description(prompt, placeholder, workflow, conversation_id)
+        if response.status_code != 200:
+            logger.error(f"API request failed with status code: {response.status_code}")
+            return None
+        for event, data in iter_sse(response):
+            if event == "token":
+                text += data["text"]
+                placeholder.markdown(f"**AI:** {text}▌")
+            elif event == "error":
+                text = data["error"]
+            elif event == "done" and data.get("workflow_ref"):
+                st.session_state.chat_workflow_sent = {
+                    "conversation_id": conversation_id, "workflow": copy.deepcopy(workflow), "ref": data["workflow_ref"],
+                }
+    placeholder.markdown(f"**AI:** {text}")
+    return text
+
 # Session State for selected workflow
 if "selected_workflow" not in st.session_state:
     st.session_state.selected_workflow = None
@@ -44,6 +101,14 @@ if "chat_messages" not in st.session_state:
     st.session_state.chat_messages = []
 if "create_chat_messages" not in st.session_state:
     st.session_state.create_chat_messages = []
+# The workflow last sent to the describe chat and the id the API gave it
+if "chat_workflow_sent" not in st.session_state:
+    st.session_state.chat_workflow_sent = None
+# The API keeps each chat's history under its conversation id
+if "chat_conversation_id" not in st.session_state:
+    st.session_state.chat_conversation_id = str(uuid.uuid4())
+if "create_conversation_id" not in st.session_state:
+    st.session_state.create_conversation_id = str(uuid.uuid4())
 
 # Create New Workflow
 if create_new:
@@ -93,19 +158,29 @@ if st.session_state.show_create:
             is_workflow_request = any(keyword in prompt.lower() for keyword in workflow_keywords)
             
             if is_workflow_request:
-                # Try to generate workflow
-                with st.spinner("Generating workflow..."):
-                    response = requests.post(
-                        f"{BASE_URL}/generate-workflow",
-                        json={"prompt": prompt}
-                    )
-                    logger.info(f"API request sent to {BASE_URL}/generate-workflow")
+                # Try to generate workflow, rendering nodes as the model finishes each one
+                placeholder = st.empty()
+                placeholder.markdown("**AI:** Generating workflow...")
+                node_names = []
+                data = None
+                with requests.post(f"{BASE_URL}/generate-workflow/stream", json={"prompt": prompt, "conversation_id": st.session_state.create_conversation_id}, stream=True) as response:
+                    logger.info(f"Streaming request sent to {BASE_URL}/generate-workflow/stream")
                     if response.status_code == 200:
-                        data = response.json()
+                        for event, payload in iter_sse(response):
+                            if event == "node":
+                                node_names.append(payload.get("name", "Unnamed node"))
+                                steps = "\n".join(f"{i + 1}. {name}" for i, name in enumerate(node_names))
+                                placeholder.markdown(f"**AI:** Generating workflow...\n\n{steps}")
+                            elif event == "workflow":
+                                data = payload
+                            elif event == "error":
+                                data = {"name": "Error Workflow", "error": payload["error"]}
+                    if response.status_code == 200:
+                        data = data or {"name": "Error Workflow", "error": "Stream ended without a workflow"}
                         logger.info(f"API response received: {data}")
                         if data.get("error") or data.get("name") == "Error Workflow":
                             logger.error(f"Error received from API: {data.get('error', 'Unknown error')}")
-                            ai_response = f"Error: {data.get('error', 'Could not generate workflow')}"
+                            ai_response = f"Error: {data.get('error', 'Could not generate workflow')}{trace_note(response)}"
                             st.session_state.create_chat_messages.append({"role": "ai", "content": ai_response})
                             st.rerun()
                         else:
@@ -115,31 +190,16 @@ if st.session_state.show_create:
                             st.rerun()
                     else:
                         logger.error(f"API request failed with status code: {response.status_code}")
-                        ai_response = f"API Error: {response.status_code}"
+                        ai_response = f"API Error: {response.status_code}{trace_note(response)}"
                         st.session_state.create_chat_messages.append({"role": "ai", "content": ai_response})
                         st.rerun()
             else:
                 # Handle as generic message
-                with st.spinner("Processing your message..."):
-                    response = requests.post(
-                        f"{BASE_URL}/describe-workflow",
-                        json={"prompt": prompt}
-                    )
-                    logger.info(f"API request sent to {BASE_URL}/describe-workflow")
-                    if response.status_code == 200:
-                        data = response.json()
-                        logger.info(f"API response received: {data}")
-                        ai_response = data.get("description", "I'm here to help you with n8n workflows!")
-                        st.session_state.create_chat_messages.append({"role": "ai", "content": ai_response})
-                        st.rerun()
-                    else:
-                        logger.error(f"API request failed with status code: {response.status_code}")
-                        if response.status_code == 500:
-                            ai_response = "Sorry, I'm experiencing high demand right now. Please try again in a moment."
-                        else:
-                            ai_response = "I'm here to help you with n8n workflows! Try asking me to create a workflow."
-                        st.session_state.create_chat_messages.append({"role": "ai", "content": ai_response})
-                        st.rerun()
+                ai_response = stream_description(prompt, st.empty())
+                if ai_response is None:
+                    ai_response = "I'm here to help you with n8n workflows! Try asking me to create a workflow."
+                st.session_state.create_chat_messages.append({"role": "ai", "content": ai_response or "I'm here to help you with n8n workflows!"})
+                st.rerun()
         elif submitted and not prompt.strip():
             st.warning("Please enter a prompt to generate workflow.")
 
@@ -149,7 +209,8 @@ if st.session_state.show_workflows:
         st.subheader("Your Workflows")
         with st.spinner("Fetching workflows..."):
             logger.info("Fetching workflows from API...")
-            response = requests.get(f"{BASE_URL}/get_all_workflows")
+            # Summaries are enough to render the buttons; the full graph is fetched on selection
+            response = requests.get(f"{BASE_URL}/get_all_workflows", params={"summary": "true"})
             logger.info(f"API response status: {response.status_code}")
             
             if response.status_code == 200:
@@ -174,9 +235,19 @@ if st.session_state.show_workflows:
                             
                             if st.button(wf_name, key=f"wf_{i}"):
                                 logger.info(f"Selected workflow: {wf_name}")
+                                if isinstance(wf, dict) and wf.get("id"):
+                                    detail = requests.get(
+                                        f"{BASE_URL}/workflows/{wf['id']}",
+                                        params={"updated_at": wf.get("updatedAt")}
+                                    )
+                                    if detail.status_code == 200 and detail.json().get("success"):
+                                        wf = detail.json()["data"]
+                                    else:
+                                        logger.error(f"Could not fetch workflow {wf['id']}: {detail.status_code}")
                                 st.session_state.selected_workflow = wf
                                 st.session_state.show_chat = True
                                 st.session_state.chat_messages = []  # Clear chat history for new workflow
+                                st.session_state.chat_conversation_id = str(uuid.uuid4())
                                 st.rerun()
                     else:
                         logger.warning("No workflows found in response")
@@ -256,7 +327,7 @@ if st.session_state.show_chat and st.session_state.selected_workflow:
                         logger.info(f"Detected update request for workflow ID: {wf['id']}")
                         response = requests.put(
                             f"{BASE_URL}/workflows/{wf['id']}",
-                            json={"prompt": describe_prompt}
+                            json={"prompt": describe_prompt, "conversation_id": st.session_state.chat_conversation_id}
                         )
                         logger.info(f"Update response status: {response.status_code}")
                         if response.status_code == 200:
@@ -264,28 +335,22 @@ if st.session_state.show_chat and st.session_state.selected_workflow:
                             st.session_state.chat_messages.append({"role": "ai", "content": ai_response})
                             st.rerun()
                         else:
-                            error_msg = f"Failed to update workflow. Status code: {response.status_code}"
+                            error_msg = f"Failed to update workflow. Status code: {response.status_code}{trace_note(response)}"
                             st.session_state.chat_messages.append({"role": "ai", "content": error_msg})
                             st.rerun()
                 else:
                     # Handle as description/analysis request
-                    with st.spinner("Processing your request..."):
-                        logger.info("Sending request to describe API")
-                        full_prompt = f"{describe_prompt}. Here's the workflow context: {json.dumps(wf, indent=2)}"
-                        response = requests.post(
-                            f"{BASE_URL}/describe-workflow",
-                            json={"prompt": full_prompt}
-                        )
-                        logger.info(f"Response status: {response.status_code}")
-                        if response.status_code == 200:
-                            data = response.json()
-                            ai_response = data.get("description", "No response available")
-                            st.session_state.chat_messages.append({"role": "ai", "content": ai_response})
-                            st.rerun()
-                        else:
-                            error_msg = "Failed to process request."
-                            st.session_state.chat_messages.append({"role": "ai", "content": error_msg})
-                            st.rerun()
+                    logger.info("Sending request to describe API")
+                    conversation_id = st.session_state.chat_conversation_id
+                    if isinstance(wf, dict):
+                        ai_response = stream_description(describe_prompt, st.empty(), workflow=wf, conversation_id=conversation_id)
+                    else:
+                        full_prompt = f"{describe_prompt}. Here's the workflow context: {json.dumps(wf)}"
+                        ai_response = stream_description(full_prompt, st.empty(), conversation_id=conversation_id)
+                    if ai_response is None:
+                        ai_response = "Failed to process request."
+                    st.session_state.chat_messages.append({"role": "ai", "content": ai_response or "No response available"})
+                    st.rerun()
         
         elif send_clicked and not describe_prompt.strip():
             st.warning("Please enter a message before sending.")
@@ -0,0 +1,56 @@
+# app/utils/json_patch.py
+
+import copy
+import logging
+
+import jsonpatch
+
+logger = logging.getLogger(__name__)
+
+
+class PatchError(ValueError):
+    """A patch from the model could not be applied."""
+
+
+MAX_ERROR_LENGTH = 200
+
+
+def apply_json_patch(document: dict, operations: list, in_place: bool = False) -> dict:
+    """
+    Apply an RFC 6902 JSON Patch and return the patched document.
+
+    Unless ``in_place`` is set the document itself is left untouched, so a
+    failed patch never leaves a half-applied workflow behind.
+    """
+    if not isinstance(operations, list):
+        raise PatchError("patch must be a list of operations")
+    try:
+        return jsonpatch.apply_patch(document, operations, in_place=in_place)
+    except (jsonpatch.JsonPatchException, jsonpatch.JsonPointerException, KeyError, IndexError, TypeError) as e:
+        # jsonpatch puts the whole target document in some messages
+        message = str(e)
+        if len(message) > MAX_ERROR_LENGTH:
+            message = message[:MAX_ERROR_LENGTH] + "..."
+        raise PatchError(message) from e
+
+
+def apply_merge_patch(document, patch):
+    """Apply an RFC 7386 JSON Merge Patch and return the merged copy."""
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+    result = copy.deepcopy(document) if isinstance(document, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
+
+
+def apply_patch(document: dict, patch) -> dict:
+    """Apply either patch flavour: a list is JSON Patch, an object is a merge patch."""
+    if isinstance(patch, list):
+        return apply_json_patch(document, patch)
+    if isinstance(patch, dict):
+        return apply_merge_patch(document, patch)
+    raise PatchError(f"unsupported patch type: {type(patch).__name__}")
@@ -0,0 +1,322 @@
+# app/utils/json_stream.py
+
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Outside a string the scanner only stops at brackets and at strings, and a
+# whole string (escapes included) is consumed by one regex match, so the
+# per-character work stays in C. An empty group 1 means the string runs past
+# the end of the chunk.
+_TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*("?)|[{}\[\]]')
+_STRING_TAIL = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*("?)')
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class StreamingJSONExtractor:
+    """
+    Push-based extractor for the first top-level JSON object in an LLM stream.
+
+    Feed it text chunks as they arrive; ``feed`` returns the events completed
+    by that chunk:
+
+    - ``("node", dict)`` for every object in the top-level ``nodes`` array,
+      as soon as its closing brace arrives
+    - ``("object", dict)`` once the top-level object itself closes
+
+    Markdown fences and prose are skipped: scanning starts at the first ``{``,
+    and a candidate that closes but does not parse (prose like "use {name}
+    here") is dropped and scanning resumes just after its opening brace.
+    Brace depth is tracked with string and escape awareness, so braces inside
+    parameter values (expressions like ``{{ $json.id }}``) do not confuse it.
+    Each chunk is scanned once; text is only joined when an object closes.
+
+    With ``repair=True`` a closed candidate with trailing commas is fixed up
+    before being given up on, and ``close()`` salvages a truncated object at
+    the end of the stream by cutting back to the last complete value and
+    closing the open containers.
+    """
+
+    def __init__(self, repair: bool = False):
+        self.repair = repair
+        self.result = None
+        self._reset()
+
+    def _reset(self):
+        self._parts = []  # chunks of the current candidate, starting at its "{"
+        self._stack = []
+        self._in_string = False
+        self._escape_pending = False
+        self._key_parts = None  # a string at depth 1 (a key) split across chunks
+        self._last_key = None
+        self._nodes_depth = None
+        self._node_parts = None
+
+    @property
+    def done(self) -> bool:
+        return self.result is not None
+
+    def feed(self, chunk: str) -> list:
+        events = []
+        while chunk and not self.done:
+            if not self._parts:
+                start = chunk.find("{")
+                if start == -1:
+                    break
+                chunk = chunk[start:]
+            self._parts.append(chunk)
+            if self._scan(chunk, events) != "discard":
+                break
+            # The candidate was prose; rescan everything after its opening brace
+            text = "".join(self._parts)
+            self._reset()
+            chunk = text[1:]
+        return events
+
+    def close(self):
+        """Signal end of stream; returns the extracted object (repaired if allowed) or None."""
+        if self.result is not None or not self._stack:
+            return self.result
+        unfinished = "".join(self._parts)
+        self.result = _object_after_unclosed_prose(unfinished)
+        if self.result is None and self.repair:
+            repaired = repair_truncated_json(unfinished)
+            if isinstance(repaired, dict):
+                logger.info("Repaired truncated JSON object at end of stream")
+                self.result = repaired
+        return self.result
+
+    def _scan(self, chunk: str, events: list) -> str:
+        stack = self._stack
+        length = len(chunk)
+        pos = 0
+        node_from = 0 if self._node_parts is not None else None
+
+        if self._in_string:
+            if self._escape_pending:
+                self._escape_pending = False
+                pos = 1
+            match = _STRING_TAIL.match(chunk, pos)
+            pos = match.end()
+            if not match.group(1):
+                self._escape_pending = pos < length
+                if self._key_parts is not None:
+                    self._key_parts.append(chunk)
+                if node_from is not None:
+                    self._node_parts.append(chunk)
+                return "more"
+            self._in_string = False
+            if self._key_parts is not None:
+                self._key_parts.append(chunk[:pos - 1])
+                self._last_key = "".join(self._key_parts)
+                self._key_parts = None
+
+        while True:
+            match = _TOKEN.search(chunk, pos)
+            if match is None:
+                break
+            start = match.start()
+            pos = match.end()
+            char = chunk[start]
+            if char == '"':
+                if match.group(1):
+                    if len(stack) == 1:
+                        self._last_key = chunk[start + 1:pos - 1]
+                    continue
+                # The string continues in the next chunk
+                self._in_string = True
+                self._escape_pending = pos < length
+                if len(stack) == 1:
+                    self._key_parts = [chunk[start + 1:]]
+                break
+            if char == "{" or char == "[":
+                stack.append(char)
+                if char == "[" and len(stack) == 2 and self._last_key == "nodes":
+                    self._nodes_depth = 2
+                elif char == "{" and self._nodes_depth is not None and len(stack) == self._nodes_depth + 1:
+                    self._node_parts = []
+                    node_from = start
+                continue
+            if not stack or _CLOSERS[stack[-1]] != char:
+                # Mismatched bracket: this candidate was prose, not JSON
+                return "discard"
+            stack.pop()
+            if node_from is not None and char == "}" and len(stack) == self._nodes_depth:
+                node = self._loads("".join(self._node_parts) + chunk[node_from:pos])
+                self._node_parts = None
+                node_from = None
+                if isinstance(node, dict):
+                    events.append(("node", node))
+            elif char == "]" and self._nodes_depth is not None and len(stack) == self._nodes_depth - 1:
+                self._nodes_depth = None
+            if not stack:
+                text = "".join(self._parts[:-1]) + chunk[:pos]
+                result = self._loads(text)
+                if not isinstance(result, dict):
+                    return "discard"
+                self.result = result
+                self._parts = [text]
+                events.append(("object", result))
+                return "done"
+
+        if node_from is not None:
+            self._node_parts.append(chunk[node_from:])
+        return "more"
+
+    def _loads(self, fragment: str):
+        try:
+            return json.loads(fragment)
+        except json.JSONDecodeError as e:
+            if self.repair:
+                try:
+                    return json.loads(strip_trailing_commas(fragment))
+                except json.JSONDecodeError:
+                    pass
+            logger.debug(f"Streamed JSON candidate did not parse: {e}")
+            return None
+
+
+_JSON_KEY = re.compile(r'"\s*:')
+
+
+def _object_after_unclosed_prose(text: str):
+    """
+    Handle a stray ``{`` in leading prose ("use { carefully: ...") that never
+    closes and so swallows the real object. Later objects are only considered
+    while the skipped text has no JSON keys in it, so a genuinely truncated
+    object never yields one of its own nested values.
+    """
+    start = text.find("{", 1)
+    while start != -1 and not _JSON_KEY.search(text, 0, start):
+        extractor = StreamingJSONExtractor()
+        extractor.feed(text[start:])
+        if extractor.result is not None:
+            return extractor.result
+        start = text.find("{", start + 1)
+    return None
+
+
+_DECODER = json.JSONDecoder()
+
+
+def extract_first_object(text: str, repair: bool = False):
+    """
+    Return the first top-level JSON object in a complete response.
+
+    The common case (one well-formed object, possibly fenced or surrounded by
+    prose) is decoded directly by the C scanner via ``raw_decode``. Anything
+    else falls back to the streaming extractor, which can also repair.
+    """
+    start = text.find("{")
+    first = start
+    while start != -1:
+        try:
+            value, _ = _DECODER.raw_decode(text, start)
+            if isinstance(value, dict):
+                return value
+        except json.JSONDecodeError:
+            pass
+        next_start = text.find("{", start + 1)
+        # Past the first key we are inside the object itself, not in prose
+        if next_start == -1 or _JSON_KEY.search(text, first, next_start):
+            break
+        start = next_start
+    extractor = StreamingJSONExtractor(repair=repair)
+    extractor.feed(text)
+    return extractor.close()
+
+
+def _scan_structure(text: str):
+    """
+    Walk ``text`` once, string-aware, returning (cut_points, in_string, stack).
+
+    A cut point is an index where the text could be truncated and still end
+    on a complete value, together with the container stack open at that index.
+    ``in_string`` and ``stack`` describe the state at the end of the text.
+    """
+    cut_points = []
+    stack = []
+    in_string = False
+    escape = False
+    for index, char in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append(char)
+            cut_points.append((index + 1, tuple(stack)))
+        elif char in "}]":
+            if stack:
+                stack.pop()
+            cut_points.append((index + 1, tuple(stack)))
+        elif char == ",":
+            cut_points.append((index, tuple(stack)))
+    return cut_points, in_string, tuple(stack)
+
+
+def strip_trailing_commas(text: str) -> str:
+    """Drop commas that directly precede a closing bracket, ignoring string contents."""
+    out = []
+    in_string = False
+    escape = False
+    pending_comma = None
+    for char in text:
+        if in_string:
+            out.append(char)
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+        if pending_comma is not None:
+            if char.isspace():
+                pending_comma.append(char)
+                continue
+            if char not in "}]":
+                out.extend(pending_comma)
+            else:
+                out.extend(pending_comma[1:])
+            pending_comma = None
+        if char == ",":
+            pending_comma = [char]
+            continue
+        if char == '"':
+            in_string = True
+        out.append(char)
+    if pending_comma is not None:
+        out.extend(pending_comma)
+    return "".join(out)
+
+
+def repair_truncated_json(text: str, max_attempts: int = 64):
+    """
+    Best-effort completion of a JSON document cut off mid-stream.
+
+    Tries closing the open string and containers as-is first, then cuts back
+    to successively earlier complete values (at most ``max_attempts`` of
+    them). Returns the parsed value or None.
+    """
+    cut_points, in_string, open_stack = _scan_structure(text)
+    attempts = [(text + ('"' if in_string else ""), open_stack)]
+    attempts.extend((text[:cut], stack) for cut, stack in reversed(cut_points[-max_attempts:]))
+    for fragment, stack in attempts:
+        fragment = fragment.rstrip()
+        if fragment.endswith("\\"):
+            continue
+        candidate = fragment.rstrip(",") + "".join(_CLOSERS[c] for c in reversed(stack))
+        try:
+            return json.loads(strip_trailing_commas(candidate))
+        except json.JSONDecodeError:
+            continue
+    return None
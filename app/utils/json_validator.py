@@ -1,43 +1,34 @@
-import json
 import logging
+from app.utils.json_stream import extract_first_object
+from app.utils.workflow_validator import validate_workflow
 
 logger = logging.getLogger(__name__)
 
-def extract_json_from_response(response_text):
+def extract_json_from_response(response_text, repair=True):
     """
     Extract JSON from LLM response text
+
+    Returns the first complete top-level JSON object, skipping markdown
+    fences and surrounding prose; with ``repair`` trailing commas and
+    truncated output are patched up where possible.
     """
-    print("====================")
-    print(response_text)
-    print("=====================")
-    print("Extracting JSON from response text")
-    logger.info(f"Extracting JSON from response text: {response_text}")
-    # Remove code block markers if present
-    response_text = response_text.replace("```json", "").replace("```", "")
-    # Find the first '{' and last '}' and extract the substring
-    start = response_text.find('{')
-    end = response_text.rfind('}')
-    if start != -1 and end != -1 and end > start:
-        json_str = response_text[start:end+1]
-        try:
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON decode error: {e} for string: {json_str}")
-    else:
-        logger.warning("No JSON-like structure found in response text.")
-    return None
+    if not response_text:
+        logger.warning("Empty response text; nothing to extract.")
+        return None
+    result = extract_first_object(response_text, repair=repair)
+    if result is None:
+        logger.warning(f"No JSON object found in response text ({len(response_text)} chars).")
+    return result
 
 def validate_n8n_workflow(workflow_json):
     """
-    Basic validation for n8n workflow structure
+    Structural validation for n8n workflow JSON
+
+    Returns ``(is_valid, message)``; on failure the message lists the
+    problems found (see ``app.utils.workflow_validator``).
     """
-    logger.info(f"Validating workflow JSON: {workflow_json}")
-    required_fields = ["name", "nodes", "connections"]
-    for field in required_fields:
-        if field not in workflow_json:
-            return False, f"Missing required field: {field}"
-    if not isinstance(workflow_json["nodes"], list):
-        return False, "Nodes should be a list"
-    if not isinstance(workflow_json["connections"], dict):
-        return False, "Connections should be a dictionary"
-    return True, "Valid n8n workflow structure"
\ No newline at end of file
+    errors = validate_workflow(workflow_json)
+    if errors:
+        logger.info(f"Workflow failed validation with {len(errors)} error(s): {errors[0]}")
+        return False, "; ".join(errors)
+    return True, "Valid n8n workflow structure"
@@ -0,0 +1,195 @@
+# app/utils/structured_logging.py
+"""
+Logging for the request path: payloads are logged as truncated, hashed
+fields, and records are formatted and written by a background thread.
+
+- ``log_payload(value)`` wraps a response body, prompt or workflow for a log
+  call (``logger.info("LLM response: %s", log_payload(text))``). Nothing is
+  serialized unless the record is actually emitted, and then only a preview
+  of ``payload_max_chars`` characters plus the size and a SHA-1 prefix,
+  except for the ``payload_sample_rate`` share of payloads logged in full.
+  Structured values (dicts, lists) are only encoded as far as the preview
+  goes, so they get no size or hash unless they are logged in full.
+- ``setup_logging()`` puts a bounded queue in front of the real handler.
+  Request code only enqueues the record; the listener thread formats it
+  (text or one JSON object per line) and does the I/O. When the queue is
+  full, records are dropped and counted rather than blocking a request.
+
+No app imports, so the n8n client can use it from the Streamlit side too.
+"""
+import atexit
+import hashlib
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+
+PAYLOAD_MAX_CHARS = 256
+PAYLOAD_SAMPLE_RATE = 0.0
+
+# iterencode() of the pure-Python encoder yields as it goes, so a preview can stop early
+_encoder = json.JSONEncoder(separators=(",", ":"), default=str)
+
+_listener = None
+_handler = None
+_lock = threading.Lock()
+
+
+class Payload:
+    """A value for a log record, serialized (and truncated) only when the record is formatted."""
+
+    __slots__ = ("value", "full")
+
+    def __init__(self, value, full: bool = False):
+        self.value = value
+        self.full = full
+
+    def text(self) -> str:
+        value = self.value
+        if isinstance(value, bytes):
+            return value.decode("utf-8", "replace")
+        if isinstance(value, str):
+            return value
+        try:
+            return _encoder.encode(value)
+        except (TypeError, ValueError):
+            return repr(value)
+
+    def _preview(self) -> tuple:
+        """(first PAYLOAD_MAX_CHARS characters, whether there is more) of a structured value."""
+        parts = []
+        size = 0
+        try:
+            for chunk in _encoder.iterencode(self.value):
+                parts.append(chunk)
+                size += len(chunk)
+                if size > PAYLOAD_MAX_CHARS:
+                    return "".join(parts)[:PAYLOAD_MAX_CHARS], True
+        except (TypeError, ValueError):
+            return repr(self.value)[:PAYLOAD_MAX_CHARS], True
+        return "".join(parts), False
+
+    def as_dict(self) -> dict:
+        if not self.full and not isinstance(self.value, (str, bytes)):
+            preview, truncated = self._preview()
+            if truncated:
+                return {"type": type(self.value).__name__, "preview": preview}
+        text = self.text()
+        field = {"chars": len(text), "sha1": hashlib.sha1(text.encode("utf-8", "replace")).hexdigest()[:12]}
+        if self.full or len(text) <= PAYLOAD_MAX_CHARS:
+            field["body"] = text
+        else:
+            field["preview"] = text[:PAYLOAD_MAX_CHARS]
+        return field
+
+    def __str__(self) -> str:
+        field = self.as_dict()
+        if "body" in field:
+            return field["body"]
+        if "chars" not in field:
+            return f"{field['preview']}... [{field['type']}, truncated]"
+        return f"{field['preview']}... [{field['chars']} chars, sha1 {field['sha1']}]"
+
+
+def log_payload(value) -> Payload:
+    """Wrap ``value`` for a log call; a ``PAYLOAD_SAMPLE_RATE`` share of them is logged in full."""
+    return Payload(value, full=PAYLOAD_SAMPLE_RATE > 0 and random.random() < PAYLOAD_SAMPLE_RATE)
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record; Payload arguments also appear as structured ``payloads``."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        args = record.args if isinstance(record.args, tuple) else ()
+        payloads = [arg.as_dict() for arg in args if isinstance(arg, Payload)]
+        if payloads:
+            entry["payloads"] = payloads
+        if record.exc_text or record.exc_info:
+            entry["exception"] = record.exc_text or self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener thread (the stock
+    one formats in the caller) and drops records when the queue is full.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            # Tracebacks hold frames that may change before the listener gets to them; render them now
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(level: str = "INFO", fmt: str = "text", queue_size: int = 10000,
+                  payload_max_chars: int = None, payload_sample_rate: float = None, stream=None):
+    """
+    Route the root logger through a DeferredQueueHandler to a stream
+    handler on a listener thread. Idempotent; stop_logging() flushes it.
+    """
+    global _listener, _handler, PAYLOAD_MAX_CHARS, PAYLOAD_SAMPLE_RATE
+    if payload_max_chars is not None:
+        PAYLOAD_MAX_CHARS = payload_max_chars
+    if payload_sample_rate is not None:
+        PAYLOAD_SAMPLE_RATE = payload_sample_rate
+    root = logging.getLogger()
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    with _lock:
+        if _listener is not None:
+            return _handler
+        output = logging.StreamHandler(stream or sys.stderr)
+        if fmt == "json":
+            output.setFormatter(JSONFormatter())
+        else:
+            output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        _handler = DeferredQueueHandler(queue.Queue(maxsize=queue_size))
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_handler)
+        _listener = logging.handlers.QueueListener(_handler.queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+        return _handler
+
+
+def stop_logging():
+    """Write out whatever is still queued and stop the listener thread."""
+    global _listener
+    with _lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+
+def logging_stats() -> dict:
+    if _handler is None:
+        return {"queued": 0, "dropped": 0, "payload_max_chars": PAYLOAD_MAX_CHARS,
+                "payload_sample_rate": PAYLOAD_SAMPLE_RATE}
+    return {
+        "queued": _handler.queue.qsize(),
+        "dropped": _handler.dropped,
+        "payload_max_chars": PAYLOAD_MAX_CHARS,
+        "payload_sample_rate": PAYLOAD_SAMPLE_RATE,
+    }
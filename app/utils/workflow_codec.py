@@ -0,0 +1,233 @@
+# app/utils/workflow_codec.py
+"""
+Compact, reversible encoding of n8n workflows for prompts.
+
+n8n's own JSON spends most of its tokens on things the model does not need
+to read or write: indentation, canvas positions, node and webhook ids,
+credential references, instance metadata, and a deeply nested
+``connections`` object that repeats ``"type": "main", "index": 0`` for
+every edge. The encoded form keeps only what describes behaviour:
+
+    {
+      "name": "Order alerts",
+      "types": ["scheduleTrigger", "httpRequest", "slack"],
+      "nodes": [
+        {"n": "Schedule Trigger", "t": 0, "v": 1.1, "p": {...}},
+        {"n": "Fetch Order", "t": 1, "v": 4, "p": {...}},
+        ...
+      ],
+      "edges": [["Schedule Trigger", "Fetch Order"], ["If", "Slack", 1], ...]
+    }
+
+- ``types`` interns node types; ``n8n-nodes-base.`` is implied for names
+  without a dot, and ``t`` may also be a full type string.
+- ``v`` (typeVersion) is omitted when it is 1, ``p`` when empty, and empty
+  objects/lists/strings inside parameters are dropped.
+- An edge is ``[source, target]``, plus the source output index when not 0,
+  plus target input index and connection type when not ``0, "main"``.
+
+``decode_workflow`` turns an encoded workflow (or a plain n8n one) back into
+n8n JSON. Given the original workflow it restores everything that was
+stripped, matching nodes by name (or by their previous name via
+``renamed``); new nodes get a fresh id and a position.
+"""
+import json
+import uuid
+
+BASE_PREFIX = "n8n-nodes-base."
+
+# Node fields the encoding spells out; all others (id, position, credentials, webhookId, ...) are noise
+ENCODED_NODE_FIELDS = {"name": "n", "type": "t", "typeVersion": "v", "parameters": "p", "disabled": "off", "notes": "notes"}
+NODE_SPACING = 220
+
+
+def _short_type(node_type: str) -> str:
+    return node_type[len(BASE_PREFIX):] if node_type.startswith(BASE_PREFIX) else node_type
+
+
+def _full_type(node_type: str) -> str:
+    return node_type if "." in node_type else BASE_PREFIX + node_type
+
+
+def _is_empty(value) -> bool:
+    return value == {} or value == [] or value == ""
+
+
+def _strip_empty(value):
+    if isinstance(value, dict):
+        stripped = {}
+        for key, item in value.items():
+            item = _strip_empty(item)
+            if not _is_empty(item):
+                stripped[key] = item
+        return stripped
+    if isinstance(value, list):
+        return [_strip_empty(item) for item in value]
+    return value
+
+
+def _restore_empty(encoded, original):
+    """Put back the empty values _strip_empty dropped, wherever the structure still matches."""
+    if isinstance(encoded, dict) and isinstance(original, dict):
+        restored = dict(encoded)
+        for key, item in original.items():
+            if key in encoded:
+                restored[key] = _restore_empty(encoded[key], item)
+            elif _is_empty(item) or _is_empty(_strip_empty(item)):
+                restored[key] = item
+        return restored
+    if isinstance(encoded, list) and isinstance(original, list) and len(encoded) == len(original):
+        return [_restore_empty(item, before) for item, before in zip(encoded, original)]
+    return encoded
+
+
+def encode_edges(connections: dict) -> list:
+    edges = []
+    for source, outputs in (connections or {}).items():
+        if not isinstance(outputs, dict):
+            continue
+        for connection_type, branches in outputs.items():
+            for output_index, targets in enumerate(branches or []):
+                for target in targets or []:
+                    if not isinstance(target, dict):
+                        continue
+                    edge = [source, target.get("node")]
+                    input_index = target.get("index", 0)
+                    target_type = target.get("type", connection_type)
+                    if input_index != 0 or target_type != "main" or connection_type != "main":
+                        edge.extend([output_index, input_index, target_type])
+                    elif output_index:
+                        edge.append(output_index)
+                    edges.append(edge)
+    return edges
+
+
+def decode_edges(edges: list) -> dict:
+    connections = {}
+    for edge in edges or []:
+        if not isinstance(edge, (list, tuple)) or len(edge) < 2:
+            continue
+        source, target = edge[0], edge[1]
+        output_index = edge[2] if len(edge) > 2 else 0
+        input_index = edge[3] if len(edge) > 3 else 0
+        connection_type = edge[4] if len(edge) > 4 else "main"
+        branches = connections.setdefault(source, {}).setdefault(connection_type, [])
+        while len(branches) <= output_index:
+            branches.append([])
+        branches[output_index].append({"node": target, "type": connection_type, "index": input_index})
+    return connections
+
+
+def encode_workflow(workflow: dict) -> dict:
+    """Encode an n8n workflow; see the module docstring for the format."""
+    types = []
+    type_index = {}
+    nodes = []
+    for node in workflow.get("nodes", []):
+        if not isinstance(node, dict):
+            continue
+        encoded = {"n": node.get("name")}
+        node_type = node.get("type")
+        if isinstance(node_type, str):
+            short = _short_type(node_type)
+            if short not in type_index:
+                type_index[short] = len(types)
+                types.append(short)
+            encoded["t"] = type_index[short]
+        version = node.get("typeVersion", 1)
+        if version != 1:
+            encoded["v"] = version
+        parameters = _strip_empty(node.get("parameters") or {})
+        if parameters:
+            encoded["p"] = parameters
+        if node.get("disabled"):
+            encoded["off"] = True
+        if node.get("notes"):
+            encoded["notes"] = node["notes"]
+        nodes.append(encoded)
+    return {
+        "name": workflow.get("name"),
+        "types": types,
+        "nodes": nodes,
+        "edges": encode_edges(workflow.get("connections")),
+    }
+
+
+def encode_for_prompt(workflow: dict) -> str:
+    """The encoded workflow as minified JSON, ready to paste into a prompt."""
+    return json.dumps(encode_workflow(workflow), separators=(",", ":"), ensure_ascii=False)
+
+
+def is_encoded(workflow: dict) -> bool:
+    return isinstance(workflow, dict) and ("edges" in workflow or "types" in workflow)
+
+
+def _decode_node(encoded: dict, types: list) -> dict:
+    node_type = encoded.get("t")
+    if isinstance(node_type, int) and 0 <= node_type < len(types):
+        node_type = types[node_type]
+    node = {
+        "name": encoded.get("n"),
+        "type": _full_type(node_type) if isinstance(node_type, str) else node_type,
+        "typeVersion": encoded.get("v", 1),
+        "parameters": encoded.get("p") or {},
+    }
+    if encoded.get("off"):
+        node["disabled"] = True
+    if encoded.get("notes"):
+        node["notes"] = encoded["notes"]
+    return node
+
+
+def decode_workflow(encoded: dict, original: dict = None, renamed: dict = None) -> dict:
+    """
+    Turn an encoded workflow back into n8n JSON.
+
+    With ``original``, stripped fields come back: workflow metadata, and per
+    node (matched by name, or by ``renamed[new_name] -> old_name``) its id,
+    position, credentials and any other field the encoding leaves out, plus
+    empty parameters. Nodes without a match are new and get an id and a
+    position to the right of the graph. A plain n8n workflow is returned
+    as-is (merged over ``original``'s metadata).
+    """
+    original = original or {}
+    renamed = renamed or {}
+    if not is_encoded(encoded):
+        nodes = [dict(node) for node in encoded.get("nodes", []) if isinstance(node, dict)]
+        connections = encoded.get("connections", {})
+    else:
+        types = encoded.get("types") or []
+        nodes = [_decode_node(node, types) for node in encoded.get("nodes", []) if isinstance(node, dict)]
+        connections = decode_edges(encoded.get("edges"))
+
+    original_nodes = {node.get("name"): node for node in original.get("nodes", []) if isinstance(node, dict)}
+    max_x = max(
+        (node["position"][0] for node in original_nodes.values()
+         if isinstance(node.get("position"), list) and node["position"]),
+        default=0,
+    )
+    for index, node in enumerate(nodes):
+        before = original_nodes.get(renamed.get(node.get("name"), node.get("name")))
+        if before is not None:
+            restored = {key: value for key, value in before.items() if key not in ENCODED_NODE_FIELDS}
+            for key in ("disabled", "notes"):
+                # Falsy values were dropped by the encoding
+                if key in before and key not in node and not before[key]:
+                    restored[key] = before[key]
+            restored.update(node)
+            restored["parameters"] = _restore_empty(node.get("parameters") or {}, before.get("parameters") or {})
+            nodes[index] = restored
+            continue
+        node.setdefault("id", str(uuid.uuid4()))
+        if "position" not in node:
+            max_x += NODE_SPACING
+            node["position"] = [max_x, 0]
+
+    # Everything but name/nodes/connections is instance metadata (id, settings, meta, tags, ...)
+    workflow = {key: value for key, value in original.items() if key not in ("name", "nodes", "connections")}
+    workflow.update({
+        "name": encoded.get("name") or original.get("name"),
+        "nodes": nodes,
+        "connections": connections,
+    })
+    return workflow
@@ -0,0 +1,178 @@
+# app/utils/workflow_validator.py
+
+import logging
+import re
+
+from app.schemas.node_types import COMPILED_NODE_TYPES, TRIGGER_TYPE_SUFFIXES, UNCONNECTED_NODE_TYPES
+
+logger = logging.getLogger(__name__)
+
+_NODE_PATH = re.compile(r"nodes\[(\d+)\]")
+REQUIRED_NODE_FIELDS = ("name", "type", "typeVersion", "position", "parameters")
+_REQUIRED_NODE_FIELDS = frozenset(REQUIRED_NODE_FIELDS)
+
+
+class WorkflowValidator:
+    """
+    Structural validator for n8n workflow graphs.
+
+    Checks, in one pass over nodes and one over connections:
+
+    - the top-level shape (``name``, ``nodes`` list, ``connections`` dict)
+    - every node has the fields n8n requires, with the right types
+    - node names are unique
+    - every connection source and target is an existing node
+    - no node is left without any connection (sticky notes aside)
+    - there is at least one node, and at least one trigger node
+    - node parameters match the compiled schema for their type
+
+    ``validate`` returns a list of error strings, each prefixed with the path
+    of the offending value; an empty list means the workflow is valid. Given
+    a ``warnings`` list, the last three checks (which n8n itself does not
+    enforce: it stores empty, trigger-less or half-wired workflows) report
+    there instead, so only the structural ones count as errors.
+    """
+
+    def __init__(self, schemas: dict = None, max_errors: int = 50):
+        self.schemas = COMPILED_NODE_TYPES if schemas is None else schemas
+        self.max_errors = max_errors
+
+    def validate(self, workflow, warnings: list = None) -> list:
+        if not isinstance(workflow, dict):
+            return ["workflow: expected an object"]
+        errors = []
+        findings = errors if warnings is None else warnings
+        if not isinstance(workflow.get("name"), str) or not workflow.get("name"):
+            errors.append("name: missing or not a non-empty string")
+        nodes = workflow.get("nodes")
+        connections = workflow.get("connections")
+        if not isinstance(nodes, list):
+            errors.append("nodes: missing or not a list")
+            nodes = []
+        if not isinstance(connections, dict):
+            errors.append("connections: missing or not an object")
+            connections = {}
+
+        names = {}
+        has_trigger = False
+        schemas = self.schemas
+        required_fields = _REQUIRED_NODE_FIELDS
+        for index, node in enumerate(nodes):
+            # Paths are only formatted once something is wrong
+            if node.__class__ is not dict:
+                errors.append(f"nodes[{index}]: expected an object")
+                continue
+            if not required_fields <= node.keys():
+                missing = [field for field in REQUIRED_NODE_FIELDS if field not in node]
+                errors.append(f"nodes[{index}]: missing {', '.join(missing)}")
+            name = node.get("name")
+            if name.__class__ is not str or not name:
+                if "name" in node:
+                    errors.append(f"nodes[{index}].name: expected a non-empty string")
+            elif name in names:
+                errors.append(f"nodes[{index}].name: duplicate node name '{name}' (also nodes[{names[name]}])")
+            else:
+                names[name] = index
+            node_type = node.get("type")
+            if node_type.__class__ is not str:
+                if "type" in node:
+                    errors.append(f"nodes[{index}].type: expected a string")
+                continue
+            version = node.get("typeVersion")
+            if version.__class__ is not int and version.__class__ is not float and version is not None:
+                errors.append(f"nodes[{index}].typeVersion: expected a number")
+            position = node.get("position")
+            if position is not None and (position.__class__ is not list or len(position) != 2):
+                errors.append(f"nodes[{index}].position: expected [x, y]")
+            schema = schemas.get(node_type)
+            if schema is not None:
+                if schema.trigger:
+                    has_trigger = True
+            elif not has_trigger and node_type.endswith(TRIGGER_TYPE_SUFFIXES):
+                has_trigger = True
+            parameters = node.get("parameters")
+            if parameters.__class__ is not dict:
+                if "parameters" in node:
+                    errors.append(f"nodes[{index}].parameters: expected an object")
+            elif schema is not None:
+                schema.validate(parameters, index, findings)
+            if len(errors) >= self.max_errors:
+                return self._truncate(errors)
+
+        connected = self._validate_connections(connections, names, errors)
+        if len(nodes) > 1:
+            for name, index in names.items():
+                if name not in connected and nodes[index].get("type") not in UNCONNECTED_NODE_TYPES:
+                    findings.append(f"nodes[{index}]: '{name}' is not connected to any other node")
+        if not nodes:
+            findings.append("nodes: workflow has no nodes")
+        elif not has_trigger:
+            findings.append("nodes: workflow has no trigger node")
+        return self._truncate(errors)
+
+    def _validate_connections(self, connections: dict, names: dict, errors: list) -> set:
+        """Check connection shape and references; returns the names of every connected node."""
+        connected = set()
+        add = connected.add
+        for source, outputs in connections.items():
+            if source not in names:
+                errors.append(f"connections['{source}']: source is not a node in this workflow")
+            if outputs.__class__ is not dict:
+                errors.append(f"connections['{source}']: expected an object of connection types")
+                continue
+            for connection_type, branches in outputs.items():
+                if branches.__class__ is not list:
+                    errors.append(f"connections['{source}'].{connection_type}: expected a list of outputs")
+                    continue
+                for output_index, targets in enumerate(branches):
+                    if targets.__class__ is not list:
+                        if targets is not None:
+                            errors.append(f"connections['{source}'].{connection_type}[{output_index}]: expected a list")
+                        continue
+                    for target in targets:
+                        target_name = target.get("node") if target.__class__ is dict else None
+                        if target_name.__class__ is str and target_name in names:
+                            add(target_name)
+                            add(source)
+                        elif target_name.__class__ is not str:
+                            errors.append(
+                                f"connections['{source}'].{connection_type}[{output_index}]: target without a node name"
+                            )
+                        else:
+                            errors.append(
+                                f"connections['{source}'].{connection_type}[{output_index}]: target '{target_name}' "
+                                "is not a node in this workflow"
+                            )
+        return connected
+
+    def _truncate(self, errors: list) -> list:
+        if len(errors) > self.max_errors:
+            return errors[:self.max_errors] + [f"... {len(errors) - self.max_errors} more errors"]
+        return errors
+
+
+_validator = WorkflowValidator()
+
+
+def validate_workflow(workflow, warnings: list = None) -> list:
+    """Validate with the shared validator built from the compiled node-type schemas."""
+    return _validator.validate(workflow, warnings)
+
+
+def error_key(error: str, workflow: dict) -> str:
+    """
+    ``error`` with its ``nodes[i]`` paths replaced by the node names, so the
+    same problem compares equal across two versions of a workflow even if
+    nodes were added or removed before it.
+    """
+    nodes = workflow.get("nodes") if isinstance(workflow, dict) else None
+    if not isinstance(nodes, list):
+        return error
+
+    def by_name(match):
+        index = int(match.group(1))
+        node = nodes[index] if index < len(nodes) else None
+        name = node.get("name") if isinstance(node, dict) else None
+        return f"nodes[{name!r}]" if isinstance(name, str) and name else match.group(0)
+
+    return _NODE_PATH.sub(by_name, error)
@@ -0,0 +1,88 @@
+# benchmarks/bench_batch.py
+"""
+Wall-clock time of generating N workflows: N sequential POST
+/generate-workflow calls against one POST /generate-workflows:batch.
+
+OpenAI and n8n are replaced by stubs with random latency (LLM calls still
+go through the shared rate limiter, so llm_max_concurrency applies), so the
+numbers show the orchestration, not the providers. With enough LLM
+concurrency the batch should take about as long as its slowest item.
+
+    python benchmarks/bench_batch.py --prompts 50 --llm-concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("N8N_API_BASE_URL", "http://localhost:5678/api/v1")
+os.environ.setdefault("N8N_API_KEY", "benchmark")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import app.main as main  # noqa: E402
+from app.services.rate_limiter import rate_limiter  # noqa: E402
+from benchmarks.fixtures import make_workflow  # noqa: E402
+
+
+def install_stubs(args):
+    rng = random.Random(args.seed)
+
+    async def fake_arun_llm(prompt, **kwargs):
+        async with rate_limiter.slot(len(prompt) // 4 + 1):
+            await asyncio.sleep(rng.uniform(args.llm_min, args.llm_max))
+        return json.dumps(make_workflow(8))
+
+    async def fake_acreate_workflow(workflow_json):
+        await asyncio.sleep(rng.uniform(args.n8n_min, args.n8n_max))
+        return {"success": True, "data": {"id": "1", **workflow_json}}
+
+    main.arun_llm = fake_arun_llm
+    main.acreate_workflow = fake_acreate_workflow
+
+
+def main_(args):
+    install_stubs(args)
+    rate_limiter.max_concurrency = args.llm_concurrency
+    rate_limiter.rpm = rate_limiter.tpm = 0
+    main.settings.batch_n8n_concurrency = args.n8n_concurrency
+    main.settings.repair_enabled = False
+    main.settings.job_sqlite_path = os.path.join(tempfile.mkdtemp(), "jobs.sqlite3")
+    logging.getLogger().setLevel(logging.WARNING)
+    prompts = [f"Create workflow number {i} that syncs orders to Slack" for i in range(args.prompts)]
+    headers = {"Cache-Control": "no-cache"}
+    with TestClient(main.app) as client:
+        started = time.perf_counter()
+        for prompt in prompts:
+            client.post("/generate-workflow", json={"prompt": prompt}, headers=headers)
+        sequential = time.perf_counter() - started
+
+        started = time.perf_counter()
+        body = client.post("/generate-workflows:batch", json={"prompts": prompts + prompts[:5]}, headers=headers).json()
+        batch = time.perf_counter() - started
+    summary = body["summary"]
+    print(f"prompts={args.prompts} (+5 duplicates)  llm_concurrency={args.llm_concurrency}  n8n_concurrency={args.n8n_concurrency}")
+    print(f"sequential:  {sequential:8.2f}s")
+    print(f"batch:       {batch:8.2f}s  ({sequential / batch:.1f}x faster)")
+    print(f"  slowest item {summary['slowest_item_ms'] / 1000:.2f}s, sum of items {summary['sum_item_ms'] / 1000:.2f}s, "
+          f"unique {summary['unique']}/{summary['prompts']}, succeeded {summary['succeeded']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prompts", type=int, default=50)
+    parser.add_argument("--llm-concurrency", type=int, default=50)
+    parser.add_argument("--n8n-concurrency", type=int, default=5)
+    parser.add_argument("--llm-min", type=float, default=0.2)
+    parser.add_argument("--llm-max", type=float, default=0.6)
+    parser.add_argument("--n8n-min", type=float, default=0.02)
+    parser.add_argument("--n8n-max", type=float, default=0.08)
+    parser.add_argument("--seed", type=int, default=7)
+    main_(parser.parse_args())
@@ -0,0 +1,78 @@
+# benchmarks/bench_concurrency.py
+"""
+Throughput vs. concurrency for a running API server.
+
+Fires a fixed number of requests at one endpoint for each concurrency level
+and prints requests/s. With the async handlers, throughput should grow with
+concurrency until OpenAI or n8n becomes the bottleneck; with blocking
+handlers it stays flat at roughly one request per worker.
+
+    python benchmarks/bench_concurrency.py --url http://localhost:8000 \\
+        --endpoint /describe-workflow --levels 1 2 4 8 --requests 16
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+
+async def _run_level(client, method, url, body, concurrency, total):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, json=body)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 3) if elapsed else 0.0,
+        "mean_latency_s": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+    }
+
+
+async def main(args):
+    url = args.url.rstrip("/") + args.endpoint
+    body = None if args.method == "GET" else {"prompt": args.prompt}
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=max(args.levels))
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        baseline = None
+        for level in args.levels:
+            result = await _run_level(client, args.method, url, body, level, args.requests)
+            baseline = baseline or result["throughput_rps"]
+            scaling = result["throughput_rps"] / baseline if baseline else 0.0
+            print(
+                f"concurrency={result['concurrency']:>3}  "
+                f"throughput={result['throughput_rps']:>8.2f} req/s  "
+                f"mean_latency={result['mean_latency_s']:>7.3f}s  "
+                f"errors={result['errors']}  scaling={scaling:.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", default="/describe-workflow")
+    parser.add_argument("--method", default="POST", choices=["GET", "POST"])
+    parser.add_argument("--prompt", default="What can n8n do?")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    asyncio.run(main(parser.parse_args()))
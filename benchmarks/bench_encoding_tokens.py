@@ -0,0 +1,71 @@
+# benchmarks/bench_encoding_tokens.py
+"""
+Prompt-token cost of a workflow in three forms: pretty-printed n8n JSON (what
+the prompts used to embed), minified n8n JSON, and the compact encoding from
+app.utils.workflow_codec. Reports the reduction per workflow size bucket and
+checks that every workflow survives an encode/decode round trip.
+
+The corpus defaults to synthetic workflows from benchmarks/fixtures.py; pass
+a directory of exported workflow JSON files (one workflow per file, or a
+list per file, as the n8n CLI and GET /workflows produce) to use real ones:
+
+    python benchmarks/bench_encoding_tokens.py [corpus_dir]
+"""
+import glob
+import json
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fixtures import count_tokens, make_workflow, token_counter_name  # noqa: E402
+from app.utils.workflow_codec import decode_workflow, encode_for_prompt  # noqa: E402
+
+BUCKETS = ((1, 5), (6, 15), (16, 40), (41, 100), (101, 10**6))
+
+
+def load_corpus(directory: str) -> list:
+    workflows = []
+    for path in sorted(glob.glob(os.path.join(directory, "**", "*.json"), recursive=True)):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict) and isinstance(data.get("data"), list):
+            data = data["data"]
+        for workflow in data if isinstance(data, list) else [data]:
+            if isinstance(workflow, dict) and isinstance(workflow.get("nodes"), list):
+                workflows.append(workflow)
+    return workflows
+
+
+def synthetic_corpus() -> list:
+    return [make_workflow(n_nodes, seed) for n_nodes in (3, 5, 8, 12, 20, 30, 50, 80, 150, 250) for seed in range(4)]
+
+
+def main():
+    corpus = load_corpus(sys.argv[1]) if len(sys.argv) > 1 else synthetic_corpus()
+    print(f"token counter: {token_counter_name()}; {len(corpus)} workflows\n")
+    rows = {bucket: [] for bucket in BUCKETS}
+    for workflow in corpus:
+        encoded = encode_for_prompt(workflow)
+        assert decode_workflow(json.loads(encoded), workflow) == workflow, workflow.get("name")
+        pretty = count_tokens(json.dumps(workflow, indent=2))
+        minified = count_tokens(json.dumps(workflow, separators=(",", ":")))
+        compact = count_tokens(encoded)
+        bucket = next(b for b in BUCKETS if b[0] <= len(workflow["nodes"]) <= b[1])
+        rows[bucket].append((pretty, minified, compact))
+
+    print(f"{'nodes':>9} {'n':>3} {'pretty':>8} {'minified':>9} {'compact':>8} {'vs pretty':>10} {'vs minified':>12}")
+    for (low, high), samples in rows.items():
+        if not samples:
+            continue
+        pretty, minified, compact = (statistics.mean(column) for column in zip(*samples))
+        label = f"{low}-{high}" if high < 10**6 else f"{low}+"
+        print(
+            f"{label:>9} {len(samples):>3} {pretty:>8.0f} {minified:>9.0f} {compact:>8.0f} "
+            f"{1 - compact / pretty:>9.1%} {1 - compact / minified:>11.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# benchmarks/bench_json_extract.py
+"""
+Micro-benchmark: extract_first_object / StreamingJSONExtractor vs. the previous find('{')/rfind('}')
+implementation of extract_json_from_response.
+
+Reports, per workflow size, the time to extract from a complete response,
+the time to push the same response through in 16-character chunks (as a
+token stream arrives), and how far into the stream the first node event
+fires. A correctness table follows for inputs the old implementation
+mishandled.
+
+    python benchmarks/bench_json_extract.py
+"""
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fixtures import make_workflow  # noqa: E402
+from app.utils.json_stream import StreamingJSONExtractor, extract_first_object  # noqa: E402
+
+
+def legacy_extract(response_text):
+    """The previous implementation, minus its print/log of the whole payload."""
+    response_text = response_text.replace("```json", "").replace("```", "")
+    start = response_text.find('{')
+    end = response_text.rfind('}')
+    if start != -1 and end != -1 and end > start:
+        try:
+            return json.loads(response_text[start:end + 1])
+        except json.JSONDecodeError:
+            return None
+    return None
+
+
+def new_extract(response_text):
+    return extract_first_object(response_text, repair=True)
+
+
+def new_extract_streamed(response_text, chunk_size=16):
+    extractor = StreamingJSONExtractor(repair=True)
+    for i in range(0, len(response_text), chunk_size):
+        extractor.feed(response_text[i:i + chunk_size])
+    return extractor.close()
+
+
+def first_node_offset(response_text, chunk_size=16):
+    extractor = StreamingJSONExtractor()
+    for i in range(0, len(response_text), chunk_size):
+        if any(kind == "node" for kind, _ in extractor.feed(response_text[i:i + chunk_size])):
+            return i + chunk_size
+    return None
+
+
+def _time(fn, arg, number):
+    return min(timeit.repeat(lambda: fn(arg), number=number, repeat=5)) / number
+
+
+def run_timings():
+    print(f"{'nodes':>6} {'bytes':>9} {'legacy':>10} {'new':>10} {'new/16B':>10} {'1st node @':>11}")
+    for n_nodes in (10, 50, 200, 500):
+        payload = json.dumps(make_workflow(n_nodes), indent=2)
+        response = f"Here is your workflow:\n```json\n{payload}\n```\nLet me know if you need changes."
+        number = max(1, 2000 // n_nodes)
+        assert legacy_extract(response) == new_extract(response) == new_extract_streamed(response)
+        legacy = _time(legacy_extract, response, number)
+        new = _time(new_extract, response, number)
+        streamed = _time(new_extract_streamed, response, number)
+        offset = first_node_offset(response)
+        print(
+            f"{n_nodes:>6} {len(response):>9} {legacy * 1e3:>8.3f}ms {new * 1e3:>8.3f}ms "
+            f"{streamed * 1e3:>8.3f}ms {offset / len(response):>10.1%}"
+        )
+
+
+def run_correctness():
+    workflow = make_workflow(5, with_metadata=False)
+    payload = json.dumps(workflow)
+    cases = {
+        "fenced": f"```json\n{payload}\n```",
+        "trailing prose with braces": payload + "\nReplace {placeholders} with {your values}.",
+        "leading prose with braces": "Use {name} for node names. " + payload,
+        "trailing comma": payload[:-1] + ",}",
+        "truncated at max_tokens": payload[: int(len(payload) * 0.8)],
+    }
+    print(f"\n{'case':<28} {'legacy':>8} {'new':>8}")
+    for name, text in cases.items():
+        legacy = legacy_extract(text)
+        new = new_extract(text)
+        legacy_ok = "ok" if legacy == workflow else ("partial" if legacy else "fail")
+        new_ok = "ok" if new == workflow else ("partial" if new else "fail")
+        print(f"{name:<28} {legacy_ok:>8} {new_ok:>8}")
+
+
+if __name__ == "__main__":
+    run_timings()
+    run_correctness()
@@ -0,0 +1,104 @@
+# benchmarks/bench_logging.py
+"""
+Per-request logging overhead on the generation path, before and after the
+structured logging layer.
+
+"before" replays the old log lines: f-strings with the full LLM response,
+the full payload sent to n8n and n8n's full response, written by a
+synchronous StreamHandler. "after" logs the same events through
+log_payload() and the queue-backed handler, as the app does now. The time
+reported is what the request itself spends in logging calls; the "after"
+listener thread's formatting and I/O happen off that path and are timed
+separately (drain).
+
+    python benchmarks/bench_logging.py --nodes 8 64 256 --requests 200
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.structured_logging import log_payload, setup_logging, stop_logging  # noqa: E402
+from benchmarks.fixtures import make_workflow  # noqa: E402
+
+logger = logging.getLogger("bench")
+
+
+def request_before(response: str, payload: dict, n8n_text: str):
+    logger.info(f"Received workflow generation request: prompt='Create a workflow that syncs orders'")
+    logger.info(f"LLM response: {response}")
+    logger.info(f"Workflow validation result: True, message: Valid n8n workflow structure")
+    logger.info(f"Sending workflow to n8n: {payload}")
+    logger.info(f"n8n API response status: 200")
+    logger.info(f"n8n API response text: {n8n_text}")
+
+
+def request_after(response: str, payload: dict, n8n_text: str):
+    logger.info(f"Received workflow generation request: prompt='Create a workflow that syncs orders'")
+    logger.info("LLM response: %s", log_payload(response))
+    logger.info(f"Workflow validation result: True, message: Valid n8n workflow structure")
+    logger.info("Sending workflow to n8n: %s", log_payload(payload))
+    logger.info("n8n API response %s: %s", 200, log_payload(n8n_text))
+
+
+def measure(request, requests: int, args) -> list:
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        request(*args)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def describe(timings: list) -> str:
+    timings = sorted(timings)
+    p99 = timings[max(0, int(len(timings) * 0.99) - 1)]
+    return f"mean {statistics.mean(timings) * 1e6:9.1f}us  p99 {p99 * 1e6:9.1f}us"
+
+
+def main(args):
+    directory = tempfile.mkdtemp()
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    for nodes in args.nodes:
+        workflow = make_workflow(nodes, with_metadata=False)
+        response = json.dumps(workflow, indent=2)
+        payload = {"name": workflow["name"], "nodes": workflow["nodes"], "connections": workflow["connections"], "settings": {}}
+        n8n_text = json.dumps(dict(payload, id="42", active=False))
+
+        before_path = os.path.join(directory, f"before-{nodes}.log")
+        with open(before_path, "w") as stream:
+            handler = logging.StreamHandler(stream)
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+            root.handlers = [handler]
+            before = measure(request_before, args.requests, (response, payload, n8n_text))
+        root.handlers = []
+
+        after_path = os.path.join(directory, f"after-{nodes}.log")
+        with open(after_path, "w") as stream:
+            setup_logging("INFO", args.format, queue_size=args.requests * 10, stream=stream)
+            after = measure(request_after, args.requests, (response, payload, n8n_text))
+            started = time.perf_counter()
+            stop_logging()
+            drain = time.perf_counter() - started
+        root.handlers = []
+
+        print(f"nodes={nodes:4d} (response {len(response) / 1024:6.1f} KiB)")
+        print(f"  before: {describe(before)}  log {os.path.getsize(before_path) / args.requests / 1024:8.1f} KiB/request")
+        print(f"  after:  {describe(after)}  log {os.path.getsize(after_path) / args.requests / 1024:8.1f} KiB/request"
+              f"  (drain {drain / args.requests * 1e6:.1f}us/request off the request path)")
+        print(f"  {statistics.mean(before) / statistics.mean(after):.1f}x less time in logging per request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, nargs="+", default=[8, 64, 256])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--format", choices=["text", "json"], default="text")
+    main(parser.parse_args())
@@ -0,0 +1,164 @@
+# benchmarks/bench_startup.py
+"""
+Cold-start cost of the API: how long ``import app.main`` takes (from
+``python -X importtime``), which of the app's modules and heavy third-party
+packages that time goes to, and how long a fresh uvicorn process takes to
+answer its first health check and to finish warming up its LLM clients.
+
+Both run from a temporary working directory, so a CWD-relative path would
+show up as a failure here. Each measurement is the median of --runs fresh
+processes.
+
+    python benchmarks/bench_startup.py --runs 5
+
+To compare with another commit, check it out elsewhere and point --root at
+it (commits without /health can use --path /stats):
+
+    git worktree add /tmp/before HEAD~1
+    python benchmarks/bench_startup.py --root /tmp/before --path /stats
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.load_test import free_port  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Packages worth knowing about when they are loaded by the import alone
+HEAVY = ("openai", "langchain_openai", "langchain", "langchain.chains", "langsmith.client", "langchain_text_splitters",
+         "numpy", "tiktoken")
+
+
+def app_env(root: str) -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = root + os.pathsep + env.get("PYTHONPATH", "")
+    env.setdefault("OPENAI_API_KEY", "benchmark")
+    env.setdefault("N8N_API_KEY", "benchmark")
+    env.setdefault("N8N_API_BASE_URL", "http://127.0.0.1:9/api/v1")
+    return env
+
+
+def parse_importtime(stderr: str) -> list:
+    """(depth, module, cumulative seconds) for each ``-X importtime`` line, in output order."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((depth, name.strip(), int(cumulative) / 1e6))
+    return rows
+
+
+def measure_import(root: str, cwd: str) -> tuple:
+    """(seconds to import app.main, its direct imports by cost, heavy packages it loaded)."""
+    code = f"import sys, json, app.main; print(json.dumps([m for m in {HEAVY!r} if m in sys.modules]))"
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=cwd, env=app_env(root),
+                             capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"import app.main failed:\n{process.stderr[-2000:]}")
+    rows = parse_importtime(process.stderr)
+    # app.main's own line comes after everything it imported
+    index = max(i for i, row in enumerate(rows) if row[1] == "app.main")
+    depth, _, total = rows[index]
+    children = []
+    for child_depth, name, seconds in reversed(rows[:index]):
+        if child_depth <= depth:
+            break
+        if child_depth == depth + 1:
+            children.append((name, seconds))
+    children.sort(key=lambda child: child[1], reverse=True)
+    return total, children, json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def measure_server(root: str, cwd: str, path: str, timeout: float) -> tuple:
+    """(seconds to the first 200 from ``path``, seconds until /health reports warmed_up, or None)."""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = app_env(root)
+    env.setdefault("JOB_SQLITE_PATH", os.path.join(cwd, "jobs.sqlite3"))
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    healthy = warm = None
+    try:
+        with httpx.Client(timeout=1.0) as client:
+            while time.perf_counter() - started < timeout:
+                if server.poll() is not None:
+                    raise RuntimeError(f"server exited with code {server.returncode}:\n{server.stderr.read().decode()[-2000:]}")
+                try:
+                    response = client.get(url + (path if healthy is None else "/health"))
+                except httpx.HTTPError:
+                    time.sleep(0.01)
+                    continue
+                if healthy is None and response.status_code == 200:
+                    healthy = time.perf_counter() - started
+                if healthy is not None:
+                    if response.status_code != 200 or "warmed_up" not in response.json():
+                        break
+                    if response.json()["warmed_up"]:
+                        warm = time.perf_counter() - started
+                        break
+                time.sleep(0.01)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+    if healthy is None:
+        raise RuntimeError(f"{url}{path} did not answer within {timeout:.0f}s")
+    return healthy, warm
+
+
+def median(values: list):
+    values = [value for value in values if value is not None]
+    return statistics.median(values) if values else None
+
+
+def seconds(value) -> str:
+    return f"{value * 1000:7.0f}ms" if value is not None else "      -  "
+
+
+def main(args):
+    root = os.path.abspath(args.root)
+    imports, healthy, warm = [], [], []
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as cwd:
+            total, children, heavy = measure_import(root, args.cwd or cwd)
+            imports.append(total)
+            first, warmed = measure_server(root, args.cwd or cwd, args.path, args.timeout)
+            healthy.append(first)
+            warm.append(warmed)
+
+    print(f"root {root}, median of {args.runs} runs")
+    print(f"  import app.main          {seconds(median(imports))}")
+    print(f"  first healthy response   {seconds(median(healthy))}  (GET {args.path})")
+    print(f"  LLM clients warmed up    {seconds(median(warm))}")
+    print(f"  heavy packages loaded by the import: {', '.join(heavy) or 'none'}")
+    print(f"  app.main's imports by cumulative time (last run):")
+    for name, cost in children[:args.top]:
+        print(f"    {seconds(cost)}  {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--root", default=ROOT, help="checkout whose app is measured")
+    parser.add_argument("--cwd", default=None, help="working directory for the app (default: a fresh temp dir)")
+    parser.add_argument("--path", default="/health", help="endpoint polled for the first healthy response")
+    parser.add_argument("--top", type=int, default=10, help="how many of app.main's imports to list")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    main(parser.parse_args())
@@ -0,0 +1,68 @@
+# benchmarks/bench_transfer.py
+"""
+Bulk export/import throughput against two local mock n8n servers: every
+workflow of the source is exported to a .ndjson.gz file, which is then
+imported into an empty target at increasing writer concurrency.
+
+With per-request latency on the mock, import throughput should grow with
+concurrency until the mock (or the n8n connection pool) is saturated.
+
+    python benchmarks/bench_transfer.py --workflows 500 --latency 0.02 --concurrency 1 4 16
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("N8N_API_BASE_URL", "http://localhost:5678/api/v1")
+os.environ.setdefault("N8N_API_KEY", "benchmark")
+
+import app.n8n_client as n8n_client  # noqa: E402
+from app.services.workflow_transfer import WorkflowImporter, _export_to_file, _read_file  # noqa: E402
+from benchmarks.mock_n8n import MockN8n, serve_in_thread  # noqa: E402
+
+
+async def use_n8n(port: int, pool_size: int):
+    await n8n_client.close_n8n_client()
+    n8n_client._client = n8n_client.N8nClient(base_url=f"http://127.0.0.1:{port}/api/v1", pool_size=pool_size)
+
+
+async def run(args):
+    source = MockN8n(args.workflows, args.nodes, args.latency)
+    servers = [serve_in_thread(source, args.port)]
+    path = os.path.join(tempfile.mkdtemp(), "workflows.ndjson.gz")
+    pool_size = max(args.concurrency)
+    try:
+        await use_n8n(args.port, pool_size)
+        report = await _export_to_file(path, args.page_size)
+        print(f"export: {report['exported']} workflows, {report['bytes'] / 1024:.0f} KiB gzipped, "
+              f"{report['elapsed_s']:.2f}s, {report['workflows_per_s']:.0f} workflows/s")
+        for offset, concurrency in enumerate(args.concurrency, start=1):
+            target = MockN8n(latency=args.latency)
+            servers.append(serve_in_thread(target, args.port + offset))
+            await use_n8n(args.port + offset, pool_size)
+            report = (await WorkflowImporter("create", concurrency).run(_read_file(path))).as_dict()
+            print(f"import concurrency={concurrency:3d}: {report['created']} created, {report['invalid']} invalid, "
+                  f"{report['failed']} failed, {report['elapsed_s']:.2f}s, {report['workflows_per_s']:.0f} workflows/s")
+    finally:
+        await n8n_client.close_n8n_client()
+        for server in servers:
+            server.should_exit = True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workflows", type=int, default=500)
+    parser.add_argument("--nodes", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the mock adds to every request")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--port", type=int, default=5791)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    n8n_client.workflow_cache = None  # measure n8n round-trips, not the cache
+    asyncio.run(run(args))
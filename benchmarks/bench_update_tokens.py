@@ -0,0 +1,81 @@
+# benchmarks/bench_update_tokens.py
+"""
+Token cost of PUT /workflows/{id}: the original whole-JSON round trip
+(pretty-printed workflow in, complete workflow out) against "diff" mode
+(compact encoding in, JSON Patch out), for two small edits on workflows of
+increasing size:
+
+- tweak: change one parameter of one node
+- insert: add a node and wire it in after an existing one
+
+Output tokens assume the model returns exactly the required answer.
+
+    python benchmarks/bench_update_tokens.py
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("N8N_API_BASE_URL", "http://localhost:5678/api/v1")
+os.environ.setdefault("N8N_API_KEY", "benchmark")
+
+from benchmarks.fixtures import count_tokens, make_workflow, token_counter_name  # noqa: E402
+from app.services.prompt_registry import prompt_registry  # noqa: E402
+from app.services.workflow_update import _update_messages, apply_update_patch  # noqa: E402
+from app.utils.workflow_validator import validate_workflow  # noqa: E402
+
+INSTRUCTIONS = {
+    "tweak": "Change the Slack channel of the first Slack node to #ops.",
+    "insert": "Send a Slack message to #ops after the first node.",
+}
+
+
+def edit_patch(kind: str, workflow: dict) -> list:
+    """The patch a model should answer with, against the compact encoding."""
+    nodes = workflow["nodes"]
+    if kind == "tweak":
+        index = next(i for i, node in enumerate(nodes) if node["type"] == "n8n-nodes-base.slack")
+        return [{"op": "replace", "path": f"/nodes/{index}/p/channel", "value": "#ops"}]
+    first, second = nodes[0]["name"], nodes[1]["name"]
+    return [
+        {"op": "add", "path": "/nodes/-", "value": {
+            "n": "Notify Ops", "t": "slack", "v": 2, "p": {"channel": "#ops", "text": "={{ $json.id }}"}}},
+        {"op": "replace", "path": "/edges/0", "value": [first, "Notify Ops"]},
+        {"op": "add", "path": "/edges/-", "value": ["Notify Ops", second]},
+    ]
+
+
+def full_prompt(instruction: str, workflow: dict) -> str:
+    # The full-mode prompt app/main.py used to build
+    return f"""Update this existing n8n workflow based on the user's request.
+        
+User request: {instruction}
+        
+Current workflow JSON:
+{json.dumps(workflow, indent=2)}
+        
+Return the updated workflow JSON with the requested changes."""
+
+
+def main():
+    print(f"token counter: {token_counter_name()}\n")
+    template = prompt_registry.get("update_patch")
+    print(f"{'nodes':>6} {'edit':>7} {'full in':>9} {'diff in':>9} {'full out':>9} {'diff out':>9} {'total x':>8}")
+    for n_nodes in (10, 50, 200):
+        workflow = make_workflow(n_nodes)
+        for kind, instruction in INSTRUCTIONS.items():
+            patch = edit_patch(kind, workflow)
+            updated = apply_update_patch(workflow, patch)
+            assert not validate_workflow(updated), validate_workflow(updated)
+            full_in = count_tokens(full_prompt(instruction, workflow))
+            full_out = count_tokens(json.dumps(updated, indent=2))
+            diff_in = sum(count_tokens(message.content) for message in _update_messages(template, instruction, workflow))
+            diff_out = count_tokens(json.dumps({"patch": patch}))
+            ratio = (full_in + full_out) / (diff_in + diff_out)
+            print(f"{n_nodes:>6} {kind:>7} {full_in:>9} {diff_in:>9} {full_out:>9} {diff_out:>9} {ratio:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
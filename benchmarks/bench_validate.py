@@ -0,0 +1,62 @@
+# benchmarks/bench_validate.py
+"""
+Micro-benchmark for the structural workflow validator.
+
+Times WorkflowValidator.validate on valid workflows of increasing size (the
+common case) and on a 200-node workflow with a handful of injected faults.
+The target is well under a millisecond for 200 nodes. json.loads of the same
+workflow is shown for scale, since absolute numbers depend on the machine.
+
+    python benchmarks/bench_validate.py
+"""
+import copy
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fixtures import make_workflow  # noqa: E402
+from app.utils.workflow_validator import WorkflowValidator  # noqa: E402
+
+
+def broken(workflow):
+    workflow = copy.deepcopy(workflow)
+    nodes = workflow["nodes"]
+    nodes[3]["name"] = nodes[2]["name"]
+    http = next(node for node in nodes if node["type"] == "n8n-nodes-base.httpRequest")
+    http["parameters"].pop("url")
+    nodes[7]["typeVersion"] = "2"
+    workflow["connections"]["Ghost"] = {"main": [[{"node": "Nowhere", "type": "main", "index": 0}]]}
+    nodes.append({"name": "Orphan", "type": "n8n-nodes-base.noOp", "typeVersion": 1,
+                  "position": [0, 0], "parameters": {}})
+    return workflow
+
+
+def _time(fn, arg, number=2000):
+    return min(timeit.repeat(lambda: fn(arg), number=number, repeat=5)) / number
+
+
+def main():
+    validator = WorkflowValidator()
+    print(f"{'nodes':>6} {'errors':>7} {'validate':>10} {'json.loads':>11}")
+    for n_nodes in (10, 50, 200, 500):
+        workflow = make_workflow(n_nodes, with_metadata=False)
+        errors = validator.validate(workflow)
+        assert not errors, errors
+        payload = json.dumps(workflow)
+        print(
+            f"{n_nodes:>6} {len(errors):>7} {_time(validator.validate, workflow) * 1e6:>8.1f}us "
+            f"{_time(json.loads, payload) * 1e6:>9.1f}us"
+        )
+    workflow = broken(make_workflow(200, with_metadata=False))
+    errors = validator.validate(workflow)
+    print(f"{'200*':>6} {len(errors):>7} {_time(validator.validate, workflow) * 1e6:>8.1f}us")
+    print("\n* with injected faults:")
+    for error in errors:
+        print(f"  {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+# benchmarks/fake_llm.py
+"""
+Deterministic stand-in for ChatOpenAI, so the service can be benchmarked
+offline.
+
+FakeChatModel replays recorded completions: the first recording whose
+``match`` occurs in the prompt wins, otherwise one of the recordings without
+a ``match`` is picked by a hash of the prompt, so the same prompt always
+gets the same answer. Each completion takes ``latency`` seconds to its first
+token and then streams at ``tokens_per_second``; token usage is reported
+like OpenAI's, so metrics, rate limiting and usage accounting still run.
+
+Prompt caching is simulated as OpenAI documents it: a prompt of at least
+1024 tokens reports as cached the longest prefix, in 128-token steps from
+1024, that an earlier prompt in this process started with. Prefixes are
+compared on the concatenated message contents.
+
+Recordings are NDJSON, one {"match": ..., "completion": ...} per line;
+without a file the defaults below cover generation, description and
+diff-mode updates.
+
+    from benchmarks.fake_llm import install_fake_llm
+    install_fake_llm(latency=0.8, tokens_per_second=80)   # before the app starts
+"""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from app.services.llm_pool import init_llm_pool
+from benchmarks.fixtures import make_workflow
+
+CHARS_PER_TOKEN = 4
+# Streamed completions are sent this many tokens at a time
+CHUNK_TOKENS = 8
+# OpenAI's prompt caching: prompts from 1024 tokens, matched in 128-token increments
+CACHE_MIN_TOKENS = 1024
+CACHE_STEP_TOKENS = 128
+MAX_CACHED_PREFIXES = 100000
+
+_cached_prefixes = set()
+_cache_lock = threading.Lock()
+
+DESCRIPTION = (
+    "This workflow runs every hour, fetches new orders from the shop API and checks their amount. "
+    "Large orders are posted to the #alerts Slack channel and every order is appended to a Google Sheet."
+)
+
+
+def default_recordings() -> list:
+    recordings = [
+        # Diff-mode update (app/prompts/update_prompt.txt)
+        {"match": "You edit existing n8n workflows",
+         "completion": json.dumps({"patch": [{"op": "replace", "path": "/name", "value": "Updated workflow"}]})},
+        # Descriptions (app/prompts/describe_prompt.txt)
+        {"match": "You describe existing n8n workflows", "completion": DESCRIPTION},
+    ]
+    # Everything else is a generation request
+    for seed, nodes in enumerate((4, 6, 8, 12, 16, 24)):
+        recordings.append({"completion": json.dumps(make_workflow(nodes, seed=seed, with_metadata=False), indent=2)})
+    return recordings
+
+
+def load_recordings(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _cached_tokens(prompt: str) -> int:
+    """Tokens of ``prompt`` a provider-side prompt cache would have served, then remember its prefixes."""
+    cached = 0
+    boundaries = range(CACHE_MIN_TOKENS * CHARS_PER_TOKEN, len(prompt) + 1, CACHE_STEP_TOKENS * CHARS_PER_TOKEN)
+    digests = [hashlib.sha1(prompt[:end].encode("utf-8")).digest() for end in boundaries]
+    with _cache_lock:
+        for end, digest in zip(boundaries, digests):
+            if digest not in _cached_prefixes:
+                break
+            cached = end // CHARS_PER_TOKEN
+        if len(_cached_prefixes) > MAX_CACHED_PREFIXES:
+            _cached_prefixes.clear()
+        _cached_prefixes.update(digests)
+    return cached
+
+
+class FakeChatModel(BaseChatModel):
+    recordings: list
+    latency: float = 0.5  # seconds until the first token
+    tokens_per_second: float = 0.0  # 0 returns the whole completion after ``latency``
+    model_name: str = "fake-chat"
+    prompt_cache: bool = True  # report cached prompt tokens like OpenAI's automatic prompt caching
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _pick(self, messages) -> tuple:
+        prompt = "\n".join(str(message.content) for message in messages)
+        for recording in self.recordings:
+            if recording.get("match") and recording["match"] in prompt:
+                return prompt, recording["completion"]
+        fallbacks = [recording for recording in self.recordings if not recording.get("match")]
+        index = int(hashlib.sha1(prompt.encode("utf-8")).hexdigest(), 16) % len(fallbacks)
+        return prompt, fallbacks[index]["completion"]
+
+    def _duration(self, completion: str) -> float:
+        streaming = _tokens(completion) / self.tokens_per_second if self.tokens_per_second else 0.0
+        return self.latency + streaming
+
+    def _usage(self, prompt: str, completion: str) -> dict:
+        prompt_tokens, completion_tokens = _tokens(prompt), _tokens(completion)
+        cached = min(_cached_tokens(prompt), prompt_tokens) if self.prompt_cache else 0
+        return {"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens, "input_token_details": {"cache_read": cached}}
+
+    def _result(self, prompt: str, completion: str) -> ChatResult:
+        usage = self._usage(prompt, completion)
+        message = AIMessage(content=completion, usage_metadata=usage, response_metadata={"model_name": self.model_name})
+        token_usage = {"prompt_tokens": usage["input_tokens"], "completion_tokens": usage["output_tokens"],
+                       "total_tokens": usage["total_tokens"],
+                       "prompt_tokens_details": {"cached_tokens": usage["input_token_details"]["cache_read"]}}
+        return ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output={"token_usage": token_usage, "model_name": self.model_name},
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        prompt, completion = self._pick(messages)
+        time.sleep(self._duration(completion))
+        return self._result(prompt, completion)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        prompt, completion = self._pick(messages)
+        await asyncio.sleep(self._duration(completion))
+        return self._result(prompt, completion)
+
+    def _chunks(self, prompt: str, completion: str):
+        step = CHUNK_TOKENS * CHARS_PER_TOKEN
+        delay = CHUNK_TOKENS / self.tokens_per_second if self.tokens_per_second else 0.0
+        for start in range(0, len(completion), step):
+            yield delay, ChatGenerationChunk(message=AIMessageChunk(content=completion[start:start + step]))
+        # Usage comes last, as with stream_usage=True
+        yield 0.0, ChatGenerationChunk(message=AIMessageChunk(
+            content="", usage_metadata=self._usage(prompt, completion),
+            response_metadata={"model_name": self.model_name},
+        ))
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt, completion = self._pick(messages)
+        time.sleep(self.latency)
+        for delay, chunk in self._chunks(prompt, completion):
+            if delay:
+                time.sleep(delay)
+            if run_manager is not None and chunk.message.content:
+                run_manager.on_llm_new_token(chunk.message.content, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt, completion = self._pick(messages)
+        await asyncio.sleep(self.latency)
+        for delay, chunk in self._chunks(prompt, completion):
+            if delay:
+                await asyncio.sleep(delay)
+            if run_manager is not None and chunk.message.content:
+                await run_manager.on_llm_new_token(chunk.message.content, chunk=chunk)
+            yield chunk
+
+
+def install_fake_llm(recordings: list = None, latency: float = 0.5, tokens_per_second: float = 0.0):
+    """Make the process-wide LLM pool hand out FakeChatModels; call before the app's lifespan starts."""
+    recordings = recordings or default_recordings()
+
+    def factory(callbacks):
+        return FakeChatModel(recordings=recordings, latency=latency, tokens_per_second=tokens_per_second,
+                             callbacks=callbacks)
+
+    return init_llm_pool(client_factory=factory)
@@ -0,0 +1,113 @@
+# benchmarks/fixtures.py
+"""Synthetic but realistic n8n workflows for the benchmarks."""
+import random
+import uuid
+
+NODE_TEMPLATES = [
+    ("n8n-nodes-base.httpRequest", 4, lambda i: {
+        "method": "POST",
+        "url": f"https://api.example.com/v1/items/{i}",
+        "sendBody": True,
+        "bodyParameters": {"parameters": [{"name": "id", "value": "={{ $json.id }}"}]},
+        "options": {"timeout": 10000},
+    }),
+    ("n8n-nodes-base.set", 3, lambda i: {
+        "values": {"string": [{"name": f"field_{i}", "value": "={{ $json[\"name\"] }} {suffix}"}]},
+        "options": {},
+    }),
+    ("n8n-nodes-base.if", 2, lambda i: {
+        "conditions": {"number": [{"value1": "={{ $json.amount }}", "operation": "larger", "value2": 1000 + i}]},
+    }),
+    ("n8n-nodes-base.slack", 2, lambda i: {
+        "channel": "#alerts",
+        "text": f"Order {{{{ $json.id }}}} needs attention (step {i})",
+        "otherOptions": {},
+    }),
+    ("n8n-nodes-base.code", 2, lambda i: {
+        "jsCode": f"// step {i}\nreturn items.map(item => ({{ json: {{ ...item.json, step: {i} }} }}));",
+    }),
+    ("n8n-nodes-base.googleSheets", 4, lambda i: {
+        "operation": "append",
+        "documentId": {"__rl": True, "value": "1AbCdEf", "mode": "id"},
+        "sheetName": {"__rl": True, "value": "Sheet1", "mode": "name"},
+        "columns": {"mappingMode": "autoMapInputData", "value": {}},
+    }),
+]
+
+CREDENTIALS = {
+    "n8n-nodes-base.slack": {"slackApi": {"id": "12", "name": "Slack account"}},
+    "n8n-nodes-base.googleSheets": {"googleSheetsOAuth2Api": {"id": "7", "name": "Google Sheets account"}},
+    "n8n-nodes-base.httpRequest": {"httpHeaderAuth": {"id": "3", "name": "API key"}},
+}
+
+
+def make_workflow(n_nodes: int, seed: int = 0, with_metadata: bool = True) -> dict:
+    """A linear-ish workflow of ``n_nodes`` nodes (trigger included), like the n8n API returns."""
+    rng = random.Random(seed)
+    nodes = [{
+        "parameters": {"rule": {"interval": [{"field": "hours", "hoursInterval": 1}]}},
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "name": "Schedule Trigger",
+        "type": "n8n-nodes-base.scheduleTrigger",
+        "typeVersion": 1.1,
+        "position": [0, 0],
+    }]
+    for i in range(1, n_nodes):
+        node_type, version, params = NODE_TEMPLATES[rng.randrange(len(NODE_TEMPLATES))]
+        node = {
+            "parameters": params(i),
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "name": f"{node_type.split('.')[-1].title()} {i}",
+            "type": node_type,
+            "typeVersion": version,
+            "position": [220 * i, rng.randrange(-200, 200, 20)],
+        }
+        if node_type in CREDENTIALS:
+            node["credentials"] = CREDENTIALS[node_type]
+        if node_type == "n8n-nodes-base.httpRequest":
+            node["webhookId"] = str(uuid.UUID(int=rng.getrandbits(128)))
+        nodes.append(node)
+    connections = {}
+    for i in range(len(nodes) - 1):
+        targets = [[{"node": nodes[i + 1]["name"], "type": "main", "index": 0}]]
+        if nodes[i]["type"] == "n8n-nodes-base.if" and i + 2 < len(nodes):
+            targets.append([{"node": nodes[i + 2]["name"], "type": "main", "index": 0}])
+        connections[nodes[i]["name"]] = {"main": targets}
+    workflow = {"name": f"Benchmark workflow ({n_nodes} nodes)", "nodes": nodes, "connections": connections}
+    if with_metadata:
+        workflow.update({
+            "id": f"wf{seed:04d}{n_nodes:04d}",
+            "active": False,
+            "settings": {"executionOrder": "v1"},
+            "staticData": None,
+            "meta": {"templateCredsSetupCompleted": True, "instanceId": "a" * 64},
+            "pinData": {},
+            "versionId": str(uuid.UUID(int=rng.getrandbits(128))),
+            "triggerCount": 0,
+            "createdAt": "2024-05-01T10:00:00.000Z",
+            "updatedAt": "2024-05-02T10:00:00.000Z",
+            "tags": [],
+        })
+    return workflow
+
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """gpt-4o tokens via tiktoken when its encoding is available, else ~4 characters per token."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def token_counter_name() -> str:
+    count_tokens("")
+    return "tiktoken o200k_base" if _encoding else "estimate (chars / 4; tiktoken encoding unavailable)"
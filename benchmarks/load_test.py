@@ -0,0 +1,304 @@
+# benchmarks/load_test.py
+"""
+Offline load test of the API: starts benchmarks/mock_n8n.py and the app with
+the fake LLM (benchmarks/serve_fake.py) as subprocesses, then drives each
+scenario at increasing concurrency and reports p50/p95/p99 latency,
+throughput, errors and the server's RSS.
+
+Results are written as JSON (by default benchmarks/results/<commit>.json)
+so two commits can be compared:
+
+    python benchmarks/load_test.py --levels 1 4 16 64 --requests 200
+    python benchmarks/load_test.py --compare benchmarks/results/abc1234.json
+
+The OpenAI rate limits are off (LLM_RPM_LIMIT / LLM_TPM_LIMIT = 0) unless
+set in the environment; llm_max_concurrency and everything else use the
+app's configuration. Server logs go to a file in the temp directory.
+
+Scenarios:
+    generate   POST /generate-workflow, a distinct prompt per request, cache bypassed
+    update     PUT /workflows/{id} (diff mode) on the mock's workflows
+    describe   POST /describe-workflow with a workflow, cache bypassed
+    list       GET /get_all_workflows (served from the workflow cache after the first call)
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fixtures import make_workflow  # noqa: E402
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+NO_CACHE = {"Cache-Control": "no-cache"}
+
+
+def scenario_request(name: str, index: int, workflows: int) -> tuple:
+    """(method, path, json body, headers) of request ``index`` of a scenario."""
+    if name == "generate":
+        prompt = f"Create a workflow that posts order {index} from Shopify to Slack and logs it to Google Sheets"
+        return "POST", "/generate-workflow", {"prompt": prompt}, NO_CACHE
+    if name == "update":
+        return "PUT", f"/workflows/{index % workflows + 1}", {"prompt": f"Rename the workflow to Orders {index}"}, None
+    if name == "describe":
+        body = {"prompt": f"What does this workflow do? (request {index})",
+                "workflow": make_workflow(8, seed=index % 20, with_metadata=False)}
+        return "POST", "/describe-workflow", body, NO_CACHE
+    if name == "list":
+        return "GET", "/get_all_workflows", None, None
+    raise ValueError(f"Unknown scenario {name}")
+
+
+def failed(response: httpx.Response) -> bool:
+    if response.status_code >= 400:
+        return True
+    try:
+        body = response.json()
+    except ValueError:
+        return True
+    return isinstance(body, dict) and (body.get("success") is False or bool(body.get("error")))
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * q // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def rss_mb(pid: int):
+    """Resident set size of ``pid`` in MiB, from /proc (None where that isn't available)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+class RSSSampler:
+    """Samples a process's RSS in the background and keeps the peak."""
+
+    def __init__(self, pid: int, interval: float = 0.1):
+        self.pid = pid
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            value = rss_mb(self.pid)
+            if value is not None and (self.peak is None or value > self.peak):
+                self.peak = value
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+async def run_level(client, scenario: str, concurrency: int, total: int, workflows: int, pid: int) -> dict:
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for index in counter:
+            method, path, body, headers = scenario_request(scenario, index, workflows)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body, headers=headers)
+                errors += failed(response)
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    with RSSSampler(pid) as sampler:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    rss_after = rss_mb(pid)
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+        "rss_peak_mb": round(sampler.peak, 1) if sampler.peak is not None else None,
+        "rss_after_mb": round(rss_after, 1) if rss_after is not None else None,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode} during startup")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def start_servers(args, workdir: str) -> tuple:
+    n8n_port, app_port = free_port(), free_port()
+    log = open(os.path.join(workdir, "server.log"), "wb")
+    mock = subprocess.Popen([
+        sys.executable, os.path.join(BENCHMARKS, "mock_n8n.py"), "--port", str(n8n_port),
+        "--workflows", str(args.workflows), "--latency", str(args.n8n_latency), "--jitter", str(args.n8n_jitter),
+        "--error-rate", str(args.n8n_error_rate), "--seed", str(args.seed),
+    ], stdout=log, stderr=subprocess.STDOUT)
+    env = dict(os.environ)
+    env.update(N8N_API_BASE_URL=f"http://127.0.0.1:{n8n_port}/api/v1", JOB_SQLITE_PATH=os.path.join(workdir, "jobs.sqlite3"))
+    env.setdefault("LLM_RPM_LIMIT", "0")
+    env.setdefault("LLM_TPM_LIMIT", "0")
+    server = subprocess.Popen([
+        sys.executable, os.path.join(BENCHMARKS, "serve_fake.py"), "--port", str(app_port),
+        "--llm-latency", str(args.llm_latency), "--tokens-per-second", str(args.tokens_per_second),
+        *(["--recordings", args.recordings] if args.recordings else []),
+    ], stdout=log, stderr=subprocess.STDOUT, env=env, cwd=ROOT)
+    try:
+        wait_until_up(f"http://127.0.0.1:{n8n_port}/stats", mock)
+        wait_until_up(f"http://127.0.0.1:{app_port}/stats", server)
+    except Exception:
+        stop_servers(mock, server)
+        raise
+    return f"http://127.0.0.1:{app_port}", mock, server
+
+
+def stop_servers(*processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def git_commit() -> tuple:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def compare(results: list, baseline_path: str):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    before = {(row["scenario"], row["concurrency"]): row for row in baseline["results"]}
+    print(f"\nvs. {baseline.get('commit')} ({baseline_path}):")
+    for row in results:
+        old = before.get((row["scenario"], row["concurrency"]))
+        if old is None:
+            continue
+        deltas = []
+        for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "rss_peak_mb"):
+            if old.get(key) and row.get(key) is not None:
+                deltas.append(f"{key} {(row[key] - old[key]) / old[key] * 100:+.1f}%")
+        print(f"  {row['scenario']:<9} c={row['concurrency']:<4} " + "  ".join(deltas))
+
+
+async def drive(args, base_url: str, pid: int) -> list:
+    results = []
+    limits = httpx.Limits(max_connections=max(args.levels), max_keepalive_connections=max(args.levels))
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        for scenario in args.scenarios:
+            for index in range(args.warmup):
+                method, path, body, headers = scenario_request(scenario, index, args.workflows)
+                await client.request(method, path, json=body, headers=headers)
+            for level in args.levels:
+                row = await run_level(client, scenario, level, max(args.requests, level), args.workflows, pid)
+                results.append(row)
+                print(f"{scenario:<9} c={level:<4} {row['throughput_rps']:>8.1f} req/s  "
+                      f"p50={row['p50_ms']:>8.1f}ms  p95={row['p95_ms']:>8.1f}ms  p99={row['p99_ms']:>8.1f}ms  "
+                      f"errors={row['errors']}  rss={row['rss_peak_mb']}MB")
+    return results
+
+
+def main(args):
+    workdir = tempfile.mkdtemp(prefix="smartflow-load-")
+    base_url, mock, server = start_servers(args, workdir)
+    try:
+        results = asyncio.run(drive(args, base_url, server.pid))
+        server_stats = httpx.get(f"{base_url}/stats", timeout=10).json()
+    finally:
+        stop_servers(server, mock)
+    commit, dirty = git_commit()
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": vars(args),
+        "results": results,
+        "server_stats": server_stats,
+    }
+    output = args.output or os.path.join(BENCHMARKS, "results", f"{commit}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output} (server log: {os.path.join(workdir, 'server.log')})")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", default=["generate", "update", "describe", "list"],
+                        choices=["generate", "update", "describe", "list"])
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=100, help="requests per level (at least one per worker)")
+    parser.add_argument("--warmup", type=int, default=2, help="unmeasured requests before each scenario")
+    parser.add_argument("--workflows", type=int, default=100, help="workflows the mock n8n starts with")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--recordings", default=None, help="NDJSON of recorded completions for the fake LLM")
+    parser.add_argument("--n8n-latency", type=float, default=0.02)
+    parser.add_argument("--n8n-jitter", type=float, default=0.01)
+    parser.add_argument("--n8n-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", default=None, help="earlier results JSON to print deltas against")
+    main(parser.parse_args())
@@ -0,0 +1,133 @@
+# benchmarks/mock_n8n.py
+"""
+In-memory stand-in for the parts of the n8n public API the app uses
+(list with cursor pagination, get, create, update), for benchmarks and
+trying bulk export/import without a real n8n. Every request can be slowed
+down (``latency`` plus up to ``jitter`` seconds) and a share of them
+(``error_rate``) answered with ``error_status`` instead, from a seeded RNG.
+
+    python benchmarks/mock_n8n.py --port 5679 --workflows 1000 --latency 0.02 --error-rate 0.05
+    N8N_API_BASE_URL=http://127.0.0.1:5679/api/v1 python -m app.services.workflow_transfer export
+"""
+import argparse
+import asyncio
+import base64
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uvicorn  # noqa: E402
+from fastapi import FastAPI, Query, Request  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from benchmarks.fixtures import make_workflow  # noqa: E402
+
+
+class MockN8n:
+    """Workflows by id, in insertion order, plus request counters."""
+
+    def __init__(self, workflows: int = 0, nodes: int = 8, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 503, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rng = random.Random(seed)
+        self.workflows = {}
+        self.next_id = 1
+        self.requests = {"list": 0, "get": 0, "create": 0, "update": 0}
+        self.injected_errors = 0
+        for index in range(workflows):
+            self.add(dict(make_workflow(nodes, seed=index), name=f"Workflow {index}"))
+
+    def add(self, workflow: dict) -> dict:
+        workflow = dict(workflow, id=str(self.next_id), updatedAt=time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()))
+        self.next_id += 1
+        self.workflows[workflow["id"]] = workflow
+        return workflow
+
+    def page(self, cursor: str, limit: int) -> dict:
+        ids = list(self.workflows)
+        start = int(base64.b64decode(cursor)) if cursor else 0
+        end = start + limit
+        return {
+            "data": [self.workflows[workflow_id] for workflow_id in ids[start:end]],
+            "nextCursor": base64.b64encode(str(end).encode()).decode() if end < len(ids) else None,
+        }
+
+
+def create_app(mock: MockN8n) -> FastAPI:
+    app = FastAPI(title="mock n8n")
+
+    async def delay(operation: str):
+        """Wait out the simulated latency; returns the injected error response, if this request gets one."""
+        mock.requests[operation] += 1
+        seconds = mock.latency + (mock.rng.uniform(0, mock.jitter) if mock.jitter else 0.0)
+        if seconds:
+            await asyncio.sleep(seconds)
+        if mock.error_rate and mock.rng.random() < mock.error_rate:
+            mock.injected_errors += 1
+            return JSONResponse(status_code=mock.error_status, content={"message": "Injected error"})
+        return None
+
+    @app.get("/api/v1/workflows")
+    async def list_workflows(cursor: str = None, limit: int = Query(100, ge=1, le=250)):
+        return await delay("list") or mock.page(cursor, limit)
+
+    @app.get("/api/v1/workflows/{workflow_id}")
+    async def get_workflow(workflow_id: str):
+        error = await delay("get")
+        if error is not None:
+            return error
+        if workflow_id not in mock.workflows:
+            return JSONResponse(status_code=404, content={"message": "Not Found"})
+        return mock.workflows[workflow_id]
+
+    @app.post("/api/v1/workflows")
+    async def create_workflow(request: Request):
+        return await delay("create") or mock.add(await request.json())
+
+    @app.put("/api/v1/workflows/{workflow_id}")
+    async def update_workflow(workflow_id: str, request: Request):
+        error = await delay("update")
+        if error is not None:
+            return error
+        if workflow_id not in mock.workflows:
+            return JSONResponse(status_code=404, content={"message": "Not Found"})
+        workflow = dict(await request.json(), id=workflow_id)
+        mock.workflows[workflow_id] = workflow
+        return workflow
+
+    @app.get("/stats")
+    async def stats():
+        return {"workflows": len(mock.workflows), "requests": mock.requests, "injected_errors": mock.injected_errors}
+
+    return app
+
+
+def serve_in_thread(mock: MockN8n, port: int) -> uvicorn.Server:
+    """Run the mock on 127.0.0.1:``port`` in a daemon thread; stop it with ``server.should_exit = True``."""
+    server = uvicorn.Server(uvicorn.Config(create_app(mock), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=5679)
+    parser.add_argument("--workflows", type=int, default=0, help="synthetic workflows to start with")
+    parser.add_argument("--nodes", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many more seconds, at random")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    mock = MockN8n(args.workflows, args.nodes, args.latency, args.jitter, args.error_rate, args.error_status, args.seed)
+    uvicorn.run(create_app(mock), host="127.0.0.1", port=args.port, log_level="warning")
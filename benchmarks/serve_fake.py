@@ -0,0 +1,36 @@
+# benchmarks/serve_fake.py
+"""
+Run the API with FakeChatModel in place of OpenAI, for load tests. Point
+N8N_API_BASE_URL at benchmarks/mock_n8n.py (load_test.py starts both).
+
+    N8N_API_BASE_URL=http://127.0.0.1:5679/api/v1 python benchmarks/serve_fake.py --port 8100 --llm-latency 0.5
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("N8N_API_BASE_URL", "http://127.0.0.1:5679/api/v1")
+os.environ.setdefault("N8N_API_KEY", "benchmark")
+
+import uvicorn  # noqa: E402
+
+from benchmarks.fake_llm import install_fake_llm, load_recordings  # noqa: E402
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds to the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="0 returns completions at once")
+    parser.add_argument("--recordings", default=None, help="NDJSON of recorded completions (see fake_llm.py)")
+    args = parser.parse_args()
+
+    install_fake_llm(
+        load_recordings(args.recordings) if args.recordings else None,
+        latency=args.llm_latency,
+        tokens_per_second=args.tokens_per_second,
+    )
+    from app.main import app  # noqa: E402
+
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,9 @@
+# tests/conftest.py
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Settings needs these; nothing in the tests talks to OpenAI or n8n
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("N8N_API_BASE_URL", "http://127.0.0.1:9/api/v1")
+os.environ.setdefault("N8N_API_KEY", "test")
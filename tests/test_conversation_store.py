@@ -0,0 +1,66 @@
+# tests/test_conversation_store.py
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from app.services.conversation_store import ConversationStore
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "conversations.sqlite3")
+
+
+def test_workers_share_the_sqlite_tier(store_path):
+    first = ConversationStore(sqlite_path=store_path)
+    second = ConversationStore(sqlite_path=store_path)
+
+    async def scenario():
+        await first.aappend("c1", {"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"})
+        await second.aappend("c1", {"role": "user", "content": "again"}, {"role": "assistant", "content": "sure"})
+        seen = await first.aget("c1")
+        await second.adelete("c1")
+        return seen, await first.aget("c1")
+
+    seen, deleted = asyncio.run(scenario())
+    assert [message["content"] for message in seen["messages"]] == ["hi", "hello", "again", "sure"]
+    assert deleted == {"messages": [], "summary": "", "context": None}
+    first.close()
+    second.close()
+
+
+def test_locked_sqlite_tier_does_not_block_the_event_loop(store_path):
+    store = ConversationStore(sqlite_path=store_path)
+    locked = threading.Event()
+    release = threading.Event()
+
+    def hold_db():
+        db = sqlite3.connect(store_path, isolation_level=None)
+        db.execute("BEGIN IMMEDIATE")
+        locked.set()
+        release.wait(5)
+        db.execute("COMMIT")
+        db.close()
+
+    async def scenario():
+        holder = threading.Thread(target=hold_db)
+        holder.start()
+        locked.wait(5)
+        appended = asyncio.ensure_future(store.aappend("c1", {"role": "user", "content": "hi"}))
+        ticks = 0
+        while ticks < 10:
+            await asyncio.sleep(0.02)
+            ticks += 1
+        assert not appended.done()
+        assert store.stats()["conversations"] in (0, 1)
+        release.set()
+        await appended
+        holder.join()
+        return ticks, await store.aget("c1")
+
+    ticks, conversation = asyncio.run(scenario())
+    assert ticks == 10
+    assert conversation["messages"] == [{"role": "user", "content": "hi"}]
+    store.close()
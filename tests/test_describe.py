@@ -0,0 +1,70 @@
+# tests/test_describe.py
+import asyncio
+import json
+
+import pytest
+
+from app import main
+from app.schemas.request_response import WorkflowRequest
+from app.services import langchain_service
+from app.services.conversation_store import ConversationStore
+
+WORKFLOW = {
+    "name": "Hourly fetch",
+    "nodes": [
+        {"name": "A", "type": "n8n-nodes-base.scheduleTrigger", "typeVersion": 1, "position": [0, 0],
+         "parameters": {"rule": {"interval": [{"field": "hours"}]}}},
+        {"name": "B", "type": "n8n-nodes-base.httpRequest", "typeVersion": 4, "position": [220, 0],
+         "parameters": {"url": "https://example.com/orders"}},
+    ],
+    "connections": {"A": {"main": [[{"node": "B", "type": "main", "index": 0}]]}},
+}
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    store = ConversationStore()
+    monkeypatch.setattr(main, "conversation_store", store)
+    monkeypatch.setattr(langchain_service, "conversation_store", store)
+    calls = []
+
+    async def fake_arun_llm(prompt, operation="generate", bypass_cache=False, history=None, **kwargs):
+        calls.append({"prompt": prompt, "history": [message.content for message in history or []]})
+        return f"answer {len(calls)}"
+
+    monkeypatch.setattr(main, "arun_llm", fake_arun_llm)
+    return calls
+
+
+def _describe(**fields):
+    return asyncio.run(main.describe_workflow(WorkflowRequest(**fields), None, None))
+
+
+def test_workflow_is_sent_once_per_conversation(calls):
+    encoded = main.encode_for_prompt(WORKFLOW)
+    first = _describe(prompt="What does it do?", workflow=WORKFLOW, conversation_id="c1")
+    ref = first["workflow_ref"]
+    assert encoded in calls[0]["prompt"] and calls[0]["history"] == []
+
+    second = _describe(prompt="Which URL?", workflow_ref=ref, conversation_id="c1")
+    assert second["workflow_ref"] == ref
+    assert calls[1]["prompt"] == f"Question about workflow {ref}: Which URL?"
+    # The workflow opens the history once; the earlier question refers to it by id
+    assert calls[1]["history"] == [
+        f"Workflow {ref}:\n{encoded}", f"Question about workflow {ref}: What does it do?", "answer 1",
+    ]
+
+
+def test_changed_workflow_replaces_the_pinned_one(calls):
+    first = _describe(prompt="What does it do?", workflow=WORKFLOW, conversation_id="c1")
+    changed = json.loads(json.dumps(WORKFLOW))
+    changed["nodes"][1]["parameters"]["url"] = "https://example.com/customers"
+    second = _describe(prompt="And now?", workflow=changed, conversation_id="c1")
+    assert second["workflow_ref"] != first["workflow_ref"]
+    assert calls[1]["history"][0] == f"Workflow {second['workflow_ref']}:\n{main.encode_for_prompt(changed)}"
+
+
+def test_unknown_workflow_ref_asks_for_the_workflow(calls):
+    response = _describe(prompt="Which URL?", workflow_ref="0123456789ab", conversation_id="c1")
+    assert response.status_code == 409
+    assert calls == []
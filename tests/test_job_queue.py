@@ -0,0 +1,128 @@
+# tests/test_job_queue.py
+import asyncio
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from app.services.job_queue import JobQueue, JobStore, _worker_id
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "jobs.sqlite3")
+
+
+def _job(job_id: str, status: str = "queued", worker: str = None, created_at: float = None) -> dict:
+    return {
+        "id": job_id, "kind": "generate", "status": status, "request": {"prompt": job_id}, "result": None,
+        "error": None, "callback_url": None, "callback_status": None, "worker": worker, "attempts": 0,
+        "created_at": created_at or time.time(), "started_at": None, "finished_at": None, "stages": {},
+    }
+
+
+def _queue(path: str, ran: list, **kwargs) -> JobQueue:
+    async def handler(request, progress):
+        progress("llm")
+        ran.append(request["prompt"])
+        return {"ok": True}, None
+
+    return JobQueue(JobStore(path), {"generate": handler}, concurrency=2, **kwargs)
+
+
+async def _wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.02)
+
+
+def test_start_recovers_a_job_left_running_under_our_own_worker_id(store_path):
+    JobStore(store_path).insert(_job("crashed", status="running", worker=_worker_id()))
+    ran = []
+
+    async def scenario():
+        queue = _queue(store_path, ran, poll_interval=0)
+        await queue.start()
+        await _wait_for(lambda: ran)
+        job = await queue.get("crashed")
+        await queue.stop()
+        return job
+
+    job = asyncio.run(scenario())
+    assert ran == ["crashed"]
+    assert job["status"] == "succeeded" and job["stages"].get("llm")
+
+
+def test_poller_picks_up_jobs_queued_by_another_worker(store_path):
+    ran = []
+
+    async def scenario():
+        queue = _queue(store_path, ran, poll_interval=0.1)
+        await queue.start()
+        # Another worker queued it in its own memory and died before running it
+        JobStore(store_path).insert(_job("orphaned", created_at=time.time() - 1))
+        await _wait_for(lambda: ran)
+        job = await queue.get("orphaned")
+        await queue.stop()
+        return job
+
+    assert asyncio.run(scenario())["status"] == "succeeded"
+    assert ran == ["orphaned"]
+
+
+def test_a_job_is_claimed_by_one_worker_only(store_path):
+    ran = []
+
+    async def scenario():
+        first = _queue(store_path, ran, poll_interval=0.05)
+        second = _queue(store_path, ran, poll_interval=0.05)
+        second.worker = "other-host:1"
+        await first.start()
+        await second.start()
+        job = await first.submit("generate", {"prompt": "once"})
+        await _wait_for(lambda: ran)
+        await asyncio.sleep(0.3)  # both pollers have seen it by now
+        await first.stop()
+        await second.stop()
+        return job
+
+    asyncio.run(scenario())
+    assert ran == ["once"]
+
+
+def test_locked_store_does_not_block_the_event_loop(store_path):
+    ran = []
+    release = threading.Event()
+
+    def hold_db():
+        db = sqlite3.connect(store_path, isolation_level=None)
+        db.execute("BEGIN IMMEDIATE")
+        release.wait(5)
+        db.execute("COMMIT")
+        db.close()
+
+    async def scenario():
+        queue = _queue(store_path, ran, poll_interval=0)
+        await queue.start()
+        holder = threading.Thread(target=hold_db)
+        holder.start()
+        await asyncio.sleep(0.1)
+        submitted = asyncio.ensure_future(queue.submit("generate", {"prompt": "late"}))
+        ticks = 0
+        while ticks < 10:
+            await asyncio.sleep(0.02)
+            ticks += 1
+        assert not submitted.done()
+        release.set()
+        await submitted
+        await _wait_for(lambda: ran)
+        holder.join()
+        await queue.stop()
+        return ticks
+
+    started = time.monotonic()
+    assert asyncio.run(scenario()) == 10
+    assert time.monotonic() - started < 5
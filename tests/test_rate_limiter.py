@@ -0,0 +1,87 @@
+# tests/test_rate_limiter.py
+import asyncio
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from app.services import langchain_service
+from app.services.rate_limiter import RateLimiter
+
+
+@pytest.fixture
+def shared_path(tmp_path):
+    return str(tmp_path / "limits.sqlite3")
+
+
+def test_apause_holds_back_the_next_reservation(shared_path):
+    limiter = RateLimiter(rpm=100, tpm=10000, sqlite_path=shared_path)
+    other_worker = RateLimiter(rpm=100, tpm=10000, sqlite_path=shared_path)
+
+    async def pause_then_reserve():
+        await limiter.apause(2.0)
+        return await limiter._areserve(10)
+
+    try:
+        assert asyncio.run(pause_then_reserve()) > 1.0
+        # The block is in the shared row, so another worker holds back too
+        assert other_worker._reserve(10) > 1.0
+    finally:
+        limiter.close()
+        other_worker.close()
+
+
+def test_queued_update_is_not_overtaken_by_a_reservation(shared_path):
+    """A header clamp queued while the row is locked still lands before a reservation made after it."""
+    limiter = RateLimiter(rpm=100, tpm=10000, sqlite_path=shared_path)
+    release = threading.Event()
+
+    def hold_row():
+        db = sqlite3.connect(shared_path, isolation_level=None)
+        db.execute("BEGIN IMMEDIATE")
+        release.wait(5)
+        db.execute("COMMIT")
+        db.close()
+
+    holder = threading.Thread(target=hold_row)
+
+    async def pause_then_reserve():
+        holder.start()
+        await asyncio.sleep(0.1)
+        limiter.observe_headers({"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "2s"})
+        reservation = asyncio.ensure_future(limiter._areserve(10))
+        await asyncio.sleep(0.2)
+        release.set()
+        return await reservation
+
+    try:
+        assert asyncio.run(pause_then_reserve()) > 1.0
+    finally:
+        holder.join()
+        limiter.close()
+
+
+def test_rate_limited_retry_waits_for_the_pause(monkeypatch, shared_path):
+    limiter = RateLimiter(rpm=1000, tpm=100000, sqlite_path=shared_path)
+    monkeypatch.setattr(langchain_service, "rate_limiter", limiter)
+    monkeypatch.setattr(langchain_service, "_rate_limit_delay", lambda attempt, e: 0.3)
+    calls = []
+
+    class RateLimitError(Exception):
+        status_code = 429
+
+    class FakeLLM:
+        async def ainvoke(self, messages, config=None, **kwargs):
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                raise RateLimitError("rate limit exceeded")
+            return type("Message", (), {"content": "ok"})()
+
+    monkeypatch.setattr(langchain_service, "get_llm_pool", lambda: type("Pool", (), {"get": lambda self: FakeLLM()})())
+    try:
+        assert asyncio.run(langchain_service.ainvoke_llm([])) == "ok"
+        assert calls[1] - calls[0] >= 0.25
+        assert limiter.rate_limited == 1
+    finally:
+        limiter.close()
@@ -0,0 +1,69 @@
+# tests/test_response_cache.py
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from app.services.response_cache import ResponseCache
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "responses.sqlite3")
+
+
+def test_disk_hit_is_promoted_to_memory(cache_path):
+    writer = ResponseCache(sqlite_path=cache_path)
+    reader = ResponseCache(sqlite_path=cache_path)
+
+    async def scenario():
+        await writer.aput("key", "answer")
+        first = await reader.aget("key")
+        second = await reader.aget("key")
+        return first, second
+
+    assert asyncio.run(scenario()) == ("answer", "answer")
+    assert reader.stats()["disk_hits"] == 1
+    assert reader.stats()["memory_hits"] == 1
+    writer.close()
+    reader.close()
+
+
+def test_locked_sqlite_tier_does_not_block_the_event_loop(cache_path):
+    cache = ResponseCache(sqlite_path=cache_path)
+    cache.put("warm", "in memory")
+    locked = threading.Event()
+    release = threading.Event()
+
+    def hold_db():
+        db = sqlite3.connect(cache_path, isolation_level=None)
+        db.execute("BEGIN IMMEDIATE")
+        locked.set()
+        release.wait(5)
+        db.execute("COMMIT")
+        db.close()
+
+    async def scenario():
+        holder = threading.Thread(target=hold_db)
+        holder.start()
+        locked.wait(5)
+        stored = asyncio.ensure_future(cache.aput("key", "answer"))
+        ticks = 0
+        while ticks < 10:
+            await asyncio.sleep(0.02)
+            ticks += 1
+        assert not stored.done()
+        # Memory hits and stats() don't queue behind the blocked write
+        assert await cache.aget("warm") == "in memory"
+        assert cache.stats()["stores"] == 2
+        release.set()
+        await stored
+        holder.join()
+        return ticks
+
+    assert asyncio.run(scenario()) == 10
+    cache.close()
+    reopened = ResponseCache(sqlite_path=cache_path)
+    assert reopened.get("key") == "answer"
+    reopened.close()
@@ -0,0 +1,53 @@
+# tests/test_workflow_update.py
+import asyncio
+import json
+
+import pytest
+
+from app.services import workflow_update
+from app.services.pipeline_stats import StageTimings
+from app.services.workflow_update import WorkflowUpdateError, apply_update_patch, update_with_patch
+from app.utils.json_patch import PatchError
+
+WORKFLOW = {
+    "id": "1",
+    "name": "Hourly fetch",
+    "nodes": [
+        {"id": "a", "name": "A", "type": "n8n-nodes-base.scheduleTrigger", "typeVersion": 1.1, "position": [0, 0],
+         "parameters": {"rule": {"interval": [{"field": "hours"}]}}},
+        {"id": "b", "name": "B", "type": "n8n-nodes-base.set", "typeVersion": 1, "position": [220, 0],
+         "parameters": {}},
+    ],
+    "connections": {"A": {"main": [[{"node": "B", "type": "main", "index": 0}]]}},
+}
+
+NEW_NODE = {"n": "C", "t": "noOp"}
+
+MALFORMED_PATCHES = {
+    "nodes removed": [{"op": "remove", "path": "/nodes"}, {"op": "add", "path": "/nodes/-", "value": NEW_NODE}],
+    "nodes replaced by a scalar": [{"op": "replace", "path": "/nodes", "value": 3}],
+    "edge with a string index": [{"op": "add", "path": "/edges/-", "value": ["A", "A", "x"]}],
+}
+
+
+@pytest.mark.parametrize("patch", MALFORMED_PATCHES.values(), ids=MALFORMED_PATCHES.keys())
+def test_malformed_patch_raises_patch_error(patch):
+    with pytest.raises(PatchError):
+        apply_update_patch(WORKFLOW, patch)
+
+
+def test_valid_patch_renames_and_keeps_edges():
+    updated = apply_update_patch(WORKFLOW, [{"op": "replace", "path": "/nodes/1/n", "value": "Renamed"}])
+    assert [node["name"] for node in updated["nodes"]] == ["A", "Renamed"]
+    assert updated["nodes"][1]["id"] == "b"
+    assert updated["connections"] == {"A": {"main": [[{"node": "Renamed", "type": "main", "index": 0}]]}}
+
+
+@pytest.mark.parametrize("patch", MALFORMED_PATCHES.values(), ids=MALFORMED_PATCHES.keys())
+def test_malformed_model_patch_is_an_update_error(monkeypatch, patch):
+    async def fake_llm(messages, usage=None, max_tokens=None, template=None):
+        return json.dumps({"patch": patch})
+
+    monkeypatch.setattr(workflow_update, "ainvoke_llm", fake_llm)
+    with pytest.raises(WorkflowUpdateError, match="Could not apply"):
+        asyncio.run(update_with_patch(WORKFLOW, "edit it", StageTimings()))